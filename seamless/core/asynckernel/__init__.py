@@ -1,8 +1,119 @@
 from abc import ABCMeta, abstractmethod
 from collections import deque
+import os
+import selectors
 import threading
 import weakref
-import time
+
+class InputSemaphore(threading.Semaphore):
+    """Semaphore for the inputs of a worker
+    While the worker waits for its executor, waiter is set to an Event,
+     so that new inputs wake it up (see FdWatcher)"""
+    waiter = None
+
+    def release(self, n=1):
+        super().release(n)
+        waiter = self.waiter
+        if waiter is not None:
+            waiter.set()
+
+class FdWatcher:
+    """Watches file descriptors (executor result pipes and sentinels) for
+     all workers, in a single thread, with a single wakeup pipe.
+    watch() registers objects (file descriptors or objects with fileno())
+     together with an Event, that is set as soon as one of them is readable.
+    Therefore, a worker waits on an Event, that can also be set by
+     new inputs (see InputSemaphore), and needs no file descriptors
+     of its own."""
+    def __init__(self):
+        self._lock = threading.Condition()
+        self._watches = {} # fd => (Event, token)
+        self._token = 0 # fd numbers are re-used; a new watch gets a new token
+        self._generation = 0 # incremented whenever the watches are applied
+        self._applied = 0
+        self._thread = None
+
+    @staticmethod
+    def _fileno(obj):
+        return obj if isinstance(obj, int) else obj.fileno()
+
+    def _start(self):
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        self._thread = threading.Thread(
+          target=self._run, name="FdWatcher", daemon=True
+        )
+        self._thread.start()
+
+    def _wakeup(self):
+        self._generation += 1
+        os.write(self._wakeup_w, b"x")
+        return self._generation
+
+    def watch(self, objs, event):
+        with self._lock:
+            if self._thread is None:
+                self._start()
+            self._token += 1
+            for obj in objs:
+                self._watches[self._fileno(obj)] = event, self._token
+            self._wakeup()
+
+    def unwatch(self, objs):
+        """Stops watching objs
+        Returns once the watcher thread has stopped watching them,
+         so that they can be closed safely afterwards"""
+        with self._lock:
+            for obj in objs:
+                self._watches.pop(self._fileno(obj), None)
+            if self._thread is None:
+                return
+            generation = self._wakeup()
+            while self._applied < generation:
+                self._lock.wait()
+
+    def _run(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._wakeup_r, selectors.EVENT_READ)
+        registered = {} # fd => token
+        while 1:
+            with self._lock:
+                watched = {fd: token for fd, (_, token) in self._watches.items()}
+                generation = self._generation
+            for fd, token in list(registered.items()):
+                if watched.get(fd) != token:
+                    selector.unregister(fd)
+                    registered.pop(fd)
+            for fd, token in watched.items():
+                if fd in registered:
+                    continue
+                try:
+                    selector.register(fd, selectors.EVENT_READ)
+                except (OSError, ValueError):
+                    # closed in the meantime: let the worker find out
+                    with self._lock:
+                        event, _ = self._watches.pop(fd, (None, None))
+                    if event is not None:
+                        event.set()
+                    continue
+                registered[fd] = token
+            with self._lock:
+                self._applied = generation
+                self._lock.notify_all()
+            for key, _ in selector.select():
+                if key.fd == self._wakeup_r:
+                    try:
+                        while os.read(self._wakeup_r, 4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                with self._lock:
+                    event, _ = self._watches.pop(key.fd, (None, None))
+                if event is not None:
+                    event.set()
+
+fd_watcher = FdWatcher()
 
 class QueueItem:
 
@@ -34,8 +145,9 @@ class Worker(metaclass=ABCMeta):
     responsive = True
     running = False
     in_equilibrium = False
+    transformation = None # checksum of the current inputs, see transformation_cache
 
-    def __init__(self, parent, inputs, event_cls=threading.Event, semaphore_cls=threading.Semaphore):
+    def __init__(self, parent, inputs, event_cls=threading.Event, semaphore_cls=InputSemaphore):
         self.parent = weakref.ref(parent)
         self.namespace = {}
         self.namespace["__name__"] = self.name
@@ -50,10 +162,22 @@ class Worker(metaclass=ABCMeta):
 
         self._pending_inputs = {name for name in inputs}
         self._pending_updates = 0
+        # Taken by send_message, so that handoff() is atomic for the kernel
+        self.handoff_lock = threading.RLock()
 
     def _cleanup(self):
         pass
 
+    def handoff(self, parent, output_queue, output_semaphore):
+        """Hands the running kernel over to a new parent (see cache.py)
+        The old parent receives @RESTART as the last message of its output queue,
+         all later messages go to the new output queue"""
+        with self.handoff_lock:
+            self.parent = weakref.ref(parent)
+            self.send_message("@RESTART", None)
+            self.output_queue = output_queue
+            self.output_semaphore = output_semaphore
+
     def process_message(self, message_id, name, data, access_mode, content_type):
         pass
 
@@ -89,12 +213,16 @@ class Worker(metaclass=ABCMeta):
                     ack(True)
                     continue
                 elif name == "@TOUCH":
-                    pass
+                    self.transformation = None # recompute, don't use the cache
+                elif name == "@TRANSFORMATION":
+                    self.transformation = data
                 elif name.startswith("@"):
                     print("*********** PROTOCOL ERROR in transformer %s: unknown message name **************" % (self.parent(), name ) )
                     continue
 
                 if not name.startswith("@"):
+                    # The transformation checksum is sent after the input
+                    self.transformation = None
                     # It's cheaper to look-ahead for updates and wait until we process them instead
                     look_ahead = False
                     for item in list(self.input_queue):
@@ -129,7 +257,6 @@ class Worker(metaclass=ABCMeta):
                     self.updated.add(name)
 
                 # With all inputs now present, we can issue updates
-                time.sleep(0.01)
                 if not self._pending_inputs and self.responsive and not self.in_equilibrium:
                     # ...but not if there is still something in the queue for us
                     if self.semaphore.acquire(blocking=False):
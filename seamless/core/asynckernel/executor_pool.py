@@ -0,0 +1,230 @@
+"""
+Pool of pre-forked executor processes for transformer execution
+
+Instead of forking a new process for every transformer update, jobs are sent
+ to a persistent worker process over a pipe. The worker sends back the same
+ (status, message) tuples that execute() puts on its result queue:
+ -1 for a preliminary result, 0 for the final result, 1 for an exception.
+After each job, the worker sends a boolean: True if it is ready for the next
+ job, False if it retires (after MAX_JOBS jobs, or when its memory use exceeds
+ MAX_MEMORY).
+
+Terminating a job (kill-on-new-input) kills the worker process; the pool
+ simply forgets about it and forks a new worker for the next job.
+
+Configuration via environment variables:
+- SEAMLESS_EXECUTOR_POOL_SIZE: maximum number of idle workers kept alive
+   (default: number of CPUs). 0 disables the pool.
+- SEAMLESS_EXECUTOR_MAX_JOBS: number of jobs after which a worker is recycled
+   (default: 100).
+- SEAMLESS_EXECUTOR_MAX_MEMORY: growth in peak resident memory (in MB) after
+   which a worker is recycled (default: 0, no limit).
+"""
+
+import os
+import sys
+import pickle
+import threading
+import multiprocessing
+from multiprocessing import Process, Pipe
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+POOL_SIZE = int(os.environ.get("SEAMLESS_EXECUTOR_POOL_SIZE", os.cpu_count() or 1))
+MAX_JOBS = int(os.environ.get("SEAMLESS_EXECUTOR_MAX_JOBS", 100))
+MAX_MEMORY = int(os.environ.get("SEAMLESS_EXECUTOR_MAX_MEMORY", 0))
+
+# Only values of these types are sent to a pool worker.
+# Other values (e.g. Silk wrappers) do not survive pickling with their type intact,
+#  their transformers are executed in a freshly forked process instead
+_poolable_types = (
+    type(None), bool, int, float, complex, str, bytes,
+    list, tuple, dict, np.ndarray, np.generic
+)
+
+class PipeQueue:
+    """Result queue interface of execute(), on top of a pipe connection"""
+    def __init__(self, conn):
+        self.conn = conn
+    def put(self, item):
+        self.conn.send(item)
+
+def _get_maxrss():
+    if resource is None:
+        return 0
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        maxrss *= 1024
+    return maxrss
+
+def _pool_worker(conn, max_jobs, max_memory):
+    from .transformer import execute
+    from ..injector import transformer_injector
+    result_queue = PipeQueue(conn)
+    njobs = 0
+    initial_maxrss = _get_maxrss()
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        name, code, identifier, namespace, output_name = job
+        execute(name, code, identifier, namespace, transformer_injector, None,
+          output_name, result_queue)
+        njobs += 1
+        retire = False
+        if max_jobs and njobs >= max_jobs:
+            retire = True
+        elif max_memory and \
+          _get_maxrss() - initial_maxrss > max_memory * 1024 * 1024:
+            retire = True
+        conn.send(not retire)
+        if retire:
+            break
+    conn.close()
+
+class PoolWorker:
+    def __init__(self, max_jobs, max_memory):
+        self.conn, child_conn = Pipe()
+        self.process = Process(
+            target=_pool_worker,
+            args=(child_conn, max_jobs, max_memory),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def shutdown(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.conn.close()
+
+    def kill(self):
+        self.process.terminate()
+        self.conn.close()
+
+class PooledExecution:
+    """Handle for a job running in a pool worker
+    It has the Process interface (is_alive, terminate, sentinel) as well as
+     the Connection interface (poll, recv, fileno) to read the results.
+    Once the final result has been received, the worker returns to the pool.
+    """
+    def __init__(self, pool, worker):
+        self.pool = pool
+        self.worker = worker
+        self.sentinel = worker.process.sentinel
+        self._done = False
+        self._terminated = False
+
+    @property
+    def pid(self):
+        return self.worker.process.pid
+
+    def is_alive(self):
+        return not self._terminated and self.worker.process.is_alive()
+
+    def terminate(self):
+        if self._done or self._terminated:
+            return
+        self._terminated = True
+        self.worker.kill()
+
+    def fileno(self):
+        return self.worker.conn.fileno()
+
+    def poll(self, timeout=0):
+        if self._done or self._terminated:
+            return False
+        return self.worker.conn.poll(timeout)
+
+    def recv(self):
+        item = self.worker.conn.recv()
+        status = item[0]
+        if status in (0, 1):
+            self._done = True
+            self.pool._release(self.worker)
+        return item
+
+class ExecutorPool:
+    def __init__(self, size=POOL_SIZE, max_jobs=MAX_JOBS, max_memory=MAX_MEMORY):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_memory = max_memory
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+        return PoolWorker(self.max_jobs, self.max_memory)
+
+    def _release(self, worker):
+        try:
+            ready = worker.conn.recv()
+        except (OSError, EOFError):
+            ready = False
+        if not ready:
+            worker.conn.close()
+            worker.process.join()
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(worker)
+                return
+        worker.shutdown()
+
+    def prestart(self, nworkers=None):
+        """Forks idle workers in advance"""
+        if nworkers is None:
+            nworkers = self.size
+        with self._lock:
+            while len(self._idle) < nworkers:
+                self._idle.append(PoolWorker(self.max_jobs, self.max_memory))
+
+    def submit(self, name, code, identifier, namespace, output_name):
+        """Submits a job to an idle worker
+        Returns a PooledExecution, or None if the job could not be pickled
+        """
+        for value in namespace.values():
+            if type(value) not in _poolable_types and \
+              not isinstance(value, (np.ndarray, np.generic)):
+                return None
+        job = (name, code, identifier, namespace, output_name)
+        try:
+            data = pickle.dumps(job, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return None
+        worker = self._acquire()
+        try:
+            worker.conn.send_bytes(data)
+        except (OSError, ValueError):
+            worker.kill()
+            worker = PoolWorker(self.max_jobs, self.max_memory)
+            worker.conn.send_bytes(data)
+        return PooledExecution(self, worker)
+
+    def shutdown(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.shutdown()
+
+executor_pool = None
+def get_executor_pool():
+    global executor_pool
+    if POOL_SIZE <= 0 or multiprocessing.get_start_method() != "fork":
+        return None
+    if executor_pool is None:
+        executor_pool = ExecutorPool()
+    return executor_pool
@@ -17,7 +17,7 @@ def _async_raise(tid, exctype):
 
 class KillableThread(threading.Thread):
     def kill(self, exctype=SystemError):
-        if not self.isAlive():
+        if not self.is_alive():
             return
         tid = self.ident
         _async_raise(tid, exctype)
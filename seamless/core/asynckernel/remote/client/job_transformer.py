@@ -1,7 +1,6 @@
 import traceback
 from ... import Worker
 import functools
-import time
 from threading import Thread, Event
 from ..encode import encode
 from ....cell import celltypes
@@ -48,8 +47,9 @@ class JobTransformer(Worker):
 
     def send_message(self, tag, message):
         #print("send_message", tag, message, hex(id(self.output_queue)))
-        self.output_queue.append((tag, message))
-        self.output_semaphore.release()
+        with self.handoff_lock:
+            self.output_queue.append((tag, message))
+            self.output_semaphore.release()
 
     def update(self, updated, semaphore):
         self.send_message("@START", None)
@@ -72,13 +72,12 @@ class JobTransformer(Worker):
                 self.kill.clear()
 
                 #run request in separate executor thread...
-                while 1:
-                    time.sleep(0.01)
-                    if semaphore.acquire(blocking=False):
-                        semaphore.release()
-                        self.kill.set()
-                        break
+                # block until a new input arrives
+                semaphore.acquire()
+                semaphore.release()
+                self.kill.set()
         finally:
-            assert self.parent().output_queue is self.output_queue
-            self.send_message("@END", None)
+            with self.handoff_lock:
+                assert self.parent().output_queue is self.output_queue
+                self.send_message("@END", None)
         self.send_message(self.output_name, None)
@@ -1,4 +1,4 @@
-from ...cell import cell
+from ...cell import cell, ArrayCell
 from ...protocol import json_encode
 from . import MAGIC_SEAMLESS_REQUEST
 import numpy as np
@@ -6,9 +6,14 @@ import numpy as np
 nil = json_encode(None)
 
 def encode(transformer_params, output_signature, values, access_modes, content_types):
+    """Encodes a remote job request
+    The value buffers are collected as segments (for array and mixed cells,
+     referring to the memory of the values, see mixed.io.to_stream),
+     and joined only once"""
     #TODO: git-style SHA-256 checksums
     assert values.keys() == content_types.keys() == access_modes.keys()
-    b = b''
+    parts = []
+    bufsize = 0
     d = [transformer_params, output_signature]
     for k in values:
         v = values[k]
@@ -17,26 +22,23 @@ def encode(transformer_params, output_signature, values, access_modes, content_t
         cc = cell(c)
         cc.deserialize(v, "ref", am, c, from_pin=False, default=False)
         if cc._val is None:
-            buf = nil
+            bufparts = [nil.encode()]
+        elif isinstance(cc, ArrayCell):
+            bufparts = cc._buffer_parts()
         else:
             buf = cc.serialize_buffer()
-        ma = cc._mount_kwargs
-        binary = ma["binary"]
-        encoding = ma.get("encoding")
-        if not isinstance(buf, bytes):
-            buf = buf.encode(encoding)
-        d.append((k,am,c,len(buf)))
-        b += buf
-    dd = json_encode(d)
+            ma = cc._mount_kwargs
+            encoding = ma.get("encoding")
+            if not isinstance(buf, bytes):
+                buf = buf.encode(encoding)
+            bufparts = [buf]
+        size = sum([memoryview(part).nbytes for part in bufparts])
+        d.append((k,am,c,size))
+        parts += bufparts
+        bufsize += size
+    dd = json_encode(d).encode()
 
     s1 = np.uint64(len(dd)).tobytes()
-    s2 = np.uint64(len(b)).tobytes()
-    streamsize = len(MAGIC_SEAMLESS_REQUEST) + 16 + len(dd) + len(b)
-    stream = bytearray(streamsize)
-    l = len(MAGIC_SEAMLESS_REQUEST)
-    stream[:l] = MAGIC_SEAMLESS_REQUEST
-    stream[l:l+8] = s1
-    stream[l+8:l+16] = s2
-    stream[l+16:l+16+len(dd)] = dd.encode()
-    stream[l+16+len(dd):streamsize] = b
-    return stream
+    s2 = np.uint64(bufsize).tobytes()
+    parts = [MAGIC_SEAMLESS_REQUEST, s1, s2, dd] + parts
+    return bytearray().join([memoryview(part).cast("B") for part in parts])
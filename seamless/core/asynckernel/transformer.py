@@ -1,8 +1,10 @@
 import traceback
-from . import Worker
+import threading
+from . import Worker, fd_watcher
 from .killable_thread import KillableThread
 import multiprocessing
-from multiprocessing import Process
+from multiprocessing import Process, Pipe
+from collections import deque
 import functools
 import time
 import sys
@@ -11,6 +13,8 @@ import signal
 import platform
 from ..cached_compile import cached_compile
 from ..injector import transformer_injector
+from .executor_pool import get_executor_pool, PipeQueue, _poolable_types
+from ..transformation_cache import transformation_cache
 
 if platform.system() == "Windows":
     from ctypes import windll
@@ -24,12 +28,31 @@ else:
     if USE_PROCESSES == "0" or USE_PROCESSES.upper() == "FALSE":
         USE_PROCESSES = False
 if USE_PROCESSES:
-    from multiprocessing import JoinableQueue as Queue
     Executor = Process
 else:
-    from queue import Queue
     Executor = KillableThread
 
+class ThreadResultQueue:
+    """Result queue for executor threads
+    It has the same reading interface as a pipe connection (poll, recv)
+    Instead of a file descriptor, it sets waiter (an Event) on every put
+    """
+    waiter = None
+    def __init__(self):
+        self._queue = deque()
+
+    def put(self, item):
+        self._queue.append(item)
+        waiter = self.waiter
+        if waiter is not None:
+            waiter.set()
+
+    def poll(self):
+        return len(self._queue) > 0
+
+    def recv(self):
+        return self._queue.popleft()
+
 def return_preliminary(result_queue, value):
     #print("return_preliminary", value)
     result_queue.put((-1, value))
@@ -59,9 +82,6 @@ def execute(name, code, identifier, namespace, injector, workspace,
                 result_queue.put((0, result))
             except KeyError:
                 result_queue.put((1, "Output variable name '%s' undefined" % output_name))
-    if USE_PROCESSES:
-        result_queue.close()
-    result_queue.join()
 
 def execute_debug(name, code, identifier, namespace, injector, workspace,
     output_name, result_queue):
@@ -128,8 +148,9 @@ class Transformer(Worker):
 
     def send_message(self, tag, message):
         #print("send_message", tag, message, hex(id(self.output_queue)))
-        self.output_queue.append((tag, message))
-        self.output_semaphore.release()
+        with self.handoff_lock:
+            self.output_queue.append((tag, message))
+            self.output_semaphore.release()
 
     def return_preliminary(self, value):
         #print("return_preliminary", value)
@@ -138,6 +159,7 @@ class Transformer(Worker):
     def update(self, updated, semaphore):
         self.send_message("@START", None)
         ok = False
+        killed = False
         try:
             # If code object is updated, recompile
             if "code" in updated:
@@ -173,57 +195,128 @@ class Transformer(Worker):
             for name in self.inputs:
                 if name not in ("code", "schema"):
                     self.namespace[name] = self.values[name]
-            queue = Queue()
-            workspace = self if self.injected_modules else None
-            args = (self.parent()._format_path(), self.tf_code,
-              str(self.parent()),
-              self.namespace, self.injector, workspace,
-              self.output_name, queue)
-            injector = self.injector
-            if USE_PROCESSES and multiprocessing.get_start_method() != "fork":
-                injector = injector.clone()
-            args = (self.parent()._format_path(), self.tf_code,
-              str(self.parent()),
-               self.namespace, injector, workspace,
-               self.output_name, queue
-            )
-            if self.debug and USE_PROCESSES:
-                executor = Executor(target=execute_debug,args=args, daemon=True)
-                executor.start()
-                msg = "%s is running as process %d, waiting for a debugger attachment"
-                print(msg % (self.namespace["__fullname__"], executor.pid),
-                  file=sys.stderr)
-                if platform.system() != "Windows":
-                    msg = "After attaching, send the SIGUSR1 signal ('signal SIGUSR1' in GDB)"
-                    print(msg, file=sys.stderr)
-                msg = "To cancel debugging, set Transformer.debug to False"
+            # Consult the transformation cache before launching an executor
+            transformation = None if self.debug else self.transformation
+            if transformation is not None:
+                ok, result = transformation_cache.get(transformation)
+                if ok:
+                    self.EXCEPTION = None
+            if not ok:
+                ok, result, killed = self._execute(semaphore)
+                if ok and transformation is not None \
+                  and type(result) in _poolable_types:
+                    transformation_cache.set(transformation, result)
+        finally:
+            with self.handoff_lock:
+                if self.parent() is None:
+                    ok = False  # parent has died
+                else:
+                    assert self.parent().output_queue is self.output_queue
+                    self.send_message("@END", None)
+                    if not ok:
+                        self.send_message("@ERROR", self.EXCEPTION)
+        if ok:
+            self.last_result = result
+            self.send_message(self.output_name, result)
+        else:
+            self.last_result = None
+
+    def _execute(self, semaphore):
+        """Runs the transformation in an executor
+        Returns (ok, result, killed)"""
+        if USE_PROCESSES:
+            result_conn, child_conn = Pipe(duplex=False)
+            queue = PipeQueue(child_conn)
+        else:
+            child_conn = None
+            queue = result_conn = ThreadResultQueue()
+        workspace = self if self.injected_modules else None
+        injector = self.injector
+        if USE_PROCESSES and multiprocessing.get_start_method() != "fork":
+            injector = injector.clone()
+        args = (self.parent()._format_path(), self.tf_code,
+          str(self.parent()),
+           self.namespace, injector, workspace,
+           self.output_name, queue
+        )
+        if self.debug and USE_PROCESSES:
+            executor = Executor(target=execute_debug,args=args, daemon=True)
+            executor.start()
+            msg = "%s is running as process %d, waiting for a debugger attachment"
+            print(msg % (self.namespace["__fullname__"], executor.pid),
+              file=sys.stderr)
+            if platform.system() != "Windows":
+                msg = "After attaching, send the SIGUSR1 signal ('signal SIGUSR1' in GDB)"
                 print(msg, file=sys.stderr)
+            msg = "To cancel debugging, set Transformer.debug to False"
+            print(msg, file=sys.stderr)
+        else:
+            executor = None
+            pool = get_executor_pool() if USE_PROCESSES else None
+            if pool is not None and workspace is None and not self.debug:
+                # Injected modules live in the kernel process only,
+                #  transformers that use them require a fork
+                executor = pool.submit(
+                    self.parent()._format_path(), self.tf_code,
+                    str(self.parent()), self.namespace, self.output_name
+                )
+            if executor is not None:
+                result_conn = executor
             else:
                 executor = Executor(target=execute,args=args, daemon=True)
                 executor.start()
-                if self.debug:
-                    msg = "Seamless is not configured to execute transformers in processes"
-                    print(msg, file=sys.stderr)
-                    msg = "Debugging of processes will not be possible"
-                    print(msg, file=sys.stderr)
-            dead_time = 0
-            while 1:
-                ok = False
-                prelim = None
-                if executor.is_alive():
-                    executor.join(0.01) #10 ms
-                else:
-                    time.sleep(0.01)
-                    dead_time += 0.01
-                    if dead_time >= 1:
-                        raise Exception #executor died without result or exception
-                if semaphore.acquire(blocking=False):
-                    semaphore.release()
-                    executor.terminate()
-                    break
-                while not queue.empty():
-                    status, msg = queue.get()
-                    queue.task_done()
+            if self.debug:
+                msg = "Seamless is not configured to execute transformers in processes"
+                print(msg, file=sys.stderr)
+                msg = "Debugging of processes will not be possible"
+                print(msg, file=sys.stderr)
+        if child_conn is not None:
+            child_conn.close()
+
+        # Block until there is a result, the executor dies,
+        #  or a new input arrives (in which case the executor is killed)
+        # The result pipe and the sentinel are watched by fd_watcher,
+        #  which sets wakeup, as do new inputs and thread results
+        wakeup = threading.Event()
+        fds = []
+        if isinstance(result_conn, ThreadResultQueue):
+            result_conn.waiter = wakeup
+        else:
+            fds.append(result_conn)
+        sentinel = getattr(executor, "sentinel", None)
+        if sentinel is not None:
+            fds.append(sentinel)
+        semaphore.waiter = wakeup
+        try:
+            return self._wait_executor(
+              executor, result_conn, semaphore, wakeup, fds
+            )
+        finally:
+            semaphore.waiter = None
+
+    def _wait_executor(self, executor, result_conn, semaphore, wakeup, fds):
+        ok = False
+        killed = False
+        result = None
+        while 1:
+            ok = False
+            prelim = None
+            wakeup.clear()
+            fd_watcher.watch(fds, wakeup)
+            pending = semaphore.acquire(blocking=False)
+            if pending:
+                semaphore.release()
+            elif not result_conn.poll() and executor.is_alive():
+                wakeup.wait()
+            fd_watcher.unwatch(fds)
+            if semaphore.acquire(blocking=False):
+                semaphore.release()
+                executor.terminate()
+                killed = True
+                break
+            try:
+                while result_conn.poll():
+                    status, msg = result_conn.recv()
                     if status == -1:
                         prelim = msg
                     elif status == 0:
@@ -234,21 +327,13 @@ class Transformer(Worker):
                     elif status == 1:
                         self.EXCEPTION = msg
                         raise Exception(msg)
-                if ok:
-                    break
-                if prelim is not None:
-                    self.return_preliminary(prelim)
-                    prelim = None
-        finally:
-            if self.parent() is None:
-                ok = False  # parent has died
-            else:
-                assert self.parent().output_queue is self.output_queue
-                self.send_message("@END", None)
-                if not ok:
-                    time.sleep(2) # For now, give other workers the opportunity to finish
-                                  # Won't be necessary anymore when the New Way is there
-                    self.send_message("@ERROR", self.EXCEPTION)
-        if ok:
-            self.last_result = result
-            self.send_message(self.output_name, result)
+            except EOFError:
+                raise Exception("Executor died without result or exception") from None
+            if ok:
+                break
+            if prelim is not None:
+                self.return_preliminary(prelim)
+                prelim = None
+            if not executor.is_alive() and not result_conn.poll():
+                raise Exception("Executor died without result or exception")
+        return ok, result, killed
@@ -0,0 +1,152 @@
+"""
+Process-wide content-addressed store of cell values and buffers
+
+Cells that hold a value take a reference on its checksum. Per checksum,
+ the store keeps:
+- the deserialized value of array cells (and of binary mixed cells), as a
+   read-only array that is shared by all cells that hold the checksum
+   (see CellBase._share_value). Memory use therefore scales with the number
+   of distinct values, not with the number of cells. The value is dropped
+   as soon as no cell references the checksum.
+- the serialized buffer, once it has been serialized or received, so that
+   it is never serialized again while it is in the store.
+
+The buffers are a cache: cells always keep their value, and re-serialize it
+ if their buffer has been evicted. When the store exceeds its maximum size,
+ unreferenced buffers are evicted first (least recently used first),
+ then referenced ones.
+
+Memory-mapped buffers (of memory-mapped mounts) do not count towards
+ the size: they are backed by the file, not by memory. Since they would
+ never be evicted, they are dropped (and unmapped) as soon as they are
+ no longer referenced, so that a replaced file is released.
+
+Configuration via environment variables:
+- SEAMLESS_BUFFER_STORE_SIZE: maximum total size of the buffers in MB
+   (default: 512)
+"""
+
+import os
+import mmap
+import threading
+from collections import OrderedDict
+import numpy as np
+
+BUFFER_STORE_SIZE = int(os.environ.get("SEAMLESS_BUFFER_STORE_SIZE", 512))
+
+def _size(buffer):
+    if isinstance(buffer, mmap.mmap):
+        return 0
+    return len(buffer)
+
+def _read_only(value):
+    """Returns a read-only view of a Numpy array
+    The array itself (e.g. the array of the user) remains writable"""
+    if not value.flags.writeable:
+        return value
+    value = value.view()
+    value.flags.writeable = False
+    return value
+
+class BufferStore:
+    def __init__(self, max_size=BUFFER_STORE_SIZE * 1024 * 1024):
+        self.max_size = max_size
+        self.size = 0
+        self._buffers = OrderedDict()
+        self._values = {}
+        self._refcounts = {}
+        self._lock = threading.Lock()
+
+    def incref(self, checksum, buffer=None):
+        """Takes a reference on checksum, storing its buffer (if given)"""
+        with self._lock:
+            self._refcounts[checksum] = self._refcounts.get(checksum, 0) + 1
+            if buffer is not None:
+                self._add(checksum, buffer)
+
+    def decref(self, checksum):
+        with self._lock:
+            refcount = self._refcounts.get(checksum, 0) - 1
+            if refcount > 0:
+                self._refcounts[checksum] = refcount
+            else:
+                self._refcounts.pop(checksum, None)
+                self._values.pop(checksum, None)
+                buffer = self._buffers.get(checksum)
+                if isinstance(buffer, mmap.mmap):
+                    self._buffers.pop(checksum)
+                    try:
+                        buffer.close()
+                    except BufferError:
+                        pass # still exported (e.g. a view held by the user)
+            self._evict()
+
+    def refcount(self, checksum):
+        return self._refcounts.get(checksum, 0)
+
+    def _add(self, checksum, buffer):
+        if checksum in self._buffers:
+            self._buffers.move_to_end(checksum)
+            return
+        self._buffers[checksum] = buffer
+        self.size += _size(buffer)
+        self._evict()
+
+    def add(self, checksum, buffer):
+        """Stores a buffer without taking a reference"""
+        with self._lock:
+            self._add(checksum, buffer)
+
+    def get(self, checksum):
+        """Returns the buffer for checksum, or None if it is not in the store"""
+        with self._lock:
+            buffer = self._buffers.get(checksum)
+            if buffer is not None:
+                self._buffers.move_to_end(checksum)
+            return buffer
+
+    def get_value(self, checksum):
+        """Returns the value that is shared by the cells that reference checksum,
+         or None"""
+        return self._values.get(checksum)
+
+    def share_value(self, checksum, value):
+        """Returns the value that is shared by the cells that reference checksum
+        If there is none yet, a read-only view of value becomes the shared value.
+        Only Numpy arrays (without Python objects) are shared:
+         other values are returned as they are."""
+        if not isinstance(value, np.ndarray) or value.dtype.hasobject:
+            return value
+        with self._lock:
+            if checksum not in self._refcounts:
+                return value
+            shared = self._values.get(checksum)
+            if shared is None:
+                shared = _read_only(value)
+                self._values[checksum] = shared
+            return shared
+
+    def __contains__(self, checksum):
+        return checksum in self._buffers
+
+    def __len__(self):
+        return len(self._buffers)
+
+    def _evict(self):
+        if self.size <= self.max_size:
+            return
+        for only_unreferenced in (True, False):
+            for checksum in list(self._buffers.keys()):
+                if self.size <= self.max_size:
+                    return
+                if only_unreferenced and checksum in self._refcounts:
+                    continue
+                buffer = self._buffers.pop(checksum)
+                self.size -= _size(buffer)
+
+    def clear(self):
+        with self._lock:
+            self._buffers.clear()
+            self.size = 0
+
+buffer_store = BufferStore()
@@ -1,13 +1,36 @@
+import json
 import functools
-import weakref
+from collections import deque
+
+from .checksum import checksum as compute_checksum
 
 use_caching = True
 
-@functools.lru_cache(10000)
-def _long_signature_cell(cell, root):
-    if isinstance(cell, (Inchannel, Outchannel)):
+"""
+Signatures are memoized per signature computation (memo dicts, keyed by object),
+ rather than globally, so that no objects are kept alive, and no stale
+ signatures are returned after a cell value has changed.
+For matching, signatures are reduced to hashable digests. Dependencies are
+ represented by the digest of their own signature, so that every digest is
+ computed in constant time from the digests upstream.
+"""
+
+def _digest(signature):
+    return compute_checksum(json.dumps(signature, sort_keys=True))
+
+def _long_signature_cell(cell, root, memo):
+    if isinstance(cell, Inchannel):
         return None #uncachable for now
+    if cell in memo:
+        return memo[cell][0]
+    if isinstance(cell, Outchannel):
+        # The dependencies of a structured cell are not tracked (yet)
+        #  so the signature is the checksum of the outchannel value
+        result = {"origin": "outchannel", "checksum": cell.checksum()}
+        memo[cell] = result, _digest(["cell", result])
+        return result
     result = {}
+    dependency_digest = None
     mgr = cell._get_manager()
     from_pin = mgr.cell_from_pin.get(cell)
     if from_pin is not None:
@@ -21,14 +44,16 @@ def _long_signature_cell(cell, root):
             assert isinstance(worker, Transformer) #TODO: reactors
             #TODO: for reactors, also indicate which outputpin; discount editpins
             result["origin"] = "transformer"
-            result["dependency"] = _long_signature_transformer(worker, root)
+            result["dependency"] = _long_signature_transformer(worker, root, memo)
+            dependency_digest = memo[worker][1]
         else:
             result["origin"] = "extern"
             result["path"] = from_pin.path
     elif from_cell is not None:
         if from_cell._context()._part_of(root):
             result["origin"] = "cell"
-            result["dependency"] = _long_signature_cell(from_cell, root)
+            result["dependency"] = _long_signature_cell(from_cell, root, memo)
+            dependency_digest = _long_digest(from_cell, root, memo)
         else:
             result["origin"] = "extern"
             result["path"] = from_cell.path
@@ -41,11 +66,17 @@ def _long_signature_cell(cell, root):
             # So we would have separate versions of the long_signature of this cell
         else:
             result["origin"] = "none"
+    digest = result.copy()
+    if "dependency" in digest:
+        digest["dependency"] = dependency_digest
+    memo[cell] = result, _digest(["cell", digest])
     return result
 
-@functools.lru_cache(10000)
-def _long_signature_transformer(tf, root):
+def _long_signature_transformer(tf, root, memo):
+    if tf in memo:
+        return memo[tf][0]
     result = {}
+    digest = {}
     mgr = tf._get_manager()
     for pinname, pin in tf._pins.items():
         if not isinstance(pin, InputPinBase):
@@ -54,33 +85,58 @@ def _long_signature_transformer(tf, root):
         if from_cell is not None:
             from_cell = from_cell.source
         subresult = {}
+        subdigest = None
         if from_cell is not None:
             ctx = from_cell._context()
             if ctx._part_of(root):
                 subresult["origin"] = "cell"
-                subresult["dependency"] = _long_signature_cell(from_cell, root)
+                subresult["dependency"] = _long_signature_cell(from_cell, root, memo)
+                subdigest = {
+                    "origin": "cell",
+                    "dependency": _long_digest(from_cell, root, memo)
+                }
             else:
                 subresult["origin"] = "extern"
                 subresult["path"] = from_cell.path
         else:
             subresult["origin"] = "none"
         result[pinname] = subresult
+        digest[pinname] = subdigest if subdigest is not None else subresult
+    memo[tf] = result, _digest(["transformer", digest])
     return result
 
-def long_signature(obj, root):
+def _long_digest(obj, root, memo):
+    """Hashable digest of the long signature of a cell or worker
+    Returns None if the object is uncachable"""
+    if isinstance(obj, Transformer):
+        _long_signature_transformer(obj, root, memo)
+    else:
+        _long_signature_cell(obj, root, memo)
+    entry = memo.get(obj)
+    if entry is None:
+        return None
+    return entry[1]
+
+def long_signature(obj, root, memo=None):
     """Calculates the long signature of a cell or worker
     It takes into account the direct and indirect upstream dependencies
-    Dependencies above root are considered as extern (and their path is stored)"""
+    Dependencies above root are considered as extern (and their path is stored)
+    memo: dict in which signatures are memoized; share it between calls
+     with the same root, as long as no cells change"""
+    if memo is None:
+        memo = {}
     if isinstance(obj, Cell):
-        return _long_signature_cell(obj, root)
+        return _long_signature_cell(obj, root, memo)
     elif isinstance(obj, Transformer):
-        return _long_signature_transformer(obj, root)
+        return _long_signature_transformer(obj, root, memo)
     else:
         raise TypeError()
 
 def _short_signature_cell(cell):
-    if isinstance(cell, (Inchannel, Outchannel)):
+    if isinstance(cell, Inchannel):
         return None #TODO
+    if isinstance(cell, Outchannel):
+        return cell.checksum()
     if cell.status() == "OK":
         return cell.checksum()
         #TODO: sometimes it is the text checksum we are interested in
@@ -117,6 +173,27 @@ def short_signature(obj):
     else:
         raise TypeError()
 
+def _resend_result(pin, value):
+    """Sends a result that was computed by a re-used transformer kernel
+    The connected cells may already hold the result, restored from a stale
+     state. The result is propagated downstream even then, since the cells
+     downstream may have been restored from an older state still"""
+    pin.send_update(value)
+    manager = pin._get_manager()
+    for con in manager.pin_to_cells.get(pin, []):
+        cell = con.target
+        if isinstance(cell, Inchannel):
+            # The outchannels discard values identical to the last one sent
+            structured_cell = cell.structured_cell()
+            if structured_cell is None:
+                continue
+            for outchannel in structured_cell.outchannels.values():
+                outchannel._last_value = None
+            structured_cell.touch()
+        elif isinstance(cell, CellLikeBase):
+            cell._get_manager().touch_cell(cell)
+        #else: layer connections, may be None
+
 def _do_cache(new_obj, old_obj, hits):
     if isinstance(new_obj, Cell):
         assert isinstance(old_obj, Cell)
@@ -131,12 +208,9 @@ def _do_cache(new_obj, old_obj, hits):
         hits["cells"][new_obj] = old_obj
     elif isinstance(new_obj, Transformer):
         assert isinstance(old_obj, Transformer)
+        old_obj._release_messages()
         t = old_obj.transformer
-        #TODO: thread-safe lock mechanism to modify t atomically
-        t.parent = weakref.ref(new_obj)
-        t.send_message("@RESTART", None)
-        t.output_queue = new_obj.output_queue
-        t.output_semaphore = new_obj.output_semaphore
+        t.handoff(new_obj, new_obj.output_queue, new_obj.output_semaphore)
         if old_obj.output_thread is not None:
             old_obj.output_thread.join() #happens quickly after @RESTART signal
         new_obj._listen_output_state = old_obj._listen_output_state
@@ -148,6 +222,7 @@ def _do_cache(new_obj, old_obj, hits):
         new_obj._message_id = old_obj._message_id
         assert not new_obj.active
         new_obj._last_update_checksums = old_obj._last_update_checksums.copy()
+        new_obj._input_checksums = old_obj._input_checksums.copy()
         old_obj.active = False
         old_obj.transformer = None
         old_obj.transformer_thread = None
@@ -157,58 +232,161 @@ def _do_cache(new_obj, old_obj, hits):
         raise TypeError(new_obj)
 
 
-def _cache(obj, root, old_paths, hits):
+def _short_digest(obj):
+    short_sig = short_signature(obj)
+    if short_sig is None:
+        return None
+    kind = "cell" if isinstance(obj, Cell) else "transformer"
+    # short signatures are not nested, no need to hash them
+    return json.dumps([kind, short_sig], sort_keys=True)
+
+class _OldObjects:
+    """The cells and workers of the old context, indexed by path
+     and by the digests of their long and short signatures.
+    The index entries of objects that have already been matched are removed
+     lazily, so that every entry is visited at most once"""
+    def __init__(self):
+        self.paths = {}
+        self.long_index = {}
+        self.short_index = {}
+
+    def add(self, path, long_digest, short_digest, obj):
+        self.paths[path] = long_digest, short_digest, obj
+        self.long_index.setdefault(long_digest, deque()).append(path)
+        if short_digest is not None:
+            self.short_index.setdefault(short_digest, deque()).append(path)
+
+    def pop(self, path):
+        return self.paths.pop(path)[2]
+
+    def _find(self, index, digest, pos):
+        candidates = index.get(digest)
+        if candidates is None:
+            return None
+        while candidates:
+            path = candidates[0]
+            p = self.paths.get(path)
+            if p is not None and p[pos] == digest:
+                return path
+            candidates.popleft()
+        return None
+
+    def find_long(self, digest):
+        return self._find(self.long_index, digest, 0)
+
+    def find_short(self, digest):
+        return self._find(self.short_index, digest, 1)
+
+
+def _cachable(obj, managed):
+    if isinstance(obj, (Inchannel, Outchannel)):
+        return False
+    if isinstance(obj, Cell) and (obj._master is not None or obj in managed):
+        # The cells of a structured cell must stay in sync with its monitor
+        #  and its schema; they are restored from the structured cell state instead
+        return False
+    return True
+
+def _managed_cells(children, managed):
+    """Collects the schema cells of the structured cells among children
+    (the other cells of a structured cell have a _master)"""
+    for child in children:
+        if isinstance(child, Context):
+            _managed_cells(child._children.values(), managed)
+        elif isinstance(child, StructuredCell):
+            if child.schema is not None:
+                managed.add(child.schema)
+    return managed
+
+def _collect(children, managed, result):
+    for child in children:
+        if isinstance(child, Context):
+            _collect(child._children.values(), managed, result)
+        elif isinstance(child, (Cell, Transformer)): #TODO: reactors
+            if _cachable(child, managed):
+                result.append(child)
+    return result
+
+def collect_objects(children):
+    """Collects the cachable cells and transformers among children,
+     descending into subcontexts"""
+    children = list(children)
+    managed = _managed_cells(children, set())
+    return _collect(children, managed, [])
+
+def index_objects(objects, root):
+    """Indexes old objects by path and signature, for cache_objects
+    The signatures are computed relative to root
+    This must be done while the old objects are still connected"""
+    old_objects = _OldObjects()
+    memo = {}
+    for obj in objects:
+        long_digest = _long_digest(obj, root, memo)
+        short_digest = _short_digest(obj)
+        old_objects.add(obj.path, long_digest, short_digest, obj)
+    return old_objects
+
+def _cache_preserved(obj, root, old_objects, hits, memo):
     path = obj.path
-    long_sig = long_signature(obj, root)
-    if path in old_paths and old_paths[path][0] == long_sig:
+    long_digest = _long_digest(obj, root, memo)
+    p = old_objects.paths.get(path)
+    if p is not None and p[0] == long_digest:
         #print("cache hit by preservation", obj)
-        p = old_paths.pop(path)
-        return _do_cache(obj, p[2], hits)
-    for old_path in list(old_paths.keys()):
-        p = old_paths[old_path]
-        if p[0] == long_sig:
-            #print("cache hit by long signature", obj, old_path)
-            old_paths.pop(old_path)
-            return _do_cache(obj, p[2], hits)
-    short_sig = short_signature(obj)
-    if short_sig is not None:
-        for old_path in list(old_paths.keys()):
-            p = old_paths[old_path]
-            if p[1] == short_sig:
-                #print("cache hit by short signature", obj, old_path)
-                old_paths.pop(old_path)
-                return _do_cache(obj, p[2], hits)
+        _do_cache(obj, old_objects.pop(path), hits)
+        return True
+    return False
+
+def _cache(obj, root, old_objects, hits, memo):
+    long_digest = _long_digest(obj, root, memo)
+    old_path = old_objects.find_long(long_digest)
+    if old_path is not None:
+        #print("cache hit by long signature", obj, old_path)
+        return _do_cache(obj, old_objects.pop(old_path), hits)
+    short_digest = _short_digest(obj)
+    if short_digest is not None:
+        old_path = old_objects.find_short(short_digest)
+        if old_path is not None:
+            #print("cache hit by short signature", obj, old_path)
+            return _do_cache(obj, old_objects.pop(old_path), hits)
     #print("cache miss", obj)
 
-def cache(ctx, old_ctx):
+def cache_objects(objects, root, old_objects):
+    """Transfers values and transformer kernels from old objects
+     (indexed with index_objects) to new objects with the same signature
+    The signatures of the new objects are computed relative to root"""
     hits = {"transformers": {}, "cells": {}}
-    if not use_caching:
-        return hits
-    old_paths = {}
-    def build_paths(c):
-        for child in c._children.values():
-            if isinstance(child, Context):
-                build_paths(child)
-            elif isinstance(child, (Cell, Transformer)): #TODO: reactors
-                if isinstance(child, (Inchannel, Outchannel)):
-                    continue
-                path = child.path
-                long_sig = long_signature(child, old_ctx)
-                short_sig = short_signature(child)
-                old_paths[path] = long_sig, short_sig, child
-    build_paths(old_ctx)
-    def walk(c):
-        for child in c._children.values():
-            if isinstance(child, Context):
-                walk(child)
-            elif isinstance(child, (Cell, Transformer)): #TODO: reactors
-                _cache(child, ctx, old_paths, hits)
-    walk(ctx)
+    memo = {}
+    # First, all hits by preservation, so that an object whose signature
+    #  did not change does not lose its old counterpart to another object
+    #  that happens to have the same signature
+    remaining = [obj for obj in objects \
+      if not _cache_preserved(obj, root, old_objects, hits, memo)]
+    for obj in remaining:
+        _cache(obj, root, old_objects, hits, memo)
+    # The result of a re-used kernel may have arrived after the old object
+    #  was deactivated. Re-send it once the new object is activated.
+    # The work buffer of root is flushed after the ones of its children, i.e.
+    #  after the (possibly stale) updates buffered during construction
+    manager = root._get_manager()
+    for new_obj in hits["transformers"]:
+        result = new_obj.transformer.last_result
+        if result is None or new_obj._output_name is None:
+            continue
+        pin = new_obj._pins[new_obj._output_name]
+        manager.buffered_work.append(functools.partial(_resend_result, pin, result))
     return hits
 
+def cache(ctx, old_ctx):
+    if not use_caching:
+        return {"transformers": {}, "cells": {}}
+    old_objects = index_objects(collect_objects(old_ctx._children.values()), old_ctx)
+    new_objects = collect_objects(ctx._children.values())
+    return cache_objects(new_objects, ctx, old_objects)
+
 from . import Context, Cell, Transformer #TODO: reactors
+from .cell import CellLikeBase
 from .worker import InputPinBase
-from .structured_cell import Inchannel, Outchannel
+from .structured_cell import StructuredCell, Inchannel, Outchannel
 
 """
 Something to consider (long term): topology hits
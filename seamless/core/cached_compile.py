@@ -1,15 +1,103 @@
+"""
+Compilation of Python code, with caching
+
+Compiled code objects are kept in an in-memory LRU cache, keyed on the
+ checksum of the code, the identifier (that becomes co_filename),
+ the compile mode and the compile flags.
+
+Optionally, code objects are also stored on disk (marshalled, much like
+ __pycache__), so that identical code does not get recompiled after a restart.
+
+Configuration via environment variables:
+- SEAMLESS_COMPILE_CACHE_SIZE: number of code objects kept in memory
+   (default: 1000). 0 disables the in-memory cache.
+- SEAMLESS_COMPILE_CACHE_DIR: directory of the on-disk cache
+   (default: not set, no on-disk cache)
+"""
+
+import os
+import sys
 import linecache
+import marshal
+import threading
+from collections import OrderedDict
+from ast import PyCF_ONLY_AST
 
+from .checksum import checksum as compute_checksum
 
-def cached_compile(code, identifier, mode="exec", flags=None, \
-  dont_inherit=0):
+CACHE_SIZE = int(os.environ.get("SEAMLESS_COMPILE_CACHE_SIZE", 1000))
+CACHE_DIR = os.environ.get("SEAMLESS_COMPILE_CACHE_DIR")
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _disk_cache_file(key):
+    keystr = "%s-%s-%s-%s" % key[1:]
+    keyhash = compute_checksum(keystr)
+    tag = sys.implementation.cache_tag
+    filename = "%s-%s.%s.marshal" % (key[0], keyhash, tag)
+    return os.path.join(CACHE_DIR, filename)
+
+def _load_from_disk(key):
+    filename = _disk_cache_file(key)
+    try:
+        with open(filename, "rb") as f:
+            return marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+def _save_to_disk(key, code_object):
+    filename = _disk_cache_file(key)
+    tmpfile = "%s.%d.%d.tmp" % (filename, os.getpid(), threading.get_ident())
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(tmpfile, "wb") as f:
+            marshal.dump(code_object, f)
+        os.replace(tmpfile, filename) # atomic, for concurrent writers
+    except OSError:
+        try:
+            os.remove(tmpfile)
+        except OSError:
+            pass
+
+def _compile(code, identifier, mode, flags, dont_inherit):
     if flags is not None:
-        ast = compile(code, identifier, mode, flags, dont_inherit)
+        return compile(code, identifier, mode, flags, dont_inherit)
     else:
-        ast = compile(code, identifier, mode, dont_inherit=dont_inherit)
+        return compile(code, identifier, mode, dont_inherit=dont_inherit)
+
+def cached_compile(code, identifier, mode="exec", flags=None, \
+  dont_inherit=0):
     cache_entry = (
         len(code), None,
         [line+'\n' for line in code.splitlines()], identifier
     )
     linecache.cache[identifier] = cache_entry
-    return ast
+    if flags is not None and flags & PyCF_ONLY_AST:
+        # ASTs are mutable, and cannot be marshalled
+        return _compile(code, identifier, mode, flags, dont_inherit)
+    checksum = compute_checksum(code)
+    key = (checksum, identifier, mode, flags, dont_inherit)
+    with _cache_lock:
+        code_object = _cache.get(key)
+        if code_object is not None:
+            _cache.move_to_end(key)
+            return code_object
+    code_object = None
+    if CACHE_DIR is not None:
+        code_object = _load_from_disk(key)
+    if code_object is None:
+        code_object = _compile(code, identifier, mode, flags, dont_inherit)
+        if CACHE_DIR is not None:
+            _save_to_disk(key, code_object)
+    if CACHE_SIZE > 0:
+        with _cache_lock:
+            _cache[key] = code_object
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    return code_object
+
+def clear_compile_cache():
+    """Clears the in-memory cache (the on-disk cache is left intact)"""
+    with _cache_lock:
+        _cache.clear()
@@ -1,6 +1,5 @@
 from copy import deepcopy
 import json
-import hashlib
 from io import BytesIO
 import numpy as np
 import pickle
@@ -13,13 +12,42 @@ from .protocol import transfer_modes, access_modes, content_types, json_encode
 from .. import Wrapper
 from . import SeamlessBase
 from ..mixed import io as mixed_io
+from ..mixed.io.to_stream import to_stream_parts
 from .cached_compile import cached_compile
 from . import macro_register, get_macro_mode
 from .mount import MountItem
 from .utils import strip_source
+from .buffer_store import buffer_store
+from .checksum import checksum as compute_checksum, checksum_mixed, _array_parts
+import mmap
 
 cell_counter = 0
 
+_COMPARE_SIZE = 65536
+
+def _is_stream_of(buffer, parts):
+    """Returns True if buffer is the concatenation of parts
+    Parts that are views on buffer, at their own offset, are not compared.
+    Other parts are compared byte by byte if they are small;
+     if they are large, False is returned."""
+    buf = np.frombuffer(buffer, np.uint8)
+    address = buf.__array_interface__["data"][0]
+    offset = 0
+    for part in parts:
+        part = np.frombuffer(part, np.uint8)
+        end = offset + len(part)
+        if end > len(buf):
+            return False
+        if not len(part):
+            continue
+        if part.__array_interface__["data"][0] != address + offset:
+            if len(part) > _COMPARE_SIZE:
+                return False
+            if not np.array_equal(part, buf[offset:end]):
+                return False
+        offset = end
+    return offset == len(buf)
+
 class CellLikeBase(SeamlessBase):
     _exported = True
     _is_text = False
@@ -45,6 +73,8 @@ class CellBase(CellLikeBase):
     _val = None
     _last_checksum = None
     _last_text_checksum = None
+    _store_buffers = False  # share the value (and memory-mapped buffer) in the buffer store
+    _buffer_checksum = None # checksum on which we hold a buffer store reference
     _naming_pattern = "cell"
     _prelim_val = None
     _authoritative = True
@@ -133,12 +163,15 @@ class CellBase(CellLikeBase):
         return self
 
     def from_buffer(self, value, checksum=None):
-        """Sets a cell from a buffer value"""
+        """Sets a cell from a buffer value
+        checksum: the checksum of the buffer, if already known"""
         if self._context is None:
             self._prelim_val = value, False #non-default-value prelim
         else:
             manager = self._get_manager()
-            manager.set_cell(self, value, from_buffer=True, force=True)
+            manager.set_cell(
+              self, value, from_buffer=True, force=True, buffer_checksum=checksum
+            )
         return self
 
     def from_file(self, filepath):
@@ -170,6 +203,52 @@ class CellBase(CellLikeBase):
     def _reset_checksums(self):
         self._last_checksum = None
         self._last_text_checksum = None
+        self._release_buffer()
+
+    def _hold_buffer(self, checksum, buffer=None):
+        """Takes a buffer store reference on checksum, storing the buffer (if given)
+        The value is then shared with the other cells that hold checksum"""
+        if checksum == self._buffer_checksum:
+            if buffer is not None:
+                buffer_store.add(checksum, buffer)
+            return
+        self._release_buffer()
+        buffer_store.incref(checksum, buffer)
+        self._buffer_checksum = checksum
+        self._share_value(checksum)
+
+    def _share_value(self, checksum):
+        """Replaces the value by the value of the other cells with the same checksum
+        Only arrays are shared, as read-only arrays (see buffer_store).
+        Slave cells are excluded, since their value is modified in-place"""
+        if self._master is not None or self._val is None:
+            return
+        self._val = buffer_store.share_value(checksum, self._val)
+
+    def _release_buffer(self):
+        if self._buffer_checksum is not None:
+            buffer_store.decref(self._buffer_checksum)
+            self._buffer_checksum = None
+
+    def _to_buffer(self):
+        """Serializes the current value into a buffer"""
+        raise NotImplementedError
+
+    def _is_buffer_of(self, buffer, value):
+        """Returns True if buffer is known to be the serialized buffer of value,
+         i.e. if they have the same checksum"""
+        return False
+
+    def _get_buffer(self):
+        """Returns the buffer of the current value, from the buffer store if possible"""
+        checksum = self.checksum()
+        if checksum is None:
+            return None
+        buffer = buffer_store.get(checksum)
+        if buffer is None:
+            buffer = self._to_buffer()
+            self._hold_buffer(checksum, buffer)
+        return buffer
 
     def _assign(self, value):
         assert value is not None
@@ -189,12 +268,17 @@ class CellBase(CellLikeBase):
 
     def deserialize(self, value,
       transfer_mode, access_mode, content_type,
-      *, from_pin, default, force=False
+      *, from_pin, default, force=False, checksum=None, buffer_checksum=None
     ):
         """Should normally be invoked by the manager, since it does not notify the manager
         from_pin: can be True (normal pin that has authority), False (from code) or "edit" (edit pin)
         default: indicates a default value (pins may overwrite it)
         force: force deserialization, even if slave (normally, force is invoked only by structured_cell)
+        checksum: the checksum of the value, if already known (from a cell of the same type).
+          This avoids re-computing it, and shares the buffer in the buffer store.
+        buffer_checksum: the checksum of value, if transfer_mode is "buffer".
+          If value is the serialized buffer of the deserialized value, this is
+           its checksum as well, and value is stored in the buffer store.
         """        
         assert from_pin in (True, False, "edit", "duplex")
         if not force:
@@ -225,6 +309,22 @@ class CellBase(CellLikeBase):
             self._val = curr_val
             raise
         self._status = self.StatusFlags.OK
+        buffer = None
+        if checksum is None and buffer_checksum is not None \
+          and transfer_mode == "buffer" and self._store_buffers:
+            if self._is_buffer_of(value, parsed_value):
+                checksum = buffer_checksum
+                if memoryview(value).readonly:
+                    # writable buffers (e.g. copy-on-write maps) may change
+                    buffer = value
+        if checksum is not None:
+            self._last_checksum = checksum
+            if self._store_buffers:
+                self._hold_buffer(checksum, buffer)
+        elif self._store_buffers and self._master is None \
+          and isinstance(self._val, np.ndarray):
+            # identical arrays are shared, even if they were set independently
+            self.checksum(may_fail=True)
         if old_checksum is None: #old checksum failed
             different = True
             text_different =True
@@ -308,6 +408,9 @@ class CellBase(CellLikeBase):
         if self._last_checksum is not None:
             return self._last_checksum
         result = self._checksum(self._val, may_fail=may_fail)
+        if self._store_buffers and result is not None:
+            # The checksum of the value is the checksum of its buffer
+            self._hold_buffer(result)
         self._last_checksum = result
         return result
 
@@ -338,12 +441,16 @@ class CellBase(CellLikeBase):
             self._mount = {}
         self._mount.update({"extension": extension})
 
-    def mount(self, path=None, mode="rw", authority="cell", persistent=True):
+    def mount(self, path=None, mode="rw", authority="cell", persistent=True, mmap=False):
         """Performs a "lazy mount"; cell is mounted to the file when macro mode ends
         path: file path (can be None if an ancestor context has been mounted)
         mode: "r", "w" or "rw"
         authority: "cell", "file" or "file-strict"
         persistent: whether or not the file persists after the context has been destroyed
+        mmap: for array and mixed cells. If True, the file is memory-mapped,
+          and the cell value is a read-only view on the map.
+          If "copy", the map is copy-on-write, and the value is writable.
+          Values are written to the file through a map as well.
         """
         from .mount import is_dummy_mount
         assert is_dummy_mount(self._mount) #Only the mountmanager may modify this further!
@@ -361,6 +468,8 @@ class CellBase(CellLikeBase):
             "authority": authority,
             "persistent": persistent,
         })
+        if mmap:
+            self._mount["mmap"] = mmap
         self._mount.update(self._mount_kwargs)
         MountItem(None, self, dummy=True, **self._mount) #to validate parameters
 
@@ -398,7 +507,7 @@ Use ``Cell.status()`` to get its status.
         v = str(value)
         if buffer and type(self)._is_text:
             v = v.rstrip("\n")
-        return hashlib.md5(v.encode("utf-8")).hexdigest()
+        return compute_checksum(v)
 
     def _validate(self, value):
         pass
@@ -434,6 +543,7 @@ class ArrayCell(Cell):
     #also provides copy+silk and ref+silk transport, but with an empty schema, and text form
 
     _mount_kwargs = {"binary": True}
+    _store_buffers = True
 
     _supported_modes = []
     for transfer_mode in "buffer", "copy", "ref":
@@ -443,11 +553,10 @@ class ArrayCell(Cell):
     def _checksum(self, value, *, buffer=False, may_fail=False):
         if value is None:
             return None
-        if buffer:
-            return super()._checksum(value)
-        assert isinstance(value, np.ndarray)
-        b = self._value_to_bytes(value)
-        return super()._checksum(b, buffer=True)
+        if not buffer:
+            assert isinstance(value, np.ndarray)
+        # The array is hashed as its .npy buffer, without serializing it
+        return compute_checksum(value)
 
     def _value_to_bytes(self, value):
         b = BytesIO()
@@ -457,9 +566,27 @@ class ArrayCell(Cell):
     def _validate(self, value):
         assert isinstance(value, np.ndarray)
 
-    def serialize_buffer(self):
+    def _to_buffer(self):
         return self._value_to_bytes(self._val)
 
+    def serialize_buffer(self):
+        return self._get_buffer()
+
+    def _buffer_parts(self):
+        """Returns the buffer of the current value as a list of segments,
+         without concatenating them"""
+        buffer = buffer_store.get(self.checksum())
+        if buffer is not None:
+            return [buffer]
+        if self._val.dtype.hasobject:
+            return [self._get_buffer()]
+        return list(_array_parts(self._val))
+
+    def _is_buffer_of(self, buffer, value):
+        if value.dtype.hasobject:
+            return False
+        return _is_stream_of(buffer, _array_parts(value))
+
     def _serialize(self, transfer_mode, access_mode, content_type):
         if transfer_mode == "buffer":
             return self.serialize_buffer()
@@ -471,6 +598,10 @@ class ArrayCell(Cell):
     def _from_buffer(self, value):
         if value is None:
             return None
+        if isinstance(value, (mmap.mmap, bytes)):
+            # a view on the map, or a read-only view on the buffer,
+            #  so that the buffer store does not hold the data twice
+            return mixed_io.from_stream(value, "pure-binary", None, copy=False)
         b = BytesIO(value)
         return np.load(b)
 
@@ -486,6 +617,7 @@ class ArrayCell(Cell):
 
 class MixedCell(Cell):
     _mount_kwargs = {"binary": True}
+    _store_buffers = True
     _supported_modes = []
     for transfer_mode in "buffer", "copy", "ref":
         _supported_modes.append((transfer_mode, "object", "mixed"))
@@ -502,7 +634,9 @@ class MixedCell(Cell):
             return None
         storage = self.storage_cell.value
         form = self.form_cell.value
-        return mixed_io.from_stream(value, storage, form)
+        # Memory-mapped files: the arrays are views on the map
+        copy = not isinstance(value, mmap.mmap)
+        return mixed_io.from_stream(value, storage, form, copy=copy, lazy=True)
 
     def _value_to_bytes(self, value, storage, form):
         if value is None:
@@ -518,26 +652,46 @@ class MixedCell(Cell):
         if value is None:
             return None
         if buffer:
-            b = value
+            return compute_checksum(value)
+        #assumes that storage and form are correct!
+        storage = self.storage_cell.value
+        form = self.form_cell.value
+        if may_fail:
+            try:
+                return checksum_mixed(value, storage, form)
+            except:
+                return None
         else:
-            #assumes that storage and form are correct!
-            storage = self.storage_cell.value
-            form = self.form_cell.value
-            if may_fail:
-                try:
-                    b = self._value_to_bytes(value, storage, form)
-                except:
-                    return None
-            else:
-                b = self._value_to_bytes(value, storage, form)
-        return hashlib.md5(b).hexdigest()
+            return checksum_mixed(value, storage, form)
 
     def _validate(self, value):
         return ###TODO: how to validate?? check that value conforms to form?
 
-    def serialize_buffer(self):
+    def _to_buffer(self):
         return self._to_bytes()
 
+    def serialize_buffer(self):
+        return self._get_buffer()
+
+    def _buffer_parts(self):
+        """Returns the buffer of the current value as a list of segments,
+         without concatenating them"""
+        buffer = buffer_store.get(self.checksum())
+        if buffer is not None:
+            return [buffer]
+        storage = self.storage_cell.value
+        form = self.form_cell.value
+        return to_stream_parts(self._val, storage, form)
+
+    def _is_buffer_of(self, buffer, value):
+        storage = self.storage_cell.value
+        form = self.form_cell.value
+        try:
+            parts = to_stream_parts(value, storage, form)
+        except Exception:
+            return False
+        return _is_stream_of(buffer, parts)
+
     def _serialize(self, transfer_mode, access_mode, content_type):
         if transfer_mode == "buffer":
             return self.serialize_buffer()
@@ -634,7 +788,7 @@ class PythonCell(Cell):
     def _text_checksum(self, value, *, buffer=False, may_fail=False):
         v = str(value)
         v = v.rstrip("\n") + "\n"
-        return hashlib.md5(v.encode("utf-8")).hexdigest()
+        return compute_checksum(v)
 
     def _checksum(self, value, *, buffer=False, may_fail=False):
         if value is None:
@@ -646,7 +800,7 @@ class PythonCell(Cell):
         # For now, use ast, because pickle seems to be newline-sensitive
         dump = ast.dump(tree).encode("utf-8")
         #dump = pickle.dumps(tree)
-        return hashlib.md5(dump).hexdigest()
+        return compute_checksum(dump)
 
     def _validate(self, value):
         from .protocol import TransferredCell
@@ -896,7 +1050,7 @@ class CsonCell(JsonCell):
     def _text_checksum(self, value, *, buffer=False, may_fail=False):
         v = str(value)
         v = v.rstrip("\n") + "\n"
-        return hashlib.md5(v.encode("utf-8")).hexdigest()
+        return compute_checksum(v)
 
     @staticmethod
     def _json(value):
@@ -0,0 +1,110 @@
+"""
+Checksum computation, with a pluggable hash backend
+
+All checksums (of cells, injected modules, compiled code) are computed here.
+Data is hashed incrementally: Numpy arrays are hashed through the buffer
+ protocol in chunks, without serializing them first, and mixed data is hashed
+ part by part (header, form, buffer) instead of as one concatenated stream.
+The checksum of an array is the same as the checksum of its .npy buffer
+ (as written by np.save), so that cells get the same checksum from a value
+ as from its buffer.
+
+The algorithm is selected with the environment variable
+ SEAMLESS_CHECKSUM_ALGORITHM (default: md5). Supported are all hashlib
+ algorithms (e.g. sha1, sha256, blake2b, blake2s), and xxh64, xxh3_64,
+ xxh3_128 and xxh128 if the xxhash package is installed.
+Additional backends can be added with register_hash_backend.
+"""
+
+import os
+import hashlib
+from io import BytesIO
+import numpy as np
+
+CHECKSUM_ALGORITHM = os.environ.get("SEAMLESS_CHECKSUM_ALGORITHM", "md5")
+CHUNK_SIZE = 16 * 1024 * 1024 # chunk size (in bytes) for hashing non-contiguous arrays
+
+def _xxhash_backend(name):
+    def factory():
+        try:
+            import xxhash
+        except ImportError:
+            raise ImportError(
+                "Checksum algorithm '%s' requires the xxhash package" % name
+            ) from None
+        return getattr(xxhash, name)()
+    return factory
+
+hash_backends = {
+    name: _xxhash_backend(name)
+    for name in ("xxh32", "xxh64", "xxh3_64", "xxh3_128", "xxh128")
+}
+
+def register_hash_backend(name, factory):
+    """Registers a hash backend
+    factory() must return a hasher object with the hashlib interface
+     (.update and .hexdigest)"""
+    hash_backends[name] = factory
+
+def get_hasher(algorithm=None):
+    """Returns a new hasher object for algorithm (default: CHECKSUM_ALGORITHM)"""
+    if algorithm is None:
+        algorithm = CHECKSUM_ALGORITHM
+    factory = hash_backends.get(algorithm)
+    if factory is not None:
+        return factory()
+    return hashlib.new(algorithm)
+
+def _raw_view(arr):
+    """Returns a view of arr whose copies keep all bytes of the array items
+    Copying a struct array field by field does not copy the padding bytes
+     between the fields, unlike np.save"""
+    if not isinstance(arr, np.ndarray) or arr.dtype.fields is None:
+        return arr
+    return arr.view(np.dtype((np.void, arr.dtype.itemsize)))
+
+def _array_parts(arr):
+    """Yields the .npy buffer of arr in parts, without copying the array data
+    (unless the array is not contiguous)"""
+    header = BytesIO()
+    np.lib.format.write_array_header_1_0(
+        header, np.lib.format.header_data_from_array_1_0(arr)
+    )
+    yield header.getvalue()
+    if arr.flags.c_contiguous:
+        yield memoryview(arr.reshape(-1).view(np.uint8))
+    elif arr.flags.f_contiguous:
+        # np.save writes Fortran-ordered arrays as such
+        yield memoryview(arr.T.reshape(-1).view(np.uint8))
+    else:
+        arr = _raw_view(arr)
+        rowsize = max(arr[:1].nbytes, 1)
+        nrows = max(CHUNK_SIZE // rowsize, 1)
+        for n in range(0, len(arr), nrows):
+            chunk = np.ascontiguousarray(arr[n:n+nrows])
+            yield memoryview(chunk.reshape(-1).view(np.uint8))
+
+def checksum_parts(parts, algorithm=None):
+    """Checksum of the concatenation of parts (str or bytes-like)"""
+    hasher = get_hasher(algorithm)
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        hasher.update(part)
+    return hasher.hexdigest()
+
+def checksum(data, algorithm=None):
+    """Checksum of a str, a bytes-like object or a Numpy array"""
+    if isinstance(data, np.ndarray) and not data.dtype.hasobject:
+        return checksum_parts(_array_parts(data), algorithm)
+    return checksum_parts((data,), algorithm)
+
+def checksum_mixed(data, storage, form, algorithm=None):
+    """Checksum of mixed data, identical to the checksum of its to_stream buffer"""
+    from ..mixed.io.to_stream import to_stream_parts
+    from ..mixed.chunked import ChunkedArray
+    if isinstance(data, ChunkedArray):
+        return checksum_parts(data.stream_parts(), algorithm)
+    if storage == "pure-binary":
+        return checksum(np.asarray(data), algorithm)
+    return checksum_parts(to_stream_parts(data, storage, form), algorithm)
@@ -74,15 +74,20 @@ class CellToCellConnection(Connection):
           self.target_access_mode, self.target_content_type, type(value), self.adapter
         )
         """
+        checksum = None
         if self.adapter and value is not None:
             value = self.adapter(value)
+        elif value is not None and isinstance(cell, CellBase) \
+          and type(target) is type(cell):
+            # Same cell type: hand off the checksum instead of re-computing it
+            checksum = cell.checksum(may_fail=True)
         #from_pin is set to True, also for aliases...
         #but not if duplex is True, meaning that we are two cells connected to each other
         from_pin = "duplex" if self.duplex else True
         different, text_different = target.deserialize(
           value,
           self.transfer_mode, self.target_access_mode, self.target_content_type,
-          from_pin=from_pin, default=False
+          from_pin=from_pin, default=False, checksum=checksum
         )
         other = target._get_manager()
         if target._mount is not None:
@@ -188,5 +193,6 @@ class PinToCellConnection(Connection):
 from .worker import Worker, InputPin, EditPin, \
   InputPinBase, EditPinBase, OutputPinBase
 from .layer import Path
+from .cell import CellBase
 from .protocol import select_adapter
 from .structured_cell import Inchannel, Outchannel, Editchannel
@@ -8,6 +8,9 @@ from .macro_mode import toplevel_register, macro_mode_on, with_macro_mode
 import time
 from contextlib import contextmanager
 
+# Maximum time that equilibrate waits for new work, before checking again
+EQUILIBRATE_FAILSAFE_LATENCY = 0.05
+
 @contextmanager
 def null_context():
     yield
@@ -237,16 +240,13 @@ context : context or None
         else:
             return finished
 
-    def equilibrate(self, timeout=None, report=0.5):
-        """
-        Run workers and cell updates until all workers are stable,
-         i.e. they have no more updates to process
-        If you supply a timeout, equilibrate() will return after at most
-         "timeout" seconds, returning the remaining set of unstable workers
-        Report the workers that are not stable every "report" seconds
-        """
+    def _equilibrate(self, timeout, report):
+        """Equilibration logic, shared by equilibrate() and equilibrate_async()
+        Yields the maximum time (in seconds) to wait for new work,
+         before checking again.
+        Returns the remaining set of unstable workers"""
         if self._root()._equilibrating:
-            return
+            return None
         if get_macro_mode():
             raise Exception("ctx.equilibrate() will not work in macro mode")
         assert self._get_manager().active
@@ -260,36 +260,35 @@ context : context or None
                 return set()
             if finished:
                 return set()
-            last_unstable = set()
+            last_unstable = []
             while 1:
                 if self._destroyed:
                     return set()
                 curr_time = time.time()
                 if curr_time - last_report_time > report:
-                    manager = self._get_manager()
                     unstable = self.unstable_workers
-                    if last_unstable != unstable:
-                        last_unstable = unstable
-                        print("Equilibrate: waiting for:", self.unstable_workers)
+                    # no workers to report while only the work queue is flushed
+                    if len(unstable) and list(unstable) != last_unstable:
+                        last_unstable = list(unstable)
+                        print("Equilibrate: waiting for:", unstable)
                     last_report_time = curr_time
                 if timeout is not None:
                     if curr_time - start_time > timeout:
                         break
-                finished1, _ = self._flush_workqueue()
+                finished, children_unstable = self._flush_workqueue()
                 if self._destroyed:
                     return set()
                 manager = self._get_manager()
-                len1 = len(manager.unstable)
-                time.sleep(0.001)
-                finished2, children_unstable = self._flush_workqueue()
-                if self._destroyed:
-                    return set()
-                manager = self._get_manager()
-                len2 = len(manager.unstable)
                 manager.children_unstable = children_unstable
-                if finished1 and finished2:
-                    if len1 == 0 and len2 == 0:
-                        break
+                if finished and not len(manager.unstable) \
+                  and not len(manager.workqueue):
+                    break
+                # Wait until there is new work (e.g. a transformer result)
+                wait = EQUILIBRATE_FAILSAFE_LATENCY
+                if timeout is not None:
+                    remaining = start_time + timeout - time.time()
+                    wait = max(min(wait, remaining), 0)
+                yield wait
             if self._destroyed:
                 return set()
             manager = self._get_manager()
@@ -300,6 +299,44 @@ context : context or None
         finally:
             self._root()._equilibrating = False
 
+    def equilibrate(self, timeout=None, report=0.5):
+        """
+        Run workers and cell updates until all workers are stable,
+         i.e. they have no more updates to process
+        If you supply a timeout, equilibrate() will return after at most
+         "timeout" seconds, returning the remaining set of unstable workers
+        Report the workers that are not stable every "report" seconds
+        """
+        from .mainloop import get_event_loop
+        loop = get_event_loop()
+        if not loop.is_running():
+            return loop.run_until_complete(
+                self.equilibrate_async(timeout, report)
+            )
+        # Called from within the event loop: block the loop while waiting
+        workqueue = self._get_manager().workqueue
+        equilibration = self._equilibrate(timeout, report)
+        while 1:
+            try:
+                wait = next(equilibration)
+            except StopIteration as exc:
+                return exc.value
+            workqueue.wait_for_work_sync(wait)
+
+    async def equilibrate_async(self, timeout=None, report=0.5):
+        """
+        Version of equilibrate() to be awaited from a coroutine
+        While waiting for workers, the event loop continues to run
+        """
+        workqueue = self._get_manager().workqueue
+        equilibration = self._equilibrate(timeout, report)
+        while 1:
+            try:
+                wait = next(equilibration)
+            except StopIteration as exc:
+                return exc.value
+            await workqueue.wait_for_work(wait)
+
     @property
     def unstable_workers(self):
         """All unstable workers (not in equilibrium)"""
@@ -323,7 +360,7 @@ context : context or None
             return result
         return self.StatusFlags.OK.name
 
-    def mount(self, path=None, mode="rw", authority="cell", persistent=False):
+    def mount(self, path=None, mode="rw", authority="cell", persistent=False, backend=None):
         """Performs a "lazy mount"; context is mounted to the directory path when macro mode ends
         path: directory path (can be None if an ancestor context has been mounted)
         mode: "r", "w" or "rw" (passed on to children)
@@ -331,6 +368,8 @@ context : context or None
         persistent: whether or not the directory persists after the context has been destroyed
                     The same setting is applied to all children
                     May also be None, in which case the directory is emptied, but remains
+        backend: storage backend of the context and its children (see mount_backends.py)
+                 "directory" (default) or "sqlite" (path is then the database file)
         """
         assert self._mount is None #Only the mountmanager may modify this further!
         if self._root()._direct_mode:
@@ -342,6 +381,10 @@ context : context or None
             "authority": authority,
             "persistent": persistent
         }
+        if backend is not None:
+            self._mount["backend"] = backend
+            if path is not None:
+                self._mount["backend_root"] = path
         MountItem(None, self, dummy=True, **self._mount) #to validate parameters
 
     def __dir__(self):
@@ -372,6 +415,8 @@ context : context or None
         for childname, child in self._children.items():
             if isinstance(child, (Context, Worker)):
                 child.destroy(from_del=from_del)
+            elif isinstance(child, CellBase):
+                child._release_buffer()
         self._manager.destroy(from_del=from_del)
         if self._toplevel:
             toplevel_register.remove(self)
@@ -466,7 +511,7 @@ class _InternalChildrenWrapper:
         raise AttributeError("_InternalChildrenWrapper is read-only")
 
 from .link import Link
-from .cell import Cell, CellLikeBase
+from .cell import Cell, CellLikeBase, CellBase
 from .worker import Worker, InputPinBase, OutputPinBase, EditPinBase
 
 from .manager import Manager
@@ -0,0 +1,252 @@
+"""
+Event-driven watching of mounted files, using Linux inotify
+
+Instead of polling every mounted file (os.stat) periodically, the mount
+ manager waits for inotify events on the directories that contain mounted
+ files. Directories are watched rather than files, so that files that are
+ created later, or replaced by an editor (write to a temporary file,
+ then rename), are seen as well.
+Rapid sequences of events (e.g. an editor save) are debounced: after the
+ first event, events are collected until there has been none for
+ DEBOUNCE seconds (or until MAX_DEBOUNCE seconds have passed).
+
+inotify is accessed through ctypes (no dependencies). If it is not
+ available (non-Linux), or SEAMLESS_MOUNT_WATCHER is "poll",
+ get_watcher() returns None and the mount manager polls.
+If a directory cannot be watched (e.g. it does not exist yet), or the
+ inotify event queue overflows, the affected paths are reported as
+ changed, so that the mount manager polls them.
+"""
+
+import os
+import sys
+import time
+import struct
+import selectors
+import ctypes, ctypes.util
+from threading import RLock
+
+WATCHER = os.environ.get("SEAMLESS_MOUNT_WATCHER", "inotify")
+DEBOUNCE = float(os.environ.get("SEAMLESS_MOUNT_DEBOUNCE", 0.01))
+MAX_DEBOUNCE = 0.1
+
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+
+_WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM \
+  | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF \
+  | IN_ONLYDIR
+_EVENT_HEADER = struct.Struct("iIII") # wd, mask, cookie, len
+
+_libc = None
+def _get_libc():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc = libc
+    return _libc
+
+class InotifyWatcher:
+    """Watches a set of file paths, through inotify watches on their directories
+    wait() blocks until some paths have changed, and returns them"""
+    def __init__(self):
+        libc = _get_libc()
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.fd = fd
+        self.lock = RLock()
+        self.paths = {} # path => reference count
+        self.dirs = {} # directory => watch descriptor
+        self.watches = {} # watch descriptor => (directory, {file name: paths})
+        self.unwatched = set() # paths whose directory could not be watched
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        # selectors rather than select.select, which fails for fd >= 1024
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.fd, selectors.EVENT_READ)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+        self._event_selector = selectors.DefaultSelector()
+        self._event_selector.register(self.fd, selectors.EVENT_READ)
+
+    @staticmethod
+    def _split(path):
+        return os.path.split(os.path.abspath(path))
+
+    def _add_watch(self, directory):
+        wd = _get_libc().inotify_add_watch(self.fd, directory.encode(), _WATCH_MASK)
+        if wd < 0:
+            return None
+        self.dirs[directory] = wd
+        if wd not in self.watches:
+            self.watches[wd] = (directory, {})
+        return wd
+
+    def add(self, path):
+        """Starts watching path"""
+        with self.lock:
+            count = self.paths.get(path, 0)
+            self.paths[path] = count + 1
+            if count:
+                return
+            directory, name = self._split(path)
+            wd = self.dirs.get(directory)
+            if wd is None:
+                wd = self._add_watch(directory)
+            if wd is None:
+                self.unwatched.add(path)
+                return
+            self.watches[wd][1].setdefault(name, set()).add(path)
+
+    def remove(self, path):
+        """Stops watching path"""
+        with self.lock:
+            count = self.paths.get(path)
+            if count is None:
+                return
+            if count > 1:
+                self.paths[path] = count - 1
+                return
+            self.paths.pop(path)
+            self.unwatched.discard(path)
+            directory, name = self._split(path)
+            wd = self.dirs.get(directory)
+            if wd is None:
+                return
+            names = self.watches[wd][1]
+            paths = names.get(name)
+            if paths is not None:
+                paths.discard(path)
+                if not len(paths):
+                    names.pop(name)
+            if not len(names):
+                self.dirs.pop(directory)
+                self.watches.pop(wd)
+                _get_libc().inotify_rm_watch(self.fd, wd)
+
+    def _retry_unwatched(self):
+        # Directories may have been created in the meantime
+        for path in list(self.unwatched):
+            directory, name = self._split(path)
+            wd = self.dirs.get(directory)
+            if wd is None:
+                wd = self._add_watch(directory)
+            if wd is not None:
+                self.unwatched.discard(path)
+                self.watches[wd][1].setdefault(name, set()).add(path)
+
+    def _lost_watch(self, wd):
+        # The directory was deleted or moved away: poll its paths
+        directory, names = self.watches.pop(wd)
+        if self.dirs.get(directory) == wd:
+            self.dirs.pop(directory)
+        _get_libc().inotify_rm_watch(self.fd, wd) # if it was moved
+        for paths in names.values():
+            self.unwatched.update(paths)
+
+    def _read_events(self, changed):
+        """Reads the pending events, and adds the changed paths to changed
+        Returns False if the event queue overflowed"""
+        ok = True
+        while 1:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            with self.lock:
+                while offset < len(data):
+                    wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                    offset += _EVENT_HEADER.size
+                    name = data[offset:offset+length].rstrip(b"\0")
+                    offset += length
+                    if mask & IN_Q_OVERFLOW:
+                        ok = False
+                        continue
+                    watch = self.watches.get(wd)
+                    if watch is None:
+                        continue
+                    if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                        for paths in watch[1].values():
+                            changed.update(paths)
+                        self._lost_watch(wd)
+                        continue
+                    paths = watch[1].get(os.fsdecode(name))
+                    if paths is not None:
+                        changed.update(paths)
+        return ok
+
+    def wakeup(self):
+        """Makes a pending wait() return immediately"""
+        os.write(self._wakeup_w, b"x")
+
+    def _drain_wakeup(self):
+        try:
+            while os.read(self._wakeup_r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def wait(self, timeout):
+        """Waits until some watched paths have changed, or until timeout
+        Returns the set of changed paths (empty after a timeout or wakeup),
+         or None if the changes are unknown (all paths must be polled)"""
+        changed = set()
+        with self.lock:
+            if len(self.unwatched):
+                self._retry_unwatched()
+                changed.update(self.unwatched)
+        ready = [key.fd for key, _ in self._selector.select(timeout)]
+        if self._wakeup_r in ready:
+            self._drain_wakeup()
+        if self.fd not in ready:
+            return changed
+        ok = self._read_events(changed)
+        # Debounce: wait until the events have stopped
+        deadline = time.time() + MAX_DEBOUNCE
+        while 1:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            if not self._event_selector.select(min(DEBOUNCE, remaining)):
+                break
+            ok &= self._read_events(changed)
+        if not ok:
+            return None
+        return changed
+
+    def close(self):
+        if self.fd is None:
+            return
+        self._selector.close()
+        self._event_selector.close()
+        os.close(self.fd)
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
+        self.fd = None
+
+def get_watcher():
+    """Returns an InotifyWatcher, or None if file watching is not available
+     and mounted files must be polled"""
+    if WATCHER == "poll" or not sys.platform.startswith("linux"):
+        return None
+    try:
+        return InotifyWatcher()
+    except (OSError, AttributeError):
+        return None
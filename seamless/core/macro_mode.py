@@ -58,33 +58,37 @@ def macro_mode_on(macro=None, check_async=True):
     else:
         macro_register.stack[-1].update(curr_macro_register)
     if macro is None:
-        filled = fill_objects(None, None)
-        for obj in filled:
-            obj.activate(only_macros=False)
-        if check_async:
-            check_async_macro_contexts(None, None)
-        created_contexts = []
-        for ctx in curr_macro_register:
-            if not isinstance(ctx, Context):
-                continue
-            for c in list(created_contexts):
-                if c._part_of(ctx):
-                    created_contexts.remove(c)
-                elif ctx._part_of(c):
-                    break
-            else:
-                created_contexts.append(ctx)
-        for ctx in created_contexts:
-            ctx._get_manager().activate(only_macros=False)
+        # the transformer kernels receive the updates of the new workers in
+        #  the next flush, together with any updates that follow in the same statement
+        from .mainloop import workqueue
+        with workqueue.postponing():
+            filled = fill_objects(None, None)
+            for obj in filled:
+                obj.activate(only_macros=False)
+            if check_async:
+                check_async_macro_contexts(None, None)
+            created_contexts = []
+            for ctx in curr_macro_register:
+                if not isinstance(ctx, Context):
+                    continue
+                for c in list(created_contexts):
+                    if c._part_of(ctx):
+                        created_contexts.remove(c)
+                    elif ctx._part_of(c):
+                        break
+                else:
+                    created_contexts.append(ctx)
+            for ctx in created_contexts:
+                ctx._get_manager().activate(only_macros=False)
 
-        for worker in curr_macro_register:
-            if not isinstance(worker, Worker):
-                continue
-            for c in created_contexts:
-                if worker._context() is c:
-                    break
-            else:
-                worker.activate(only_macros=False)
+            for worker in curr_macro_register:
+                if not isinstance(worker, Worker):
+                    continue
+                for c in created_contexts:
+                    if worker._context() is c:
+                        break
+                else:
+                    worker.activate(only_macros=False)
 
 def with_macro_mode(func):
     def with_macro_mode_wrapper(self, *args, **kwargs):
@@ -1,11 +1,21 @@
 """
 Seamless mainloop routines
 
-Status:
-For now, the mainloop is controlled by Qt timers
-An overhaul to put it under asyncio control is most welcome.
+The mainloop is under asyncio control.
+Work items can be appended to the work queue from any thread. This wakes up
+ whoever is waiting for work: WorkQueue.wait_for_work() from within the event
+ loop, or WorkQueue.wait_for_work_sync() from outside of it.
+Transformer outputs, mount events and reactor outputs all reach the main
+ thread as work items, and the shareserver runs on the same event loop.
+Therefore, the mainloop and ctx.equilibrate_async() respond to new work
+ without any polling latency.
+
+Qt is an optional integration. If PyQt5 is installed (and
+ SEAMLESS_DISABLE_QT is not set), Qt events are processed after every flush,
+ and periodically while the mainloop is idle.
 """
 
+import os
 import sys
 import time
 from collections import deque
@@ -22,8 +32,24 @@ except ImportError:
     pass
 MAINLOOP_FLUSH_TIMEOUT = 30 #maximum duration of a mainloop flush in ms
 
+def get_event_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    try:
+        return asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        return loop
+
+def _wake_future(fut):
+    if not fut.done():
+        fut.set_result(None)
+
 class WorkQueue:
-    FAILSAFE_FLUSH_LATENCY = 50 #latency of flush in ms
+    FAILSAFE_FLUSH_LATENCY = 50 #latency of flush in ms, if Qt is enabled
     _ipython_registered = False
     def __init__(self):
         self._work = deque()
@@ -31,6 +57,14 @@ class WorkQueue:
         self._flushing = False
         self._signal_processing = 0
         self._append_lock = threading.Lock()
+        self._deferred = []
+        self._deferred_last = []
+        self._deferring = 0
+        self._postponing = 0
+        self._postponed = []
+        self._work_event = threading.Event()
+        self._waiter = None
+        self.flush_hooks = [] # called after every flush, e.g. for Qt
 
     def append(self, work, priority=False):
         with self._append_lock:
@@ -38,10 +72,126 @@ class WorkQueue:
                 self._priority_work.append(work)
             else:
                 self._work.append(work)
+        self._notify()
+
+    def _notify(self):
+        self._work_event.set()
+        waiter = self._waiter
+        if waiter is not None:
+            loop, fut = waiter
+            try:
+                loop.call_soon_threadsafe(_wake_future, fut)
+            except RuntimeError: #loop is closed
+                pass
+
+    async def wait_for_work(self, timeout=None):
+        """Waits until work is appended, or until timeout (in seconds)
+        Meanwhile, the event loop continues to run
+        Returns True if there is work"""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._waiter = (loop, fut)
+        try:
+            self._work_event.clear()
+            if len(self):
+                return True
+            try:
+                await asyncio.wait_for(fut, timeout)
+            except asyncio.TimeoutError:
+                return len(self) > 0
+            return True
+        finally:
+            self._waiter = None
+
+    def wait_for_work_sync(self, timeout=None):
+        """Blocking version of wait_for_work, for use outside the event loop"""
+        self._work_event.clear()
+        if len(self):
+            return True
+        return self._work_event.wait(timeout)
+
+    def defer(self, func, last=False):
+        """Defers func until the end of the current flush
+        This is used to deliver all input updates of one flush to the
+         transformer kernels at once, instead of one by one.
+        With last=True, func runs after all other deferred work, including
+         the work that it defers in turn. Outside of a flush, it is deferred
+         until the next flush, so that e.g. a translation and the cell updates
+         that follow it in the same statement are delivered together.
+        Otherwise, outside of a flush, or outside of the main thread,
+         func is executed immediately."""
+        if threading.current_thread() is not threading.main_thread():
+            func()
+        elif last:
+            if self._deferring:
+                self._deferred_last.append(func)
+            elif self._postponing:
+                self._postponed.append(func)
+            else:
+                self.append(func)
+        elif self._deferring:
+            self._deferred.append(func)
+        else:
+            func()
+
+    def _run_deferred(self, deferred):
+        for func in deferred:
+            try:
+                func()
+            except Exception:
+                traceback.print_exc()
+
+    @contextlib.contextmanager
+    def deferring(self):
+        self._deferring += 1
+        try:
+            yield
+        finally:
+            try:
+                if self._deferring == 1:
+                    # Deferred work may defer more work
+                    while self._deferred:
+                        deferred, self._deferred = self._deferred, []
+                        self._run_deferred(deferred)
+            finally:
+                self._deferring -= 1
+            if not self._deferring:
+                deferred, self._deferred_last = self._deferred_last, []
+                if self._postponing:
+                    self._postponed += deferred
+                else:
+                    self._run_deferred(deferred)
+
+    @contextlib.contextmanager
+    def postponing(self):
+        """Postpones the work that is deferred with last=True until the first
+         flush after this context, e.g. the delivery of the updates of a
+         translation, so that they are delivered together with the updates
+         that follow the translation in the same statement"""
+        self._postponing += 1
+        try:
+            yield
+        finally:
+            self._postponing -= 1
+            if not self._postponing:
+                postponed, self._postponed = self._postponed, []
+                for func in postponed:
+                    self.append(func)
 
     def flush(self, timeout=None):
         if threading.current_thread() is not threading.main_thread():
             return
+        with self.deferring():
+            self._flush(timeout)
+
+    def _run_flush_hooks(self):
+        for hook in self.flush_hooks:
+            try:
+                hook()
+            except Exception:
+                traceback.print_exc()
+
+    def _flush(self, timeout):
 
         if ipython is not None and not self._ipython_registered:
             # It is annoying to do again and again, but the first time it doesn't work... bug in IPython?
@@ -72,30 +222,39 @@ class WorkQueue:
                     work()
                 except Exception:
                     traceback.print_exc()
-                if work_count == 100 and not _signal_processing:
-                    run_qt() # Necessary to prevent freezes in glwindow
+                if work_count == 100 and not self._signal_processing:
+                    self._run_flush_hooks() # Necessary to prevent freezes in glwindow
                     work_count = 0
-        #Whenever work is done, do an asyncio flush
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(asyncio.sleep(0))
-        """
-        loop.call_soon(lambda loop: loop.stop(), loop)
+        #Whenever work is done, give the event loop a chance to run
+        # (unless we are being called from within the event loop)
+        loop = get_event_loop()
         if not loop.is_running():
-            loop.run_forever()
-        """
+            loop.run_until_complete(asyncio.sleep(0))
 
         #print("flush")
         if self._signal_processing == 0:
-            run_qt()
+            self._run_flush_hooks()
 
         self._flushing = False
 
+    async def serve(self):
+        """Flushes the work queue whenever there is new work, forever"""
+        while 1:
+            self.flush(MAINLOOP_FLUSH_TIMEOUT)
+            await self.wait_for_work(self._idle_timeout())
+
+    def _idle_timeout(self):
+        if self.flush_hooks:
+            # the flush hooks (Qt) must run periodically, also without work
+            return self.FAILSAFE_FLUSH_LATENCY/1000
+        return None
+
     def __len__(self):
         return len(self._work) + len(self._priority_work)
 
 def asyncio_finish():
     try:
-        loop = asyncio.get_event_loop()
+        loop = get_event_loop()
         loop.stop()
         loop.run_forever()
     except RuntimeError:
@@ -104,12 +263,19 @@ def asyncio_finish():
 workqueue = WorkQueue()
 def mainloop():
     """Only run in non-IPython mode"""
-    while 1:
-        mainloop_one_iteration()
+    loop = get_event_loop()
+    loop.run_until_complete(workqueue.serve())
 
-def mainloop_one_iteration(timeout=MAINLOOP_FLUSH_TIMEOUT/1000):
+def mainloop_one_iteration(timeout=MAINLOOP_FLUSH_TIMEOUT):
+    """Flushes the work queue, then waits until there is new work
+    (at most FAILSAFE_FLUSH_LATENCY), while running the event loop"""
     workqueue.flush(timeout)
-    time.sleep(workqueue.FAILSAFE_FLUSH_LATENCY/1000)
+    latency = workqueue.FAILSAFE_FLUSH_LATENCY/1000
+    loop = get_event_loop()
+    if loop.is_running():
+        workqueue.wait_for_work_sync(latency)
+    else:
+        loop.run_until_complete(workqueue.wait_for_work(latency))
 
 
 def test_qt():
@@ -120,8 +286,8 @@ def test_qt():
 qt_app = None
 from multiprocessing import Process
 def run_qt():
-    global run_qt, qt_app
-    if qt_app is None: 
+    global qt_app
+    if qt_app is None:
         import multiprocessing
         if multiprocessing.get_start_method() != "fork":
             print("""Cannot test if Qt can be started
@@ -137,11 +303,23 @@ If you are running from terminal (instead of Jupyter), you could enable Qt manua
         if qt_app is None:
             msg = "Qt could not be started. Qt widgets will not work" #TODO: some kind of env variable to disable this warning
             print(msg,file=sys.stderr)
-            run_qt = lambda: None
+            disable_qt()
             return
     qt_app.processEvents()
 
-try:
-    import PyQt5.QtCore, PyQt5.QtWidgets
-except ImportError:
-    run_qt = lambda: None
+def enable_qt():
+    """Process Qt events after every flush, and periodically when idle"""
+    if run_qt not in workqueue.flush_hooks:
+        workqueue.flush_hooks.append(run_qt)
+
+def disable_qt():
+    if run_qt in workqueue.flush_hooks:
+        workqueue.flush_hooks.remove(run_qt)
+
+if not os.environ.get("SEAMLESS_DISABLE_QT"):
+    try:
+        import PyQt5.QtCore, PyQt5.QtWidgets
+    except ImportError:
+        pass
+    else:
+        enable_qt()
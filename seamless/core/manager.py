@@ -153,19 +153,21 @@ class Manager:
         assert threading.current_thread() == threading.main_thread()
         assert self.active or self.destroyed
         self.flushing = True
-        for childname, child in self.ctx()._children.items():
-            if isinstance(child, Context):
-                child._manager.flush(from_parent=True) # need to flush only once
-                                            # with self.active or self.destroyed, work buffer shouldn't accumulate
         try:
-            self.workqueue.flush()
-            while self.active and len(self.buffered_work):
-                item = self.buffered_work.pop(0)
-                try:
-                    item()
-                except:
-                    traceback.print_exc()
-                    #TODO: log exception
+            # the updates sent by the children are delivered together with ours
+            with self.workqueue.deferring():
+                for childname, child in self.ctx()._children.items():
+                    if isinstance(child, Context):
+                        child._manager.flush(from_parent=True) # need to flush only once
+                                                    # with self.active or self.destroyed, work buffer shouldn't accumulate
+                self.workqueue.flush()
+                while self.active and len(self.buffered_work):
+                    item = self.buffered_work.pop(0)
+                    try:
+                        item()
+                    except:
+                        traceback.print_exc()
+                        #TODO: log exception
         finally:
             if not from_parent:
                 self.stop_flushing()
@@ -332,12 +334,58 @@ class Manager:
             raise TypeError(linked)
         return self
 
+    def disconnect(self, obj):
+        """Removes all connections from and to obj (a cell or a pin)
+        This is for objects that are removed from an active context,
+         instead of the context being replaced as a whole.
+        Cells that lose their upstream connection become authoritative again
+        """
+        assert threading.current_thread() == threading.main_thread()
+        def remove(connections, con):
+            if connections is not None:
+                connections[:] = [c for c in connections if c is not con]
+        for con in self.cell_to_cells.pop(obj, []):
+            target = con.target
+            if target is None:
+                continue
+            other = target._get_manager()
+            if other.cell_from_cell.get(target) is con:
+                other.cell_from_cell.pop(target)
+                target._authoritative = True
+        for con in self.cell_to_pins.pop(obj, []):
+            target = con.target
+            if target is None:
+                continue
+            other = target._get_manager()
+            if other.pin_from_cell.get(target) is con:
+                other.pin_from_cell.pop(target)
+        for con in self.pin_to_cells.pop(obj, []):
+            target = con.target
+            if target is None:
+                continue
+            other = target._get_manager()
+            if other.cell_from_pin.get(target) is con:
+                other.cell_from_pin.pop(target)
+                target._authoritative = True
+        con = self.cell_from_cell.pop(obj, None)
+        if con is not None:
+            source = con.source
+            remove(source._get_manager().cell_to_cells.get(source), con)
+        con = self.cell_from_pin.pop(obj, None)
+        if con is not None:
+            source = con.source
+            remove(source._get_manager().pin_to_cells.get(source), con)
+        con = self.pin_from_cell.pop(obj, None)
+        if con is not None:
+            source = con.source
+            remove(source._get_manager().cell_to_pins.get(source), con)
+
     @main_thread_buffered
     @manager_buffered
     @with_successor("cell", 0)
     def set_cell(self, cell, value, *,
       default=False, from_buffer=False,
-      force=False, from_pin=False, origin=None
+      force=False, from_pin=False, origin=None, checksum=None, buffer_checksum=None
     ):
         from .macro_mode import macro_mode_on, get_macro_mode
         from .mount import is_dummy_mount
@@ -354,7 +402,8 @@ class Manager:
             different, text_different = protocol.set_cell(
               cell, value,
               default=default, from_buffer=from_buffer,
-              force=force, from_pin=from_pin
+              force=force, from_pin=from_pin,
+              checksum=checksum, buffer_checksum=buffer_checksum
             )
         only_text = (text_different and not different)
         if text_different and not is_dummy_mount(cell._mount) and self.active:
@@ -412,6 +461,8 @@ class Manager:
     @with_successor("pin", 0)
     def pin_send_update(self, pin, value, preliminary, target=None):
         #TODO: explicit support for preliminary values
+        if self.destroyed:
+            return
         assert pin._get_manager() is self
         if isinstance(value, MixedBase):
             value = value.data
@@ -1,9 +1,9 @@
 """
-For now, there is a single _read() and a single _write() method, tied to the
- file system. In the future, these will be code cells in a context, and it
- will be possible to register custom _read() and _write() cells, e.g. for
- storage in a database.
-Same for _exists.
+_read(), _write() and _exists() go through a storage backend
+ (see mount_backends.py). By default, cells are stored as files and contexts
+ as directories. A context can be mounted with another backend
+ (e.g. backend="sqlite"), which then stores the context and all of its
+ descendants.
 
 _init() is invoked at startup:
  If authority is "file" or "file-strict":
@@ -17,23 +17,58 @@ _init() is invoked at startup:
    If not, this may invoke _read(), but only if the file exists
 Periodically, conditional_read() and conditional_write() are invoked,
  that check if a read/write is necessary, and if so, invoke _read()/_write()
+If file watching is available (see filewatcher.py), conditional_read() is
+ only invoked for files that have changed. Otherwise, all files are polled.
+ Other backends report their changes themselves (MountBackend.changed).
+If the backend stores checksums, a changed value is only read if its
+ checksum is different, and then from the buffer store if possible.
+
+Files are written atomically: to a temporary file in the same directory,
+ that then replaces the file.
+The cells that were updated are written in one batch per iteration,
+ inside a transaction of their backend.
+ Large binary files (at least SEAMLESS_MOUNT_ASYNC_SIZE bytes) are written
+ in parallel on a thread pool (SEAMLESS_MOUNT_WRITERS threads); the
+ iteration waits until all writes have finished.
+
+Array and mixed cells can be mounted with mmap=True: the file is then
+ memory-mapped instead of read, and the cell value is a read-only view
+ on the map. With mmap="copy", the map is copy-on-write, and the value
+ is writable (without modifying the file).
+ The checksum of the file is computed over the map, and becomes the checksum
+ of the cell, without hashing the value again.
+ Values are written into a map of the temporary file, segment by segment,
+ without serializing them into a single buffer first.
+ The file must be replaced (as done by Seamless and most editors), not
+ modified in place: that would change the value behind the cell's back.
 
 NOTE: resolve_register returns immediately if there has been an exception raised
 """
 from .protocol import cson2json, json_encode
+from .filewatcher import get_watcher
+from .mount_backends import get_mount_backend, mount_backends, _buffer_size
+from .buffer_store import buffer_store
+from .checksum import checksum_parts
 
 from weakref import WeakValueDictionary, WeakKeyDictionary, WeakSet, ref
 from threading import Thread, RLock, Event
+from concurrent.futures import ThreadPoolExecutor
 from collections import deque, OrderedDict
 import sys, os
 import time
 import traceback
 import copy
-from contextlib import contextmanager
+from contextlib import contextmanager, ExitStack
 import json
 
 NoStash = 1
 
+ASYNC_WRITE_SIZE = int(os.environ.get("SEAMLESS_MOUNT_ASYNC_SIZE", 1024 * 1024))
+WRITER_THREADS = int(os.environ.get("SEAMLESS_MOUNT_WRITERS", 4))
+
+def _mount_backend(mount):
+    return get_mount_backend(mount.get("backend"), mount.get("backend_root"))
+
 def is_dummy_mount(mount):
     if mount is None:
         return True
@@ -42,10 +77,17 @@ def is_dummy_mount(mount):
         return True
     return False
 
+class _StoredValue:
+    """A value that is not read from file, but taken from the buffer store
+     (where it is held by another cell)"""
+    def __init__(self, value):
+        self.value = value
+
 class MountItem:
     last_exc = None
     parent = None
     _destroyed = False
+    _watcher = None
     def __init__(self, parent, cell, path, mode, authority, persistent, *,
       dummy=False, **kwargs
     ):
@@ -63,12 +105,29 @@ class MountItem:
         elif authority in ("file", "file-strict"):
             assert "r" in self.mode, (authority, mode)
         self.authority = authority
+        assert kwargs.get("mmap", False) in (False, True, "copy"), kwargs["mmap"]
+        backend = kwargs.get("backend")
+        assert backend is None or backend in mount_backends, backend
+        if kwargs.get("mmap"):
+            assert kwargs.get("binary"), "Only binary cells can be memory-mapped"
+            assert backend in (None, "directory"), "Only files can be memory-mapped"
         self.kwargs = kwargs
         self.last_checksum = None
         self.last_time = None
-        self.last_mtime = None
+        self.last_version = None
         self.persistent = persistent
+        if dummy:
+            return
+        self.backend = get_mount_backend(backend, kwargs.get("backend_root"))
+        if parent is not None and parent.watcher is not None and self.backend.watched:
+            self._watcher = parent.watcher
+            self._watcher.add(path)
 
+    def _unwatch(self):
+        watcher = self._watcher
+        if watcher is not None:
+            self._watcher = None
+            watcher.remove(self.path)
 
     def init(self):
         if self._destroyed:
@@ -82,11 +141,9 @@ class MountItem:
         if self.authority in ("file", "file-strict"):
             if exists:
                 with self.lock:
-                    filevalue = self._read()
+                    filevalue, file_checksum = self._read_checksum(cell)
                     update_file = True
-                    file_checksum = None
                     if not cell_empty:
-                        file_checksum = cell._checksum(filevalue, buffer=True)
                         if file_checksum == cell.text_checksum():
                             update_file = False
                         else:
@@ -98,10 +155,10 @@ class MountItem:
                 raise Exception("File path '%s' does not exist, but authority is 'file-strict'" % self.path)
             else:
                 if "w" in self.mode and not cell_empty:
-                    value = cell.serialize_buffer()
+                    value = self._serialize(cell)
                     checksum = cell.text_checksum()
                     with self.lock:
-                        self._write(value)
+                        self._write(value, checksum=checksum)
                         self._after_write(checksum)
         else: #self.authority == "cell"
             must_read = ("r" in self.mode)
@@ -109,12 +166,14 @@ class MountItem:
               cell._master[1] in ("form", "storage"):
                 must_read = True
             if not cell_empty:
-                value = cell.serialize_buffer()
+                value = self._serialize(cell)
                 checksum = cell.text_checksum()
                 if exists and must_read:
                     with self.lock:
-                        filevalue = self._read()
-                        file_checksum = cell._checksum(filevalue, buffer=True)
+                        file_checksum = self.backend.checksum(self.path)
+                        if file_checksum is None:
+                            filevalue = self._read()
+                            file_checksum = cell._checksum(filevalue, buffer=True)
                         if file_checksum != checksum:
                             if "w" in self.mode:
                                 print("Warning: File path '%s' has a different value, overwriting file" % self.path) #TODO: log warning
@@ -123,13 +182,12 @@ class MountItem:
                         self._after_read(file_checksum)
                 if "w" in self.mode:
                     with self.lock:
-                        self._write(value)
+                        self._write(value, checksum=checksum)
                         self._after_write(checksum)
             else:
                 if exists and must_read:
                     with self.lock:
-                        filevalue = self._read()
-                        file_checksum = cell._checksum(filevalue, buffer=True)
+                        filevalue, file_checksum = self._read_checksum(cell)
                         self.set(filevalue, checksum=file_checksum)
                         self._after_read(file_checksum)
 
@@ -147,7 +205,11 @@ class MountItem:
             if filevalue2 != filevalue:
                 filevalue = filevalue2
                 self._write(filevalue)
-        if cell._mount_setter is not None:
+        if isinstance(filevalue, _StoredValue):
+            cell._get_manager().set_cell(
+              cell, filevalue.value, force=True, checksum=checksum
+            )
+        elif cell._mount_setter is not None:
             cell._mount_setter(filevalue, checksum)
             cell._get_manager().cell_send_update(cell, False, None)
         else:
@@ -160,67 +222,111 @@ class MountItem:
 
     def _read(self):
         #print("read", self.cell())
-        binary = self.kwargs["binary"]
-        encoding = self.kwargs.get("encoding")
-        filemode = "rb" if binary else "r"
-        with open(self.path.replace("/", os.sep), filemode, encoding=encoding) as f:
-            return f.read()
+        kwargs = self.kwargs
+        return self.backend.read(
+          self.path, binary=kwargs["binary"], encoding=kwargs.get("encoding"),
+          mmap=kwargs.get("mmap", False)
+        )
+
+    def _read_checksum(self, cell, checksum=None):
+        """Returns the value with its checksum
+        If the backend stores the checksum, the value is taken from the
+         buffer store if possible (as a buffer, or as the value held by
+         another cell), else it is read"""
+        if checksum is None:
+            checksum = self.backend.checksum(self.path)
+        if checksum is not None and cell._store_buffers:
+            buffer = buffer_store.get(checksum)
+            if buffer is not None:
+                return buffer, checksum
+            if cell._mount_setter is None and cell._master is None:
+                value = buffer_store.get_value(checksum)
+                if value is not None:
+                    return _StoredValue(value), checksum
+        filevalue = self._read()
+        if checksum is None:
+            checksum = cell._checksum(filevalue, buffer=True)
+        return filevalue, checksum
+
+    def _serialize(self, cell):
+        """Returns the buffer of cell to write
+        For array and mixed cells, it is returned as a list of segments,
+         that refer to the memory of the value (see mixed.io.to_stream)"""
+        if self.kwargs.get("mmap") or hasattr(cell, "_buffer_parts"):
+            return cell._buffer_parts()
+        return cell.serialize_buffer()
 
-    def _write(self, filevalue, with_none=False):
+    def _write(self, filevalue, with_none=False, checksum=None):
         assert "w" in self.mode
-        binary = self.kwargs["binary"]
-        encoding = self.kwargs.get("encoding")
-        filemode = "wb" if binary else "w"
-        filepath = self.path.replace("/", os.sep)
+        kwargs = self.kwargs
+        binary = kwargs["binary"]
         if filevalue is None:
             if not with_none:
-                if os.path.exists(filepath):
-                    os.unlink(filepath)
+                self.backend.remove(self.path)
                 return
             filevalue = b"" if binary else ""
-        with open(filepath, filemode, encoding=encoding) as f:
-            f.write(filevalue)
+            checksum = None
+        if checksum is None and isinstance(filevalue, list):
+            checksum = checksum_parts(filevalue)
+        elif checksum is None:
+            cell = self.cell()
+            if cell is not None:
+                checksum = cell._checksum(filevalue, buffer=True)
+        self.backend.write(
+          self.path, filevalue, checksum,
+          binary=binary, encoding=kwargs.get("encoding"),
+          mmap=kwargs.get("mmap", False)
+        )
 
     def _exists(self):
-        return os.path.exists(self.path.replace("/", os.sep))
+        return self.backend.exists(self.path)
 
 
     def _after_write(self, checksum):
         self.last_checksum = checksum
         self.last_time = time.time()
         try:
-            stat = os.stat(self.path)
-            self.last_mtime = stat.st_mtime
+            self.last_version = self.backend.version(self.path)
         except Exception:
             pass
 
-    def conditional_write(self, with_none=False):
+    def _prepare_write(self, with_none=False):
+        """Returns the value and checksum to write, or None if no write is needed
+        The value is only serialized if its checksum differs from the file"""
         if self._destroyed:
-            return
+            return None
         if not "w" in self.mode:
-            return
+            return None
         cell = self.cell()
         if cell is None:
-            return
+            return None
         status = cell.status()
         if status != "OK":
             if not with_none or status != "UNDEFINED":
-                return
+                return None
         checksum = cell.text_checksum()
-        if checksum is None or self.last_checksum != checksum:
-            value = cell.serialize_buffer()
-            if value is not None:
-                assert cell._checksum(value, buffer=True) == checksum, cell._format_path()
-            with self.lock:
-                self._write(value, with_none=with_none)
-                self._after_write(checksum)
-
-    def _after_read(self, checksum, *, mtime=None):
+        if checksum is not None and self.last_checksum == checksum:
+            return None
+        # serialize_buffer returns the buffer of checksum
+        #  (from the buffer store, if the cell stores its buffers)
+        return self._serialize(cell), checksum
+
+    def _write_prepared(self, value, checksum, with_none=False):
+        self._write(value, with_none=with_none, checksum=checksum)
+        self._after_write(checksum)
+
+    def conditional_write(self, with_none=False):
+        prepared = self._prepare_write(with_none)
+        if prepared is None:
+            return
+        with self.lock:
+            self._write_prepared(*prepared, with_none=with_none)
+
+    def _after_read(self, checksum, *, version=None):
         self.last_checksum = checksum
-        if mtime is None:
-            stat = os.stat(self.path)
-            mtime = stat.st_mtime
-        self.last_mtime = mtime
+        if version is None:
+            version = self.backend.version(self.path)
+        self.last_version = version
 
     def conditional_read(self):
         if self._destroyed:
@@ -228,16 +334,20 @@ class MountItem:
         cell = self.cell()
         if cell is None:
             return
-        if not self._exists():
-            return
         with self.lock:
-            stat = os.stat(self.path)
-            mtime = stat.st_mtime
+            version = self.backend.version(self.path)
+            if version is None: # does not exist
+                return
             file_checksum = None
-            if self.last_mtime is None or mtime > self.last_mtime:
-                filevalue = self._read()
-                file_checksum = cell._checksum(filevalue, buffer=True)
-                self._after_read(file_checksum, mtime=mtime)
+            if version != self.last_version:
+                stored_checksum = self.backend.checksum(self.path)
+                if stored_checksum is not None \
+                  and stored_checksum == self.last_checksum:
+                    self.last_version = version
+                else:
+                    filevalue, file_checksum = \
+                      self._read_checksum(cell, stored_checksum)
+                    self._after_read(file_checksum, version=version)
         cell_checksum = None
         if cell.value is not None:
             cell_checksum = cell.text_checksum()
@@ -246,23 +356,24 @@ class MountItem:
                 self.set(filevalue, checksum=file_checksum)
             else:
                 print("Warning: write-only file %s (%s) has changed on disk, overruling" % (self.path, self.cell()))
-                value = cell.serialize_buffer()
-                assert cell._checksum(value, buffer=True) == cell_checksum, cell._format_path()
+                value = self._serialize(cell)
                 with self.lock:
-                    self._write(value)
+                    self._write(value, checksum=cell_checksum)
                     self._after_write(cell_checksum)
 
     def destroy(self):
+        self._unwatch()
         if self._destroyed:
             return
         self._destroyed = True
         if self.dummy:
             return
-        if self.persistent == False and os.path.exists(self.path):
+        if self.persistent == False:
             #print("remove", self.path)
-            os.unlink(self.path)
+            self.backend.remove(self.path)
 
     def __del__(self):
+        self._unwatch()
         if self.dummy:
             return
         if self._destroyed:
@@ -287,6 +398,8 @@ class LinkItem:
         is_dir = (isinstance(linked, Context))
         if is_dummy_mount(linked._mount):
             return
+        if linked._mount.get("backend", "directory") != "directory":
+            return # links are symlinks in the file system
         linked_path = linked._mount["path"]
         os.symlink(linked_path, self.path, is_dir)
         self.linked_path = linked_path
@@ -356,6 +469,7 @@ class MountManagerStash:
             if ctx._root() is self.root and ctx._part_of2(context):
                 self.mounts[cell] = mountitem
                 parent.mounts.pop(cell)
+                parent._mounts_changed()
                 path = cell._mount["path"]
                 parent.paths[self.root].remove(path)
                 self.paths.add(path)
@@ -405,6 +519,7 @@ class MountManagerStash:
                     object.__setattr__(new_cell, "_mount", None) #since we are not in macro mode
                 new_paths.pop(path)
             parent.mounts[cell] = mountitem
+            parent._mounts_changed()
             parent.paths[self.root].add(path)
 
         context_to_unmount = []
@@ -463,7 +578,7 @@ class MountManagerStash:
                     rewrite = False
                     cell = new_mountitem.cell()
                     if cell._val is not None:
-                        value = cell.serialize_buffer()
+                        value = new_mountitem._serialize(cell)
                         checksum = cell.text_checksum()
                         if "w" in old_mountitem.mode:
                             if type(old_mountitem.cell()) != type(cell):
@@ -473,10 +588,10 @@ class MountManagerStash:
                                     rewrite = True
                     if rewrite:
                         with new_mountitem.lock:
-                            new_mountitem._write(value)
+                            new_mountitem._write(value, checksum=checksum)
                             new_mountitem._after_write(checksum)
                     else:
-                        new_mountitem.last_mtime = old_mountitem.last_mtime
+                        new_mountitem.last_version = old_mountitem.last_version
                         new_mountitem.last_checksum = old_mountitem.last_checksum
                 else:
                     new_mountitem.init()
@@ -511,8 +626,15 @@ class MountManager:
         self.lock = RLock()
         self.cell_updates = deque()
         self._tick = Event()
+        self._tick_request = Event()
         self.stash = None
         self.paths = WeakKeyDictionary()
+        self.watcher = get_watcher()
+        self._writers = None
+        self._recheck = set()
+        self._mounts_version = 0 # incremented whenever self.mounts changes
+        self._index = None
+        self._index_version = None
 
     @property
     def reorganizing(self):
@@ -554,6 +676,7 @@ class MountManager:
         #print("add mount", path, cell)
         paths.add(path)
         self.mounts[cell] = MountItem(self, cell, path, mode, authority, persistent, **kwargs)
+        self._mounts_changed()
         if self.stash is None or self.stash is NoStash:
             try:
                 self._mounting = True
@@ -582,6 +705,7 @@ class MountManager:
         paths.remove(path)
         assert cell_or_link in self.mounts, (cell_or_link, path)  #... but path is in paths
         mountitem = self.mounts.pop(cell_or_link)
+        self._mounts_changed()
         mountitem.destroy()
 
     def unmount_context(self, context, from_del=False):
@@ -607,10 +731,10 @@ class MountManager:
         except KeyError:
             pass
         if mount["persistent"] == False:
-            dirpath = mount["path"].replace("/", os.sep)
+            dirpath = mount["path"]
             try:
                 #print("rmdir", dirpath)
-                os.rmdir(dirpath)
+                _mount_backend(mount).remove_dir(dirpath)
             except:
                 print("Error: cannot remove directory %s" % dirpath)
 
@@ -633,15 +757,16 @@ class MountManager:
     def _check_context(self, context, as_parent):
         mount = context._mount
         assert not is_dummy_mount(mount), context
-        dirpath = mount["path"].replace("/", os.sep)
+        dirpath = mount["path"]
         persistent, authority = mount["persistent"], mount["authority"]
-        if os.path.exists(dirpath):
+        backend = _mount_backend(mount)
+        if backend.dir_exists(dirpath):
             if authority == "cell" and not as_parent:
                 print("Warning: Directory path '%s' already exists" % dirpath) #TODO: log warning
         else:
             if authority == "file-strict":
                 raise Exception("Directory path '%s' does not exist, but authority is 'file-strict'" % dirpath)
-            os.mkdir(dirpath)
+            backend.make_dir(dirpath)
 
     def add_cell_update(self, cell):
         #print("add_cell_update", cell, self.reorganizing, self.mounting)
@@ -650,46 +775,132 @@ class MountManager:
         assert cell in self.mounts, (cell, hex(id(cell)))
         self.cell_updates.append(cell)
 
-    def _run(self):
+    def _mounts_changed(self):
+        self._mounts_version += 1
+
+    def _get_index(self):
+        """Returns an index of the mounted cells:
+         backend => {path: [weak references to MountItems]}
+        It is rebuilt only when the mounts have changed"""
+        version = self._mounts_version
+        if self._index_version == version:
+            return self._index
+        index = {}
         for cell, mount_item in list(self.mounts.items()):
             if isinstance(cell, Link):
                 continue
-            if cell in self.cell_updates:
-                continue
-            try:
-                mount_item.conditional_read()
-            except Exception:
-                exc = traceback.format_exc()
-                if exc != mount_item.last_exc:
-                    print(exc)
-                    mount_item.last_exc = exc
+            paths = index.setdefault(mount_item.backend, {})
+            paths.setdefault(mount_item.path, []).append(ref(mount_item))
+        self._index, self._index_version = index, version
+        return index
+
+    def _run(self, changed=None):
+        """changed: the paths that have changed according to the file watcher,
+         or None if all mounted files must be polled"""
+        recheck, self._recheck = self._recheck, set()
+        for backend, paths in list(self._get_index().items()):
+            if backend.watched:
+                backend_changed = changed
+            else:
+                # The backend reports its own changes, once per iteration
+                backend_changed = backend.changed()
+            if backend_changed is None:
+                candidates = list(paths.keys())
+            else:
+                candidates = [path for path in set(backend_changed) | recheck \
+                  if path in paths]
+            for path in candidates:
+                for mount_item in paths[path]:
+                    mount_item = mount_item()
+                    if mount_item is None:
+                        continue
+                    cell = mount_item.cell()
+                    if cell is None or self.mounts.get(cell) is not mount_item:
+                        continue # unmounted, or stashed away
+                    if cell in self.cell_updates:
+                        # check the change again after the cell has been written
+                        self._recheck.add(path)
+                        continue
+                    try:
+                        mount_item.conditional_read()
+                    except Exception:
+                        exc = traceback.format_exc()
+                        if exc != mount_item.last_exc:
+                            print(exc)
+                            mount_item.last_exc = exc
+        self._write_updates()
+        self._tick.set()
+
+    def _report_write_error(self, mount_item):
+        exc = traceback.format_exc()
+        if exc != mount_item.last_exc:
+            print(exc)
+            mount_item.last_exc = exc
+
+    def _write_updates(self):
+        """Writes all updated cells in one batch
+        Large binary files are written in parallel on the writer threads"""
+        cells = OrderedDict()
         while 1:
             try:
                 cell = self.cell_updates.popleft()
             except IndexError:
                 break
-            mount_item = self.mounts.get(cell)
-            if mount_item is None: #cell was deleted
-                continue
-            try:
-                mount_item.conditional_write(with_none=True)
-            except Exception:
-                exc = traceback.format_exc()
-                if exc != mount_item.last_exc:
-                    print(exc)
-                    mount_item.last_exc = exc
-        self._tick.set()
+            cells[cell] = None
+        if not len(cells):
+            return
+        futures = []
+        with self.lock, ExitStack() as transactions:
+            backends = set()
+            for cell in cells:
+                mount_item = self.mounts.get(cell)
+                if mount_item is None: #cell was deleted
+                    continue
+                backend = mount_item.backend
+                if backend not in backends:
+                    # committed when all writes have finished
+                    transactions.enter_context(backend.transaction())
+                    backends.add(backend)
+                try:
+                    prepared = mount_item._prepare_write(with_none=True)
+                    if prepared is None:
+                        continue
+                    value = prepared[0]
+                    if value is not None and _buffer_size(value) >= ASYNC_WRITE_SIZE \
+                      and mount_item.kwargs.get("binary") and backend.parallel_writes:
+                        if self._writers is None:
+                            self._writers = ThreadPoolExecutor(WRITER_THREADS)
+                        future = self._writers.submit(
+                          mount_item._write_prepared, *prepared, with_none=True
+                        )
+                        futures.append((mount_item, future))
+                    else:
+                        mount_item._write_prepared(*prepared, with_none=True)
+                except Exception:
+                    self._report_write_error(mount_item)
+            for mount_item, future in futures:
+                try:
+                    future.result()
+                except Exception:
+                    self._report_write_error(mount_item)
 
     def run(self):
         try:
             self._running = True
             while not self._stop:
+                if self.watcher is not None:
+                    # returns as soon as a file changes, or tick() is called
+                    changed = self.watcher.wait(self.latency)
+                    self._tick_request.clear()
+                    self._run(changed)
+                    continue
                 t = time.time()
                 self._run()
-                while time.time() - t < self.latency:
-                    if not self._tick.is_set():
-                        break
-                    time.sleep(0.01)
+                remaining = self.latency - (time.time() - t)
+                if remaining > 0:
+                    # wake up early if tick() is waiting for us
+                    self._tick_request.wait(remaining)
+                self._tick_request.clear()
         finally:
             self._running = False
 
@@ -709,6 +920,9 @@ class MountManager:
         """Waits until one iteration of the run() loop has finished"""
         if self._running:
             self._tick.clear()
+            self._tick_request.set()
+            if self.watcher is not None:
+                self.watcher.wakeup()
             self._tick.wait()
 
     def destroy(self):
@@ -744,6 +958,12 @@ def resolve_register(reg):
                     raise Exception("No path provided for mount of %s, but no ancestor context is mounted" % c)
                 result["path"] = parent_result["path"]
                 result["autopath"] = True
+                if result.get("backend") is None and "backend" in parent_result:
+                    result["backend"] = parent_result["backend"]
+                    result["backend_root"] = parent_result["backend_root"]
+            if result.get("backend") is not None and result.get("backend_root") is None:
+                # the backend stores everything under this path
+                result["backend_root"] = result["path"]
         elif isinstance(c, (Inchannel, Outchannel)):
             result = None
         elif isinstance(c, Context) and c._toplevel:
@@ -854,8 +1074,14 @@ def resolve_register(reg):
     for context, v in contexts_to_mount.items():
         path, as_parent = v
         mountmanager.add_context(context, path, as_parent=as_parent)
-    for cell in mount_cells:
-        mountmanager.add_mount(cell, **cell._mount)
+    # (the mount manager lock is always taken before the backend lock)
+    with mountmanager.lock, ExitStack() as transactions:
+        # the initial writes of each backend in a single transaction
+        backends = set([_mount_backend(cell._mount) for cell in mount_cells])
+        for backend in backends:
+            transactions.enter_context(backend.transaction())
+        for cell in mount_cells:
+            mountmanager.add_mount(cell, **cell._mount)
     for link in mount_links:
         mount = link._mount
         mountmanager.add_link(link, mount["path"], mount["persistent"])
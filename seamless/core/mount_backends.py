@@ -0,0 +1,394 @@
+"""
+Storage backends for mounted cells and contexts
+
+A backend stores the values of mounted cells under their (mount) paths.
+ MountItem does not access files itself, it goes through its backend:
+ exists(), read(), write() and remove() for cells,
+ make_dir() and remove_dir() for contexts.
+version() returns a token that changes when the stored value changes
+ (for files, the modification time), so that changes can be detected
+ without reading the value.
+checksum() returns the stored checksum, if the backend stores it.
+ Then, a changed value is only read if its checksum differs.
+All writes of one mount manager iteration are done inside
+ transaction(), so that a backend can batch them.
+
+Backends:
+- "directory" (default): each cell is a file, each context a directory.
+   Changes are detected by the file watcher (see filewatcher.py).
+- "sqlite": a context and all of its descendants are stored in a single
+   SQLite database file, with the mount path of the context as file name.
+   Values are stored once per checksum (identical values share storage),
+   and each path refers to a checksum. Writes are batched into a single
+   transaction per iteration. Changes made by other processes are
+   detected with PRAGMA data_version, which is cheap to poll.
+
+Additional backends can be added with register_mount_backend.
+ The factory is called with the mount path of the context that was
+ mounted with the backend (the "root"), and must return a MountBackend.
+ One backend instance is shared by all mounts under the same root.
+"""
+
+import os
+import mmap
+import sqlite3
+import threading
+from contextlib import contextmanager
+from threading import get_ident
+
+from .checksum import CHECKSUM_ALGORITHM
+from ..mixed.io.to_stream import write_parts
+
+class MountBackend:
+    """Interface of mount storage backends
+    Paths are full mount paths, with "/" as separator"""
+    name = None
+    watched = False   # if True, changes are reported by the file watcher
+    parallel_writes = False   # if True, write() may be called from multiple threads
+
+    def exists(self, path):
+        raise NotImplementedError
+
+    def version(self, path):
+        """Returns a token that changes whenever the value at path changes,
+        or None if there is no value at path"""
+        raise NotImplementedError
+
+    def checksum(self, path):
+        """Returns the checksum of the value at path,
+        or None if it is unknown"""
+        return None
+
+    def changed(self):
+        """Returns the paths that may have been changed by others since
+         the last call, or None if all paths must be checked"""
+        return None
+
+    def read(self, path, *, binary, encoding=None, mmap=False):
+        raise NotImplementedError
+
+    def write(self, path, value, checksum, *, binary, encoding=None, mmap=False):
+        """Writes value (str, a bytes-like object, or a list of segments)
+        checksum is the checksum of value, as computed by the cell"""
+        raise NotImplementedError
+
+    def remove(self, path):
+        raise NotImplementedError
+
+    def dir_exists(self, path):
+        return True
+
+    def make_dir(self, path):
+        pass
+
+    def remove_dir(self, path):
+        pass
+
+    @contextmanager
+    def transaction(self):
+        yield
+
+def _buffer_size(value):
+    if isinstance(value, list): # segments
+        return sum([memoryview(part).nbytes for part in value])
+    return len(value)
+
+def _fs(path):
+    return path.replace("/", os.sep)
+
+class DirectoryBackend(MountBackend):
+    """Each cell is a file, each context a directory
+    Files are written atomically: to a temporary file in the same directory,
+     that then replaces the file.
+    Memory-mapped files (mmap=True) are read as a map, and a list of segments
+     is written into a map of the temporary file.
+    Otherwise, a list of segments is written with os.writev."""
+    name = "directory"
+    watched = True
+    parallel_writes = True
+
+    def exists(self, path):
+        return os.path.exists(_fs(path))
+
+    def version(self, path):
+        try:
+            return os.stat(_fs(path)).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def read(self, path, *, binary, encoding=None, mmap=False):
+        if mmap:
+            return self._read_mmap(path, mmap)
+        filemode = "rb" if binary else "r"
+        with open(_fs(path), filemode, encoding=encoding) as f:
+            return f.read()
+
+    @staticmethod
+    def _read_mmap(path, mode):
+        if mode == "copy":
+            access = mmap.ACCESS_COPY
+        else:
+            access = mmap.ACCESS_READ
+        with open(_fs(path), "rb") as f:
+            if not os.fstat(f.fileno()).st_size:
+                return b"" # empty files cannot be mapped
+            return mmap.mmap(f.fileno(), 0, access=access)
+
+    @staticmethod
+    def _write_mmap(f, parts):
+        """Writes the segments in parts into a map of file f"""
+        size = _buffer_size(parts)
+        if not size:
+            return
+        f.truncate(size)
+        with mmap.mmap(f.fileno(), size) as mm:
+            offset = 0
+            for part in parts:
+                part = memoryview(part).cast("B")
+                mm[offset:offset+part.nbytes] = part
+                offset += part.nbytes
+
+    def write(self, path, value, checksum, *, binary, encoding=None, mmap=False):
+        filemode = "wb" if binary else "w"
+        if isinstance(value, list) and mmap:
+            filemode = "w+b" # to be mapped, the file must be readable
+        # Write to a temporary file, then replace the file (atomic)
+        # If the file is a symlink, its target is replaced
+        filepath = os.path.realpath(_fs(path))
+        tmpfile = "%s.%d.%d.tmp" % (filepath, os.getpid(), get_ident())
+        try:
+            with open(tmpfile, filemode, encoding=encoding) as f:
+                if isinstance(value, list) and mmap:
+                    self._write_mmap(f, value)
+                elif isinstance(value, list):
+                    write_parts(value, f.fileno())
+                else:
+                    f.write(value)
+            try:
+                os.chmod(tmpfile, os.stat(filepath).st_mode)
+            except FileNotFoundError:
+                pass
+            os.replace(tmpfile, filepath)
+        except BaseException:
+            try:
+                os.remove(tmpfile)
+            except OSError:
+                pass
+            raise
+
+    def remove(self, path):
+        if os.path.exists(_fs(path)):
+            os.unlink(_fs(path))
+
+    def dir_exists(self, path):
+        return os.path.exists(_fs(path))
+
+    def make_dir(self, path):
+        os.mkdir(_fs(path))
+
+    def remove_dir(self, path):
+        os.rmdir(_fs(path))
+
+class SqliteBackend(MountBackend):
+    """All cells under a mounted context in a single SQLite database file
+    The mount path of the context is the file name of the database.
+    Tables:
+    - buffers: checksum => value (stored once per checksum)
+    - mounts: path => checksum (paths are relative to the database)
+    Values whose checksum is no longer referenced are deleted at the end
+     of each transaction.
+    Contexts have no entries of their own. The database file itself is
+     never removed."""
+    name = "sqlite"
+    watched = False
+    parallel_writes = False
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.RLock()
+        self._depth = 0
+        self._released = set() # checksums that may no longer be referenced
+        self._existed = os.path.exists(_fs(filename))
+        # Autocommit mode, transactions are explicit
+        self.conn = sqlite3.connect(
+          _fs(filename), isolation_level=None, check_same_thread=False
+        )
+        self.conn.executescript("""
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS buffers (checksum TEXT PRIMARY KEY, buffer BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS mounts (path TEXT PRIMARY KEY, checksum TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS mounts_checksum ON mounts(checksum);
+""")
+        self.conn.execute(
+          "INSERT OR IGNORE INTO meta VALUES ('checksum_algorithm', ?)",
+          (CHECKSUM_ALGORITHM,)
+        )
+        algorithm = self.conn.execute(
+          "SELECT value FROM meta WHERE key = 'checksum_algorithm'"
+        ).fetchone()[0]
+        # Checksums computed with another algorithm cannot be compared
+        self._trust_checksums = (algorithm == CHECKSUM_ALGORITHM)
+        self._data_version = self._get_data_version()
+        self._versions = dict(self.conn.execute("SELECT path, checksum FROM mounts"))
+
+    def _key(self, path):
+        if path == self.filename:
+            return ""
+        assert path.startswith(self.filename + "/"), (path, self.filename)
+        return path[len(self.filename)+1:]
+
+    def _path(self, key):
+        return self.filename + "/" + key
+
+    def _get_data_version(self):
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _lookup(self, path):
+        with self.lock:
+            row = self.conn.execute(
+              "SELECT checksum FROM mounts WHERE path = ?", (self._key(path),)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def exists(self, path):
+        return self._lookup(path) is not None
+
+    def version(self, path):
+        return self._lookup(path)
+
+    def checksum(self, path):
+        if not self._trust_checksums:
+            return None
+        return self._lookup(path)
+
+    def dir_exists(self, path):
+        if path == self.filename:
+            return self._existed
+        prefix = self._key(path) + "/"
+        with self.lock:
+            return any(key.startswith(prefix) for key in self._versions)
+
+    def changed(self):
+        """Only other connections change the data version:
+         if it is unchanged, nothing needs to be checked"""
+        with self.lock:
+            data_version = self._get_data_version()
+            if data_version == self._data_version:
+                return set()
+            self._data_version = data_version
+            versions = dict(self.conn.execute("SELECT path, checksum FROM mounts"))
+            old_versions, self._versions = self._versions, versions
+        changed = set()
+        for key in set(versions.keys()).union(old_versions.keys()):
+            if versions.get(key) != old_versions.get(key):
+                changed.add(self._path(key))
+        return changed
+
+    def read(self, path, *, binary, encoding=None, mmap=False):
+        with self.lock:
+            row = self.conn.execute(
+              """SELECT buffers.buffer FROM mounts JOIN buffers
+                 ON mounts.checksum = buffers.checksum WHERE mounts.path = ?""",
+              (self._key(path),)
+            ).fetchone()
+        if row is None:
+            raise FileNotFoundError(path)
+        value = row[0]
+        if not binary:
+            value = value.decode(encoding or "utf-8")
+        return value
+
+    def write(self, path, value, checksum, *, binary, encoding=None, mmap=False):
+        if isinstance(value, list):
+            value = b"".join([memoryview(part).cast("B") for part in value])
+        elif isinstance(value, str):
+            value = value.encode(encoding or "utf-8")
+        key = self._key(path)
+        with self.transaction():
+            old_checksum = self._versions.get(key)
+            if old_checksum == checksum:
+                return
+            self.conn.execute(
+              "INSERT OR IGNORE INTO buffers VALUES (?, ?)", (checksum, value)
+            )
+            self.conn.execute(
+              "INSERT OR REPLACE INTO mounts VALUES (?, ?)", (key, checksum)
+            )
+            self._versions[key] = checksum
+            if old_checksum is not None:
+                self._released.add(old_checksum)
+
+    def remove(self, path):
+        key = self._key(path)
+        with self.transaction():
+            old_checksum = self._versions.pop(key, None)
+            self.conn.execute("DELETE FROM mounts WHERE path = ?", (key,))
+            if old_checksum is not None:
+                self._released.add(old_checksum)
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            if self._depth == 0:
+                self.conn.execute("BEGIN")
+            self._depth += 1
+            ok = False
+            try:
+                yield
+                ok = True
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    if ok:
+                        self._delete_released()
+                        self.conn.execute("COMMIT")
+                    else:
+                        self.conn.execute("ROLLBACK")
+                        self._released.clear()
+                        self._versions = dict(
+                          self.conn.execute("SELECT path, checksum FROM mounts")
+                        )
+
+    def _delete_released(self):
+        for checksum in self._released:
+            self.conn.execute(
+              """DELETE FROM buffers WHERE checksum = ?
+                 AND NOT EXISTS (SELECT 1 FROM mounts WHERE checksum = ?)""",
+              (checksum, checksum)
+            )
+        self._released.clear()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+mount_backends = {
+    "directory": lambda root: directory_backend,
+    "sqlite": SqliteBackend,
+}
+
+def register_mount_backend(name, factory):
+    """Registers a mount backend
+    factory(root) must return a MountBackend for the mount path root"""
+    mount_backends[name] = factory
+
+directory_backend = DirectoryBackend()
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_mount_backend(name=None, root=None):
+    """Returns the backend called name for mount path root
+    One instance is returned per (name, root)"""
+    if name is None or name == "directory":
+        return directory_backend
+    if name not in mount_backends:
+        raise ValueError("Unknown mount backend '%s'" % name)
+    key = name, root
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            backend = mount_backends[name](root)
+            _backends[key] = backend
+        return backend
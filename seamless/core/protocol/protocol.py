@@ -69,12 +69,13 @@ class TransferredCell:
             setattr(self, attr, getattr(cell, attr))
 
 def set_cell(cell, value, *,
-  default, from_buffer, force, from_pin=False
+  default, from_buffer, force, from_pin=False, checksum=None, buffer_checksum=None
 ):
     transfer_mode = "buffer" if from_buffer else "ref"
     different, text_different = cell.deserialize(value, transfer_mode,
       "object", None,
-      from_pin=from_pin, default=default,force=force
+      from_pin=from_pin, default=default,force=force,
+      checksum=checksum, buffer_checksum=buffer_checksum
     )
     return different, text_different
 
@@ -2,7 +2,7 @@ from .cell import CellLikeBase, Cell, JsonCell, TextCell
 from .protocol import json_encode
 from ..mixed import MixedBase, OverlayMonitor, MakeParentMonitor, MonitorTypeError
 from ..mixed.get_form import get_form
-from ..mixed.io.util import is_identical_debug
+from ..mixed.snapshot import snapshot
 
 import weakref
 import json
@@ -12,6 +12,7 @@ import threading, functools
 from contextlib import contextmanager
 
 from .macro_mode import get_macro_mode
+from .checksum import checksum as compute_checksum, checksum_mixed
 
 """NOTE: data and schema can be edited via mount
 If there is buffering, only the buffer can be edit via mount
@@ -59,6 +60,7 @@ def channel_deserialize(channel, value, transfer_mode, access_mode, content_type
     structured_cell = channel.structured_cell()
     if structured_cell is None:
         return
+    structured_cell._batch_outchannels()
     with structured_cell._from_pin():
         monitor = structured_cell.monitor
         if structured_cell._is_silk:
@@ -81,10 +83,8 @@ def channel_deserialize(channel, value, transfer_mode, access_mode, content_type
                     return False, False
         else:
             monitor.receive_inchannel_value(channel.inchannel, value)
-        dif = not is_identical_debug(value, channel._last_value)
-        #TODO: keep checksum etc. to see if value really changed
-        different, text_different = dif, dif
-        channel._last_value = deepcopy(value)
+        channel._last_value, different = snapshot(value, channel._last_value)
+        text_different = different
     return different, text_different
 
 class Inchannel(CellLikeBase):
@@ -154,7 +154,7 @@ class Outchannel(CellLikeBase):
     """
     _mount = None
     _buffered = False
-    _last_value = None ###TODO: use checksums; for now, only used for buffered
+    _last_value = None # snapshot of the last value sent (see mixed.snapshot)
     def __init__(self, structured_cell, outchannel):
         assert isinstance(outchannel, tuple)
         assert all([isinstance(v, str) for v in outchannel])
@@ -171,9 +171,21 @@ class Outchannel(CellLikeBase):
             self._supported_modes = supported_modes_mixed
 
     def checksum(self):
-        return None #TODO
-        # Easy enough for json, but needs access to form for mixed
-        # (see MixedCell._checksum)
+        structured_cell = self.structured_cell()
+        if structured_cell is None:
+            return None
+        data = structured_cell.monitor.get_data(self.outchannel)
+        if data is None:
+            return None
+        try:
+            if structured_cell._plain:
+                # same as JsonCell._checksum
+                return compute_checksum(JsonCell._json(data) + "\n")
+            else:
+                storage, form = get_form(data)
+                return checksum_mixed(data, storage, form)
+        except Exception:
+            return None
 
     def serialize(self, transfer_mode, access_mode, content_type):
         structured_cell = self.structured_cell()
@@ -198,9 +210,10 @@ class Outchannel(CellLikeBase):
         else:
             self._status = self.StatusFlags.OK
         structured_cell = self.structured_cell()
-        if is_identical_debug(value, self._last_value):
+        last_value, different = snapshot(value, self._last_value)
+        if not different:
             return value
-        self._last_value = deepcopy(value)
+        self._last_value = last_value
         assert structured_cell is not None
         data = structured_cell.data
         manager = data._get_manager()
@@ -279,6 +292,10 @@ def update_hook(cell):
         pass
 
 class StructuredCellState:
+    """State of a structured cell
+    The values in the state are immutable snapshots (see mixed.snapshot):
+     they are shared with the previous state where the cell has not changed,
+     and with deep copies of the state."""
     data = None
     form = None
     storage = None
@@ -288,62 +305,90 @@ class StructuredCellState:
     buffer_storage = None
     buffer_nosync = False
 
-    def set(self, sc, only_auth):
+    def set(self, sc, only_auth, previous=None):
+        """Takes the state of structured cell sc
+        previous is an earlier state of the same cell: the parts of the data
+         that have not changed since are shared with it, instead of copied"""
         assert isinstance(sc, StructuredCell)
+        if not isinstance(previous, StructuredCellState):
+            previous = StructuredCellState()
         data_filtered = False
         store_buffer = False
         if only_auth:
-            self.data, data_filtered = self._get_auth(sc, sc.data._val)
+            self.data, data_filtered = self._get_auth(sc, sc.data._val, previous.data)
         else:
-            self.data = deepcopy(sc.data._val)
+            self.data, _ = snapshot(sc.data._val, previous.data)
         if sc.buffer is not None and sc._silk._buffer_nosync:
             self.buffer_nosync = True
             store_buffer = True #the buffer is out of sync
             data_filtered_buffer = data_filtered #store the auth part if data_filtered
-            self.data = deepcopy(sc.data._val)
+            self.data, _ = snapshot(sc.data._val, previous.data)
             data_filtered = False
         if data_filtered:
-            storage, form = get_form(self.data)
+            if self.data is previous.data and previous.form is not None \
+              and previous.storage is not None:
+                # snapshots are immutable: same data, same form
+                storage, form = previous.storage, previous.form
+            else:
+                storage, form = get_form(self.data)
         else:
-            form = deepcopy(sc.form._val)
+            form, _ = snapshot(sc.form._val, previous.form)
             storage = None
             if sc.storage is not None:
                 storage = sc.storage._val
         self.form = form
         self.storage = storage
         if sc.schema is not None:
-            self.schema = deepcopy(sc.schema._val)
+            self.schema, _ = snapshot(sc.schema._val, previous.schema)
         if store_buffer:
             if data_filtered_buffer:
-                self.buffer_data, _ = self._get_auth(sc, sc.buffer.data._val)
-                self.buffer_storage, self.buffer_form = get_form(self.buffer_data)
+                self.buffer_data, _ = self._get_auth(
+                    sc, sc.buffer.data._val, previous.buffer_data
+                )
+                if self.buffer_data is previous.buffer_data \
+                  and previous.buffer_form is not None \
+                  and previous.buffer_storage is not None:
+                    self.buffer_storage = previous.buffer_storage
+                    self.buffer_form = previous.buffer_form
+                else:
+                    self.buffer_storage, self.buffer_form = get_form(self.buffer_data)
             else:
-                self.buffer_data = deepcopy(sc.buffer.data._val)
-                self.buffer_form = deepcopy(sc.buffer.form._val)
+                self.buffer_data, _ = snapshot(sc.buffer.data._val, previous.buffer_data)
+                self.buffer_form, _ = snapshot(sc.buffer.form._val, previous.buffer_form)
                 self.buffer_storage = sc.buffer.storage._val
         return self
 
-    def _get_auth(self, sc, data):
+    def _get_auth(self, sc, data, previous):
         # Returns:
         # - the authoritative part of the data
         # - Whether the data was filtered
-        v = deepcopy(data)
         if not sc.inchannels:
-            return v, False
+            return snapshot(data, previous)[0], False
         if list(sc.inchannels.keys()) == [()]:
             return None, False
-        if v is None:
+        if data is None:
             return None, False
-        assert isinstance(v, dict)
+        assert isinstance(data, dict)
+        # Copy only the dicts on the path of each inchannel; the rest is
+        #  shared with the data snapshot
+        v, _ = snapshot(data, previous)
+        v = v.copy()
+        copied = {(): v}
         for inchannel in sc.inchannels:
             vv = v
-            for p in inchannel[:-1]:
+            for n, p in enumerate(inchannel[:-1]):
                 if not isinstance(vv, dict) or p not in vv:
                     vv = None
                     break
-                vv = vv[p]
+                path = inchannel[:n+1]
+                if path not in copied:
+                    child = vv[p]
+                    if isinstance(child, dict):
+                        child = vv[p] = child.copy()
+                    copied[path] = child
+                vv = copied[path]
             p = inchannel[-1]
-            if vv is not None and p in vv:
+            if isinstance(vv, dict) and p in vv:
                 vv.pop(p)
         return v, True
 
@@ -367,19 +412,13 @@ class StructuredCellState:
         result.form = form
         result.schema = {}
         s = Silk(schema=result.schema).set(data)
-        result.data = s.data
+        result.data, _ = snapshot(s.data)
         return result
 
     def __deepcopy__(self, memo):
+        # The values are immutable snapshots, and can be shared
         result = StructuredCellState()
-        result.data = deepcopy(self.data, memo)
-        result.form = deepcopy(self.form, memo)
-        result.storage = self.storage
-        result.schema = deepcopy(self.schema, memo)
-        result.buffer_data = deepcopy(self.buffer_data, memo)
-        result.buffer_form = deepcopy(self.buffer_form, memo)
-        result.buffer_storage = self.buffer_storage
-        result.buffer_nosync = self.buffer_nosync
+        result.__dict__.update(self.__dict__)
         return result
 
 
@@ -395,6 +434,7 @@ class StructuredCell(CellLikeBase):
     _exported = True
     _observer = None
     _share_callback = None
+    _outchannel_batch = None # open OverlayMonitor batch, see _batch_outchannels
     def __init__(
       self,
       name,
@@ -407,7 +447,7 @@ class StructuredCell(CellLikeBase):
       outchannels,
       *,
       editchannels=[],
-      state=None #is used destructively, you may want to make a deepcopy beforehand
+      state=None #its values are copied into the cells
     ):
         from ..silk import Silk
         if not get_macro_mode():
@@ -700,6 +740,21 @@ class StructuredCell(CellLikeBase):
         finally:
             self._from_pin_mode = old_from_pin_mode
 
+    def _batch_outchannels(self):
+        """Coalesces the outchannel updates until the end of the current
+         manager flush (see OverlayMonitor.batch)
+        Outside of a flush, the updates are sent immediately"""
+        if self._outchannel_batch is not None:
+            return
+        batch = self.monitor.batch()
+        batch.__enter__()
+        self._outchannel_batch = batch
+        def close():
+            self._outchannel_batch = None
+            batch.__exit__(None, None, None)
+        manager = self.data._get_manager()
+        manager.workqueue.defer(close)
+
     def connect_inchannel(self, source, inchannel, transfer_mode=None):
         ic = self.inchannels[inchannel]
         manager = source._get_manager()
@@ -0,0 +1,108 @@
+"""
+Cache of transformation results
+
+A transformation is identified by a checksum over the transformer's output
+ name and, for each input pin (including the code), its name, checksum,
+ access mode and content type. The main-thread transformer computes this
+ checksum whenever it sends an input update to its kernel, and the kernel
+ consults the cache before launching an executor.
+
+Results are stored pickled: in an in-memory LRU tier, and optionally in a
+ directory on disk, so that re-opening a workflow does not recompute
+ transformations that have been computed before.
+Results that cannot be pickled are not cached.
+
+Configuration via environment variables:
+- SEAMLESS_TRANSFORMATION_CACHE_SIZE: maximum size of the in-memory tier
+   in MB (default: 256). 0 disables the in-memory tier.
+- SEAMLESS_TRANSFORMATION_CACHE_DIR: directory of the on-disk tier
+   (default: not set, no on-disk tier)
+"""
+
+import os
+import json
+import pickle
+import threading
+from collections import OrderedDict
+
+from .checksum import checksum as compute_checksum
+
+CACHE_SIZE = int(os.environ.get("SEAMLESS_TRANSFORMATION_CACHE_SIZE", 256))
+CACHE_DIR = os.environ.get("SEAMLESS_TRANSFORMATION_CACHE_DIR")
+
+def transformation_checksum(output_name, inputs):
+    """inputs: dict of pin name => (checksum, access_mode, content_type)"""
+    items = [[pin] + list(inputs[pin]) for pin in sorted(inputs.keys())]
+    return compute_checksum(json.dumps([output_name, items]))
+
+class TransformationCache:
+    def __init__(self, max_size=CACHE_SIZE * 1024 * 1024, directory=CACHE_DIR):
+        self.max_size = max_size
+        self.directory = directory
+        self.size = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _filename(self, key):
+        return os.path.join(self.directory, key + ".pickle")
+
+    def get(self, key):
+        """Returns (True, result) for a cache hit, (False, None) for a miss"""
+        with self._lock:
+            data = self._results.get(key)
+            if data is not None:
+                self._results.move_to_end(key)
+        if data is None and self.directory is not None:
+            try:
+                with open(self._filename(key), "rb") as f:
+                    data = f.read()
+            except OSError:
+                pass
+            else:
+                self._add(key, data)
+        if data is None:
+            return False, None
+        try:
+            return True, pickle.loads(data)
+        except Exception:
+            return False, None
+
+    def _add(self, key, data):
+        if not self.max_size or len(data) > self.max_size:
+            return
+        with self._lock:
+            if key in self._results:
+                return
+            self._results[key] = data
+            self.size += len(data)
+            while self.size > self.max_size:
+                _, old_data = self._results.popitem(last=False)
+                self.size -= len(old_data)
+
+    def set(self, key, result):
+        try:
+            data = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        self._add(key, data)
+        if self.directory is not None:
+            filename = self._filename(key)
+            tmpfile = "%s.%d.%d.tmp" % (filename, os.getpid(), threading.get_ident())
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(tmpfile, "wb") as f:
+                    f.write(data)
+                os.replace(tmpfile, filename)
+            except OSError:
+                try:
+                    os.remove(tmpfile)
+                except OSError:
+                    pass
+
+    def clear(self):
+        """Clears the in-memory tier (the on-disk tier is left intact)"""
+        with self._lock:
+            self._results.clear()
+            self.size = 0
+
+transformation_cache = TransformationCache()
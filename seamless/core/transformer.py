@@ -1,7 +1,6 @@
 from collections import deque, OrderedDict
 import traceback
 import os
-import time
 from functools import partial
 import threading
 
@@ -11,6 +10,9 @@ from .asynckernel.remote.client import JobTransformer as ServiceTransformer
 #TODO: multiple types of remote transformers
 
 from .protocol import content_types
+from .transformation_cache import transformation_checksum
+
+KERNEL_RESPONSE_TIMEOUT = 0.5 #seconds
 
 class Transformer(Worker):
     """
@@ -35,6 +37,8 @@ class Transformer(Worker):
         self._last_value = None
         self._last_value_preliminary = False
         self._message_id = 0
+        self._input_checksums = {}
+        self._unreleased_messages = 0
         self._transformer_params = OrderedDict()
         self._in_equilibrium = in_equilibrium #transformer is initially in equilibrium
         forbidden = ("code",)
@@ -127,12 +131,22 @@ class Transformer(Worker):
 
         self.active = True
 
-    def _send_message(self, msg):
-        self._message_id += 1
-        self._pending_updates += 1
-        labeled_msg = (self._message_id,) + msg
-        self.transformer.input_queue.append(labeled_msg)
-        self.transformer.semaphore.release()
+    def _send_message(self, *msgs):
+        for msg in msgs:
+            self._message_id += 1
+            self._add_pending_updates(1)
+            labeled_msg = (self._message_id,) + msg
+            self.transformer.input_queue.append(labeled_msg)
+        # Updates sent within the same flush are delivered to the kernel together,
+        #  with a single release, so that the kernel sees all of them at once
+        self._unreleased_messages += len(msgs)
+        if self._unreleased_messages == len(msgs):
+            self._get_manager().workqueue.defer(self._release_messages, last=True)
+
+    def _release_messages(self):
+        n, self._unreleased_messages = self._unreleased_messages, 0
+        if n:
+            self.transformer.semaphore.release(n)
 
     def receive_update(self, input_pin, value, checksum, access_mode, content_type):
         if not self.active:
@@ -141,9 +155,29 @@ class Transformer(Worker):
             return
         if checksum is None and value is not None:
             checksum = str(value) #KLUDGE; as long as structured_cell doesn't compute checksums...
+            # ... but such a checksum can't be trusted for the transformation cache
+            self._input_checksums[input_pin] = None
+        else:
+            self._input_checksums[input_pin] = (checksum, access_mode, content_type)
         if not self._receive_update_checksum(input_pin, checksum):
             return
-        self._send_message( (input_pin, value, access_mode, content_type) )
+        msgs = [(input_pin, value, access_mode, content_type)]
+        # Let the kernel consult the transformation cache
+        transformation = self._transformation_checksum()
+        if transformation is not None:
+            msgs.append( ("@TRANSFORMATION", transformation, None, None) )
+        self._send_message(*msgs)
+
+    def _transformation_checksum(self):
+        inputs = {}
+        for pinname, pin in self._pins.items():
+            if not isinstance(pin, InputPin):
+                continue
+            inp = self._input_checksums.get(pinname)
+            if inp is None or inp[0] is None:
+                return None
+            inputs[pinname] = inp
+        return transformation_checksum(self._output_name, inputs)
 
     def _touch(self):
         self._send_message( ("@TOUCH", None, None, None) )
@@ -175,18 +209,19 @@ class Transformer(Worker):
             output_name, output_value = self.output_queue.popleft()
             return output_name, output_value
 
+        def wait_for_item():
+            # Blocks until the kernel sends something, or until the timeout
+            ok = self.output_semaphore.acquire(timeout=KERNEL_RESPONSE_TIMEOUT)
+            if ok:
+                self.output_semaphore.release()
+            return ok
+
         def receive_end():
             nonlocal updates_on_hold
             if updates_on_hold:
-                for n in range(100): #100x5 ms
-                    ok = self.output_semaphore.acquire(blocking=False)
-                    if ok:
-                        self.output_semaphore.release()
-                        break
-                    time.sleep(0.005)
-                else:
+                if not wait_for_item():
                     # should only happen if killed
-                    self._pending_updates -= updates_on_hold
+                    self._add_pending_updates(-updates_on_hold)
                     updates_on_hold = 0
 
         if self._listen_output_state is None:
@@ -212,14 +247,8 @@ class Transformer(Worker):
                     with an @START signal, and then a @END signal when the
                     computation is complete
                     """
-                    for n in range(100): #100x5 ms
-                        ok = self.output_semaphore.acquire(blocking=False)
-                        if ok:
-                            self.output_semaphore.release()
-                            break
-                        time.sleep(0.005)
-                    else:
-                        self._pending_updates -= updates_on_hold
+                    if not wait_for_item():
+                        self._add_pending_updates(-updates_on_hold)
                         updates_on_hold = 0
 
                 if not between_start_end:
@@ -255,7 +284,7 @@ class Transformer(Worker):
                     updates_processed = output_value[0]
                     if self._pending_updates < updates_processed:
                         #This will not set the worker as stable
-                        self._pending_updates -= updates_processed
+                        self._add_pending_updates(-updates_processed)
                     else:
                         # hold on to updates_processed for a while, we don't
                         #  want to set the worker as stable before we have
@@ -304,10 +333,10 @@ class Transformer(Worker):
                 output_name, output_value = item
                 assert output_name is None
                 updates_processed = output_value[0]
-                self._pending_updates -= updates_processed
+                self._add_pending_updates(-updates_processed)
 
                 if updates_on_hold:
-                    self._pending_updates -= updates_on_hold
+                    self._add_pending_updates(-updates_on_hold)
                     updates_on_hold = 0
             except Exception:
                 traceback.print_exc() #TODO: store it?
@@ -1,4 +1,5 @@
 import weakref
+import threading
 from . import SeamlessBase
 from .macro_mode import get_macro_mode, with_macro_mode
 
@@ -24,6 +25,7 @@ class Worker(SeamlessBase):
     def __init__(self):
         super().__init__()
         self._pending_updates_value = 0
+        self._pending_updates_lock = threading.RLock()
         self._last_update_checksums = {}
         if get_macro_mode():
             from . import macro_register
@@ -41,6 +43,10 @@ class Worker(SeamlessBase):
             return False
         if checksum is not None:
             self._last_update_checksums[pin] = checksum
+        else:
+            # The pin has become undefined; the next value must not be
+            #  discarded if it happens to be equal to the last one
+            self._last_update_checksums.pop(pin)
         return True
 
     def activate(self, only_macros):
@@ -68,6 +74,12 @@ class Worker(SeamlessBase):
             manager.set_stable(self, True)
         self._pending_updates_value = value
 
+    def _add_pending_updates(self, n):
+        """self._pending_updates += n, for workers that update the count
+         from more than one thread (e.g. the transformer output listener)"""
+        with self._pending_updates_lock:
+            self._pending_updates += n
+
     def __getattr__(self, attr):
         if self._pins is None or attr not in self._pins:
             raise AttributeError(attr)
@@ -9,9 +9,12 @@ from ..core.macro_mode import macro_mode_on, get_macro_mode
 from ..core.context import context, Context as CoreContext
 from ..core.cell import cell
 from ..core.mount import mountmanager #for now, just a single global mountmanager
+from ..core.mainloop import workqueue
 from ..core.cache import cache
 from ..core import layer
 from ..midlevel.translate import translate
+from ..midlevel.incremental import get_topology, update_topology, \
+  get_changes, translate_incremental
 from .assign import assign
 from .proxy import Proxy
 from ..midlevel import copying
@@ -97,6 +100,8 @@ class Context:
     _graph_ctx = None
     _depsgraph = None
     _translating = False
+    _translation_topology = None
+    _translation_namespace = None
     _as_lib = None
     _auto_register_library = False
     _shares = None
@@ -193,7 +198,7 @@ class Context:
         self._auto_register_library = True
         self._do_translate(force=True)
 
-    def mount(self, path=None, mode="rw", authority="cell", persistent=False):
+    def mount(self, path=None, mode="rw", authority="cell", persistent=False, backend=None):
         assert not self._dummy
         if self._parent() is not self:
             raise NotImplementedError
@@ -207,6 +212,8 @@ class Context:
             "authority": authority,
             "persistent": persistent
         }
+        if backend is not None:
+            self._mount["backend"] = backend
         with macro_mode_on():
             ctx = self._ctx
             ctx.mount(**self._mount)
@@ -214,14 +221,14 @@ class Context:
             mountmanager.paths[ctx].add(path) #kludge
         self._translate()
 
-    def mount_graph(self, mountdir, persistent=None):
+    def mount_graph(self, mountdir, persistent=None, backend=None):
         assert not self._dummy
         with macro_mode_on(self):
             if self._graph_ctx is not None:
                 self._graph_ctx.destroy()
             ctx = self._graph_ctx = context(toplevel=True)
         with macro_mode_on():
-            ctx.mount(mountdir, persistent=persistent, mode="w")
+            ctx.mount(mountdir, persistent=persistent, mode="w", backend=backend)
             mountmanager.add_context(ctx,(), False)
             mountmanager.paths[ctx].add(mountdir) #kludge
         with macro_mode_on():
@@ -238,6 +245,13 @@ class Context:
         self.translate()
         return self._ctx.equilibrate(timeout)
 
+    async def equilibrate_async(self, timeout=None):
+        """Version of equilibrate() to be awaited from a coroutine"""
+        if self._dummy:
+            return
+        self.translate()
+        return await self._ctx.equilibrate_async(timeout)
+
     def self(self):
         raise NotImplementedError
 
@@ -248,6 +262,12 @@ class Context:
         return self._do_translate(force=force, explicit=True)
 
     def _do_translate(self, force=False, explicit=False):
+        # The transformer kernels receive the updates of the translation in the
+        #  next flush, together with any updates that follow in the same statement
+        with workqueue.postponing():
+            return self._translate_graph(force, explicit)
+
+    def _translate_graph(self, force, explicit):
         if self._dummy:
             return
         assert self._as_lib is None or self._from_lib is None
@@ -258,13 +278,45 @@ class Context:
             raise Exception("Nested invocation of ctx.translate")
         from ..core.macro_mode import get_macro_mode
         assert not get_macro_mode()
+        changes = None
+        if not force and self._gen_context is not None \
+          and self._translation_topology is not None and not is_lib \
+          and self._mount is None:
+            changes = get_changes(
+                self._translation_topology,
+                self._graph.nodes, self._graph.connections
+            )
         try:
             self._translating = True
             if self._ctx is not None and hasattr(self._ctx, TRANSLATION_PREFIX):
-                copying.fill_cell_values(self, self._graph.nodes)
+                if changes is None:
+                    copying.fill_cell_values(self, self._graph.nodes)
+                else:
+                    dirty, removed = changes
+                    topology_nodes = self._translation_topology["nodes"]
+                    nodes = {path: self._graph.nodes[path] for path in dirty \
+                      if path in topology_nodes}
+                    # Pending work must reach the old low-level objects
+                    #  before they are destroyed
+                    workqueue.flush()
+                    copying.fill_cell_values(self, nodes, deactivate=False)
             self._remount_graph()
         finally:
             self._translating = False
+        if changes is not None:
+            if self._translate_incremental(*changes):
+                self._after_translation(explicit, changes)
+                return
+            # The values of the other nodes have not been filled in yet
+            dirty, removed = changes
+            nodes = {path: node for path, node in self._graph.nodes.items() \
+              if path not in dirty}
+            try:
+                self._translating = True
+                copying.fill_cell_values(self, nodes)
+            finally:
+                self._translating = False
+            changes = None
         # nodes must be in alphabetical order; this matters for linked cells that each have their own value!
         graph = [v for k,v in sorted(self._graph.nodes.items(), key=lambda kv: kv[0])]
         graph += self._graph.connections
@@ -286,14 +338,13 @@ class Context:
                     ctx = context(context=self._ctx, name=TRANSLATION_PREFIX)
                     lib_paths = get_lib_paths(self)
                     assert mountmanager.reorganizing
-                    translate(graph, ctx, lib_paths, is_lib)
+                    namespace = translate(graph, ctx, lib_paths, is_lib)
                     self._ctx._add_child(TRANSLATION_PREFIX, ctx)
                     ctx._get_manager().activate(only_macros=True)
                     ok = True
                     layer.fill_objects(ctx, self)
                     if self._gen_context is not None:
-                        #hits = cache(ctx, self._gen_context) ### TODO: re-enable caching
-                        hits = []
+                        cache(ctx, self._gen_context)
 
             with macro_mode_on():
                 def seal(c):
@@ -312,6 +363,10 @@ class Context:
                     self._gen_context._manager.flush()
                     self._gen_context.full_destroy()
             self._gen_context = ctx
+            self._translation_namespace = namespace
+            self._translation_topology = get_topology(
+                self._graph.nodes, self._graph.connections
+            )
         except Exception as exc:
             if not ok:
                 ###traceback.print_exc()  #not if we raise...
@@ -335,16 +390,69 @@ class Context:
                 # but store the exception as secondary exception, just in case
                 print("highlevel context CLEANUP error"); traceback.print_exc()
                 self._gen_context = ctx
+                self._translation_topology = None
             raise
         finally:
             root._cell_update_hook = old_cell_update_hook
             self._translating = False
         if self._auto_register_library:
             ctx._get_manager().cell_update_hook(self._library_update_hook)
+        self._after_translation(explicit)
+
+    def _translate_incremental(self, dirty, removed):
+        """Re-translates only the changed nodes, inside the current translated context
+        Returns False if this failed, and a full translation must be done instead"""
+        ctx = self._gen_context
+        nodes = self._graph.nodes
+        # translation pops TEMP and cached values from the nodes
+        backup = {path: nodes[path].copy() for path in dirty}
+        def set_seal(c, seal):
+            c._seal = seal
+            for child in c._children.values():
+                if isinstance(child, CoreContext):
+                    set_seal(child, seal)
+        root = self._ctx._get_manager()._root()
+        old_cell_update_hook = root._cell_update_hook
+        try:
+            root._cell_update_hook = None
+            self._translating = True
+            # The translated context is sealed; unseal it, so that connections
+            #  into it are made directly instead of through layers
+            with macro_mode_on():
+                set_seal(ctx, None)
+                try:
+                    translate_incremental(
+                        nodes, self._graph.connections, ctx,
+                        self._translation_namespace, dirty, removed, False
+                    )
+                finally:
+                    set_seal(ctx, self._ctx)
+        except Exception:
+            # Fall back to a full translation, which will report any genuine error
+            for path, node_backup in backup.items():
+                node = nodes[path]
+                node.clear()
+                node.update(node_backup)
+            self._translation_topology = None
+            return False
+        finally:
+            root._cell_update_hook = old_cell_update_hook
+            self._translating = False
+        update_topology(
+            self._translation_topology,
+            nodes, self._graph.connections, dirty, removed
+        )
+        return True
 
+    def _after_translation(self, explicit, changes=None):
         try:
             self._translating = True
-            copying.fill_cell_values(self, self._graph.nodes) #do it again, because we can get the real values from the low-level cells now
+            nodes = self._graph.nodes
+            if changes is not None and self._graph_ctx is None:
+                # The values of the other nodes will be filled in upon the next
+                #  full translation, or when the graph is requested
+                nodes = {path: nodes[path] for path in changes[0]}
+            copying.fill_cell_values(self, nodes, deactivate=(changes is None)) #do it again, because we can get the real values from the low-level cells now
             self._remount_graph() #do it again, because TEMP values may have been popped, and we have now real values instead
             for traitlet in self._traitlets.values():
                 traitlet._connect()
@@ -35,15 +35,20 @@ def fill_structured_cell_value(cell, node, label_auth, label_cached):
      partial authority (having some but not all values dependent on inchannels)
     In that case, both the authoritative part of the state (under label_auth)
      and the full state (under label_cached) are stored
+    The unchanged parts of the states are shared with the states already in the node.
     """
     state = None
     if cell.has_authority: #cell has at least some authority
-        state = StructuredCellState().set(cell, only_auth=True)
+        state = StructuredCellState().set(
+            cell, only_auth=True, previous=node.get(label_auth)
+        )
         node[label_auth] = state
     else:
         node.pop(label_auth, None)
     if not cell.authoritative: #cell has at least some non-authority
-        state = StructuredCellState().set(cell, only_auth=False)
+        state = StructuredCellState().set(
+            cell, only_auth=False, previous=node.get(label_cached)
+        )
         node[label_cached] = state
     else:
         node.pop(label_cached, None)
@@ -75,12 +80,17 @@ def fill_cell_value(cell, node):
     else:
         raise TypeError(type(cell))
 
-def fill_cell_values(ctx, nodes, path=None):
+def fill_cell_values(ctx, nodes, path=None, deactivate=True):
+    """Fills the values of the low-level cells into the nodes
+    If deactivate, the manager is deactivated while doing so, and flushed afterwards.
+    Since this flushes the whole context, it is skipped by incremental
+     translation, which fills only a few nodes"""
     from ..highlevel import Cell, Transformer, Reactor, Link
     from ..core.structured_cell import StructuredCell
     manager = ctx._ctx._get_manager()
     try:
-        manager.deactivate()
+        if deactivate:
+            manager.deactivate()
         for p in nodes:
             pp = path + p if path is not None else p
             child = ctx._children.get(pp)
@@ -136,4 +146,5 @@ def fill_cell_values(ctx, nodes, path=None):
             else:
                 raise TypeError(p, type(child))
     finally:
-        manager.activate(only_macros=False)
+        if deactivate:
+            manager.activate(only_macros=False)
@@ -0,0 +1,227 @@
+"""
+Incremental translation
+
+Instead of translating the whole mid-level graph into a new low-level context
+ (and re-using the values and transformers of the old one via core.cache),
+ only the nodes that have changed are re-translated, inside the existing context.
+
+A node must be re-translated if:
+- it is new, or its topology (anything but its value) has changed
+- a connection from or to it has been added or removed
+  (since this changes its channels)
+The connections from and to the re-translated nodes are re-made;
+ all other low-level cells, workers and connections are left untouched.
+As in a full translation, values and transformer kernels of the old
+ low-level objects are re-used by the new ones if their signature matches
+ (see core.cache).
+
+Graphs with links or library contexts are always translated as a whole,
+ as are changes in subcontexts, reactors and compiled transformers.
+Mounted contexts are translated as a whole as well, since their subcontexts
+ are mounted as directories.
+"""
+
+from copy import deepcopy
+
+from ..core import Context, Worker, StructuredCell
+from ..core.cell import CellLikeBase, CellBase
+from ..core.mount import mountmanager, is_dummy_mount
+from ..core import cache
+from .util import STRUC_ID
+
+_code_keys = ("code", "code_start", "code_update", "code_stop")
+
+def _is_value_key(key):
+    # keys that are filled in from the low-level cells by copying.fill_cell_values
+    if key.startswith("stored_") or key.startswith("cached_"):
+        return True
+    return key in _code_keys or key == "in_equilibrium"
+
+def _node_topology(node):
+    return {k: v for k, v in node.items() if not _is_value_key(k)}
+
+def _get_connections(connections):
+    result = set()
+    for con in connections:
+        if con["type"] == "connection":
+            result.add((tuple(con["source"]), tuple(con["target"])))
+    return result
+
+def get_topology(nodes, connections):
+    """Returns the topology of the mid-level graph, i.e. without the cell values
+    The topology is a snapshot: later changes in the graph do not affect it"""
+    return {
+        "nodes": {path: deepcopy(_node_topology(node)) for path, node in nodes.items()},
+        "connections": _get_connections(connections),
+        "links": [deepcopy(con) for con in connections if con["type"] == "link"],
+    }
+
+def update_topology(topology, nodes, connections, dirty, removed):
+    """Updates the topology after an incremental translation"""
+    topology_nodes = topology["nodes"]
+    for path in removed:
+        topology_nodes.pop(path)
+    for path in dirty:
+        topology_nodes[path] = deepcopy(_node_topology(nodes[path]))
+    topology["connections"] = _get_connections(connections)
+
+def _owner(path, node_paths):
+    for n in range(len(path), 0, -1):
+        if path[:n] in node_paths:
+            return path[:n]
+    return None
+
+def _supported(node):
+    t = node["type"]
+    if t == "cell":
+        return True
+    if t == "transformer":
+        return not node["compiled"]
+    return False
+
+def get_changes(topology, nodes, connections):
+    """Compares the topology of the last translation with the mid-level graph
+    Returns the paths of the nodes that must be re-translated,
+     and the paths of the nodes that have been removed.
+    Returns None if the graph must be translated as a whole
+    """
+    old_nodes = topology["nodes"]
+    if len(topology["links"]):
+        return None
+    for con in connections:
+        if con["type"] == "link":
+            return None
+    old_contexts, contexts = set(), set()
+    for path, node in old_nodes.items():
+        if node["type"] == "context":
+            old_contexts.add(path)
+    for path, node in nodes.items():
+        if node["type"] == "context":
+            if node.get("from_lib") is not None:
+                return None
+            contexts.add(path)
+    if contexts != old_contexts:
+        return None
+
+    dirty = set()
+    for path, node in nodes.items():
+        if node["type"] == "context":
+            continue
+        if "TEMP" in node:
+            dirty.add(path)
+            continue
+        old_node = old_nodes.get(path)
+        if old_node is None or old_node != _node_topology(node):
+            dirty.add(path)
+    removed = set([path for path in old_nodes if path not in nodes])
+
+    node_paths = set([path for path in nodes if path not in contexts])
+    node_paths.update(removed)
+    new_connections = _get_connections(connections)
+    changed_connections = new_connections ^ topology["connections"]
+    for source, target in changed_connections:
+        for point in source, target:
+            owner = _owner(point, node_paths)
+            if owner is None:
+                return None
+            if owner not in removed:
+                dirty.add(owner)
+
+    for path in dirty:
+        if not _supported(nodes[path]):
+            return None
+    for path in removed:
+        if not _supported(old_nodes[path]):
+            return None
+    return dirty, removed
+
+def _disconnect(obj):
+    if isinstance(obj, Context):
+        for child in obj._children.values():
+            _disconnect(child)
+    elif isinstance(obj, StructuredCell):
+        for channels in (obj.inchannels, obj.outchannels, obj.editchannels):
+            for channel in channels.values():
+                channel._get_manager().disconnect(channel)
+    elif isinstance(obj, Worker):
+        for pin in obj._pins.values():
+            pin._get_manager().disconnect(pin)
+    elif isinstance(obj, CellLikeBase):
+        obj._get_manager().disconnect(obj)
+
+def _destroy(obj):
+    if isinstance(obj, Context):
+        obj.destroy()
+        obj.full_destroy()
+    elif isinstance(obj, CellBase):
+        if not is_dummy_mount(obj._mount):
+            mountmanager.unmount(obj)
+        obj._release_buffer()
+
+def _get_parent(ctx, path):
+    parent = ctx
+    for p in path[:-1]:
+        parent = getattr(parent, p)
+    return parent
+
+def translate_incremental(nodes, connections, ctx, namespace, dirty, removed, is_lib):
+    """Re-translates the dirty nodes inside ctx, and removes the removed ones
+    namespace is the namespace of the last translation (see translate);
+     it is updated in-place.
+    Must be invoked in macro mode, with ctx unsealed
+    """
+    from .translate import translate_node, translate_connection, sort_namespace
+
+    # 1. Remove the low-level objects of the old nodes, and their connections
+    affected = dirty | removed
+    old_objects = []
+    for path in sorted(affected):
+        parent = _get_parent(ctx, path)
+        name = path[-1]
+        for childname in (name, name + STRUC_ID):
+            child = parent._children.pop(childname, None)
+            if child is not None:
+                old_objects.append(child)
+    if cache.use_caching:
+        old_index = cache.index_objects(cache.collect_objects(old_objects), ctx)
+    for obj in old_objects:
+        _disconnect(obj)
+
+    def is_affected(path):
+        for n in range(len(path), 0, -1):
+            if path[:n] in affected:
+                return True
+        return False
+    for key in list(namespace.keys()):
+        if is_affected(key[0]):
+            namespace.pop(key)
+
+    # 2. Translate the dirty nodes
+    connection_paths = [(con["source"], con["target"]) for con in connections \
+      if con["type"] == "connection"]
+    for path in sorted(dirty):
+        translate_node(nodes[path], ctx, namespace, connection_paths, [], None, is_lib)
+
+    # 3. Re-make the connections from and to the dirty nodes
+    namespace2 = sort_namespace(namespace)
+    for con in connections:
+        if con["type"] != "connection":
+            continue
+        if is_affected(con["source"]) or is_affected(con["target"]):
+            translate_connection(con, namespace2, ctx)
+
+    # 4. Re-use the values and kernels of the old objects, and destroy them
+    if cache.use_caching:
+        new_objects = []
+        for path in sorted(dirty):
+            parent = _get_parent(ctx, path)
+            name = path[-1]
+            for childname in (name, name + STRUC_ID):
+                child = parent._children.get(childname)
+                if child is not None:
+                    new_objects.append(child)
+        new_objects = cache.collect_objects(new_objects)
+        cache.cache_objects(new_objects, ctx, old_index)
+    with mountmanager.reorganize(None):
+        for obj in old_objects:
+            _destroy(obj)
@@ -286,7 +286,45 @@ def translate_link(node, namespace, ctx):
     else:
         second._get_manager().connect_cell(second, first2, duplex=True)
 
+def translate_node(node, ctx, namespace, connection_paths, link_paths, lib_path, is_lib, link_target=None):
+    """Translates a single cell, transformer or reactor node"""
+    t = node["type"]
+    path = node["path"]
+    if t == "transformer":
+        inchannels, outchannels = find_channels(path, connection_paths)
+        if node["compiled"]:
+            from .translate_compiled_transformer import translate_compiled_transformer
+            translate_compiled_transformer(node, ctx, namespace, inchannels, outchannels, lib_path, is_lib)
+        elif node["language"] in ("python", "ipython"):
+            translate_py_transformer(node, ctx, namespace, inchannels, outchannels, lib_path, is_lib)
+        elif node["language"] == "bash":
+            translate_bash_transformer(node, ctx, namespace, inchannels, outchannels, lib_path, is_lib)
+        else:
+            raise NotImplementedError(node["language"])
+    elif t == "reactor":
+        if node["language"] not in ("python", "ipython"):
+            raise NotImplementedError(node["language"])
+        inchannels, outchannels = find_channels(path, connection_paths)
+        editchannels = find_editchannels(path, link_paths)
+        translate_py_reactor(node, ctx, namespace, inchannels, outchannels, editchannels, lib_path, is_lib)
+    elif t == "cell":
+        inchannels, outchannels = find_channels(path, connection_paths)
+        editchannels = find_editchannels(path, link_paths)
+        translate_cell(node, ctx, namespace, inchannels, outchannels, editchannels, lib_path, is_lib, link_target=link_target)
+    else:
+        raise TypeError(t)
+
+def sort_namespace(namespace):
+    """Longest paths first, as expected by get_path"""
+    namespace2 = OrderedDict()
+    for k in sorted(namespace.keys(), key=lambda k:-len(k)):
+        namespace2[k] = namespace[k]
+    return namespace2
+
 def translate(graph, ctx, from_lib_paths, is_lib):
+    """Translates the mid-level graph into ctx
+    Returns the namespace of translated paths,
+     which can be passed on to translate_incremental"""
     ###import traceback; stack = traceback.extract_stack(); print("TRANSLATE:"); print("".join(traceback.format_list(stack[:3])))
     contexts = {con["path"]: con for con in graph if con["type"] == "context"}
     for path in sorted(contexts.keys(), key=lambda k:len(k)):
@@ -355,38 +393,17 @@ def translate(graph, ctx, from_lib_paths, is_lib):
             continue
         path = node["path"]
         lib_path = get_lib_path(path[:-1], from_lib_paths)
-        if t == "transformer":
-            inchannels, outchannels = find_channels(node["path"], connection_paths)
-            if node["compiled"]:
-                from .translate_compiled_transformer import translate_compiled_transformer
-                translate_compiled_transformer(node, ctx, namespace, inchannels, outchannels, lib_path, is_lib)
-            elif node["language"] in ("python", "ipython"):
-                translate_py_transformer(node, ctx, namespace, inchannels, outchannels, lib_path, is_lib)
-            elif node["language"] == "bash":
-                translate_bash_transformer(node, ctx, namespace, inchannels, outchannels, lib_path, is_lib)
-            else:
-                raise NotImplementedError(node["language"])
-        elif t == "reactor":
-            if node["language"] not in ("python", "ipython"):
-                raise NotImplementedError(node["language"])
-            inchannels, outchannels = find_channels(node["path"], connection_paths)
-            editchannels = find_editchannels(node["path"], link_paths)
-            translate_py_reactor(node, ctx, namespace, inchannels, outchannels, editchannels, lib_path, is_lib)
-        elif t == "cell":
-            if path in link_target_paths:
-                continue #done already before
-            inchannels, outchannels = find_channels(path, connection_paths)
-            editchannels = find_editchannels(path, link_paths)
-            link_target = None
-            if path in lowlevel_links:
-                link_target = link_targets[lowlevel_links[path]]
-            translate_cell(node, ctx, namespace, inchannels, outchannels, editchannels, lib_path, is_lib, link_target=link_target)
-        else:
-            raise TypeError(t)
+        if t == "cell" and path in link_target_paths:
+            continue #done already before
+        link_target = None
+        if t == "cell" and path in lowlevel_links:
+            link_target = link_targets[lowlevel_links[path]]
+        translate_node(
+          node, ctx, namespace, connection_paths, link_paths, lib_path, is_lib,
+          link_target=link_target
+        )
 
-    namespace2 = OrderedDict()
-    for k in sorted(namespace.keys(), key=lambda k:-len(k)):
-        namespace2[k] = namespace[k]
+    namespace2 = sort_namespace(namespace)
 
     for node in links:
         translate_link(node, namespace2, ctx)
@@ -394,6 +411,8 @@ def translate(graph, ctx, from_lib_paths, is_lib):
     for node in connections:
         translate_connection(node, namespace2, ctx)
 
+    return namespace
+
 from .library import get_lib_path
 from .translate_py_transformer import translate_py_transformer
 from .translate_bash_transformer import translate_bash_transformer
\ No newline at end of file
@@ -1,9 +1,12 @@
 from numpy import ndarray, void
-from .get_form import get_form
+from .get_form import get_form, form_unchanged
+from .snapshot import snapshot
+from .chunked import ChunkedArray
 from . import MixedScalar, MixedBase, Scalar,  scalars, is_np_struct, _allowed_types
 from . import MonitorTypeError
 import json
 from copy import deepcopy
+from contextlib import contextmanager
 
 def get_subpath(data, form, path):
     if data is None or silk.is_none(data):
@@ -48,9 +51,83 @@ def subpath_is_none(part_result):
     data, form, _ = part_result
     return (data is None and form is None)
 
+def _child_storage(form):
+    if isinstance(form, dict):
+        return form.get("storage", "pure-plain")
+    return "pure-plain"
+
+def _annotate(storage, form):
+    """Returns the form of a child as it is stored inside the form of a plain parent
+    (see get_form_dict_plain and get_form_items_list_plain)"""
+    if storage == "pure-plain":
+        return form
+    if isinstance(form, str):
+        form = {"type": form}
+    else:
+        form = form.copy()
+    form["storage"] = storage
+    return form
+
+def _is_plain_container(data, form):
+    if not isinstance(form, dict):
+        return False
+    type_ = form["type"]
+    if type_ == "object":
+        return isinstance(data, dict)
+    elif type_ == "array":
+        return isinstance(data, list) and tuple(form["shape"]) == (len(data),)
+    return False
+
+def _get_child_form(form, attr):
+    if form["type"] == "object":
+        return form.get("properties", {}).get(attr)
+    if form["identical"]:
+        return form["items"]
+    return form["items"][attr]
+
+def _update_parent_form(data, form, attr, child_form):
+    """Returns the new storage and form of a plain container (data, form)
+     after the form of child attr has changed into child_form
+    child_form is annotated with its storage (see _annotate),
+     or None if the child has been deleted"""
+    if form["type"] == "object":
+        props = form.get("properties", {}).copy()
+        if child_form is None:
+            props.pop(attr, None)
+        else:
+            props[attr] = child_form
+        new_form = {k:v for k,v in form.items() if k != "storage"}
+        if len(props):
+            new_form["properties"] = props
+        else:
+            new_form.pop("properties", None)
+        children = props.values()
+    else:
+        if not form["identical"]:
+            # The items may have become identical; this is only known
+            #  after comparing them all
+            return get_form(data)
+        items = form["items"]
+        if len(data) == 1:
+            items = child_form
+            children = [items]
+        else:
+            items = [deepcopy(items) for n in range(len(data))]
+            items[attr] = child_form
+            children = items
+        new_form = {k:v for k,v in form.items() if k != "storage"}
+        new_form["items"] = items
+        new_form["identical"] = (len(data) == 1)
+    if all([_child_storage(f) == "pure-plain" for f in children]):
+        storage = "pure-plain"
+    else:
+        storage = "mixed-plain"
+    return storage, new_form
+
 class Monitor:
     _data_update_hook = None
     _form_update_hook = None
+    _last_state = None
     def __init__(self, data, storage, form, *, attribute_access=False, plain=False, **kwargs):
         self.attribute_access = attribute_access #does the underlying data support data.attr instead of just data["attr"]?
             #(even if true, only supported for attrs that do not start with _, and are not list/dict attrs/methods)
@@ -80,7 +157,7 @@ class Monitor:
         # triggertype can be "storage" or "identical"
         # "storage" trigger means that the storage of the parentpath could be changed if the path storage changes
         # "identical" trigger means that the parentpath could change from "identical" to non-identical
-        # TODO, triggers. For now, just recalculate the entire form on every change
+        # Triggers are not used (yet); instead, see recompute_form
 
     def get_instance(self, subform, subdata, path):
         if subdata is None or silk.is_none(subdata):
@@ -100,7 +177,8 @@ class Monitor:
             else:
                 return MixedDict(self, path)
         elif type_ == "array":
-            if isinstance(subdata, ndarray) and subform.get("storage") == "pure-binary":
+            if isinstance(subdata, (ndarray, ChunkedArray)) \
+              and subform.get("storage") == "pure-binary":
                 return MixedNumpyArray(self, path) #ndarray has an immutable type
             else:
                 return MixedList(self, path)
@@ -184,7 +262,7 @@ class Monitor:
         """
         if isinstance(subdata, MixedBase):
             subdata = subdata.value
-        if not isinstance(subdata, _allowed_types):
+        if not isinstance(subdata, _allowed_types + (ChunkedArray,)):
             raise TypeError(type(subdata))
         if self.plain:
             json.dumps(subdata)
@@ -246,15 +324,97 @@ class Monitor:
             self._data_update_hook()
         self.recompute_form(path)
 
+    def _recompute_subform(self, path):
+        """Recomputes the form after the data under path has changed
+        Only the form under path is recomputed, and the forms of its parents
+         are updated until the root.
+        Returns the new storage and form of the root, or None if the form
+         did not change.
+        Raises ValueError if this is not possible, because the data under
+         path or its parents is not plain (i.e. binary)"""
+        parents = []
+        data, form = self.data, self.form
+        for attr in path[:-1]:
+            if not _is_plain_container(data, form):
+                raise ValueError
+            parents.append((data, form, attr))
+            try:
+                data, form = data[attr], _get_child_form(form, attr)
+            except (KeyError, IndexError):
+                raise ValueError from None
+            if form is None:
+                raise ValueError
+        attr = path[-1]
+        if isinstance(form, dict) and form["type"] == "array" \
+          and isinstance(data, list) and tuple(form["shape"]) != (len(data),):
+            # An item was inserted or deleted: recompute the entire list
+            storage, form = get_form(data)
+        else:
+            if not _is_plain_container(data, form):
+                raise ValueError
+            try:
+                old_child_form = _get_child_form(form, attr)
+            except IndexError:
+                raise ValueError from None
+            child_form = None
+            if form["type"] == "array" or attr in data:
+                try:
+                    child_data = data[attr]
+                except IndexError:
+                    raise ValueError from None
+                child_storage, child_form = get_form(child_data)
+                child_form = _annotate(child_storage, child_form)
+            if child_form == old_child_form:
+                if isinstance(child_form, str): #scalar
+                    self.pathcache.pop(path, None)
+                else:
+                    self._clear_pathcache(path)
+                return None
+            storage, form = _update_parent_form(data, form, attr, child_form)
+        for data, parent_form, attr in reversed(parents):
+            child_form = _annotate(storage, form)
+            storage, form = _update_parent_form(data, parent_form, attr, child_form)
+        return storage, form
+
+    def _clear_pathcache(self, path):
+        """Removes path and its children from the path cache"""
+        self.pathcache.pop(path, None)
+        l = len(path)
+        for p in list(self.pathcache.keys()):
+            if p[:l] == path:
+                self.pathcache.pop(p)
+
     def recompute_form(self, subpath=None, data=None):
         """
-        TODO: use triggers for efficiency, based on subpath
-        For now, just update the data and recompute the entire form
+        Recomputes the form after the data under subpath has changed
+        Only the form under subpath is recomputed, and the form is updated
+         only if it has changed.
+        If subpath is None (or the data is not plain), the entire form is recomputed.
         """
-        self.pathcache.clear()
+        if subpath is not None and len(subpath) and data is None \
+          and self.form is not None and (self.plain or self.storage is not None):
+            try:
+                result = self._recompute_subform(subpath)
+            except ValueError:
+                pass
+            else:
+                if result is None:
+                    return
+                storage, form = result
+                self._set_form(storage, form, subpath)
+                return
         if data is None:
             data = self.data
+        if self.form is not None:
+            old_storage = "pure-plain" if self.plain else self.storage
+            if form_unchanged(data, old_storage, self.form):
+                self.pathcache.clear()
+                return
         storage, form = get_form(data)
+        self._set_form(storage, form, subpath)
+
+    def _set_form(self, storage, form, subpath):
+        self.pathcache.clear()
         if self.form is None or subpath is None:
             self.form = self._form_hook(form)
         else:
@@ -277,8 +437,6 @@ class Monitor:
         Inserts subdata right before the insertion point "path"
         The insertion point must be a list item
         Then, updates the form
-        TODO: use triggers for efficiency
-        For now, just update the data and recompute the entire form
         """
         if not isinstance(subdata, _allowed_types):
             raise TypeError(type(subdata))
@@ -310,8 +468,6 @@ class Monitor:
         """
         Deletes the data under path
         Then, updates the form
-        TODO: use triggers for efficiency
-        For now, just update the data and recompute the entire form
         """
         if not len(path):
             raise TypeError
@@ -335,18 +491,31 @@ class Monitor:
                 raise TypeError(type_)
         self.recompute_form(path)
 
+    @contextmanager
+    def batch(self):
+        """Groups a number of updates (see OverlayMonitor)"""
+        yield
+
     def _monitor_get_state(self):
-        memo = {}
-        data = deepcopy(self.data, memo)
+        """Returns the state as an immutable snapshot (see snapshot.py)
+        The parts that did not change since the last state are shared with it"""
+        last_data, last_form = None, None
+        if self._last_state is not None:
+            last_data, _, last_form = self._last_state
+        data, _ = snapshot(self.data, last_data)
         if self.plain:
             storage = "pure-plain"
         else:
-            storage = deepcopy(self.storage, memo)
-        form = deepcopy(self.form, memo)
-        return data, storage, form
+            storage = self.storage
+        form, _ = snapshot(self.form, last_form)
+        state = data, storage, form
+        self._last_state = state
+        return state
 
     def _monitor_set_state(self, state):
         data, storage, form = state
+        # The state is a snapshot: copy it before it gets modified in-place
+        data, form = deepcopy(data), deepcopy(form)
         if self._data_hook is not None:
             self.data = self._data_hook(data)
         else:
@@ -1,4 +1,6 @@
+from contextlib import contextmanager
 from .MakeParentMonitor import MakeParentMonitor
+from .PathTrie import PathTrie
 
 def warn(s):
     print("WARNING:", s)
@@ -17,8 +19,12 @@ class OverlayMonitor(MakeParentMonitor):
       editchannels=set(), plain=False, **args
     ):
         self.inchannels = set()
+        self._inchannel_index = PathTrie()
         self.outchannels = outchannels
-        self.editchannels = editchannels
+        self._outchannel_index = PathTrie(outchannels.keys())
+        self.editchannels = set(editchannels)
+        self._batch_level = 0
+        self._pending_outchannels = {} # coalesced updates during a batch
         super().__init__(data, storage, form, plain=plain, **args)
         for path in inchannels:
             self._add_inchannel(path)
@@ -27,19 +33,10 @@ class OverlayMonitor(MakeParentMonitor):
         assert isinstance(path, tuple), path
         if path in self.inchannels:
             return
-        l0 = len(path)
-        for cpath in self.inchannels:
-            breaking = False
-            l1 = len(cpath)
-            if l1 <= l0:
-                if path[:l1] == cpath:
-                    breaking = True
-            else:
-                if cpath[:l0] == path:
-                    breaking = True
-            if breaking:
-                raise Exception("Overlapping paths: %s and %s" % (cpath, path))
+        for cpath in self._inchannel_index.overlapping(path):
+            raise Exception("Overlapping paths: %s and %s" % (cpath, path))
         self.inchannels.add(path)
+        self._inchannel_index.add(path)
 
     def receive_inchannel_value(self, path, value):
         assert path in self.inchannels, path
@@ -53,27 +50,39 @@ class OverlayMonitor(MakeParentMonitor):
             ppath = path if len(path) else "()"
             warn("inchannel %s exists, value overwritten" % str(ppath))
         else:
-            l0 = len(path)
-            for cpath in self.inchannels:
-                exists = False
-                l1 = len(cpath)
-                if l1 <= l0:
-                    if path[:l1] == cpath:
-                        exists = True
-                else:
-                    if cpath[:l0] == path:
-                        exists = True
-                if exists:
-                    warn("inchannel %s exists, value overwritten" % (cpath,))
-                    break
+            for cpath in self._inchannel_index.overlapping(path):
+                warn("inchannel %s exists, value overwritten" % (cpath,))
+                break
+
+    @contextmanager
+    def batch(self):
+        """Within a batch, outchannel updates are coalesced:
+        each outchannel is updated only once, at the end of the batch"""
+        self._batch_level += 1
+        try:
+            yield
+        finally:
+            self._batch_level -= 1
+            if not self._batch_level:
+                pending = self._pending_outchannels
+                self._pending_outchannels = {}
+                # in the order in which the outchannels were defined
+                pending = sorted(pending, key=self._outchannel_index.index)
+                self._send_outchannels(pending)
 
     def _update_outchannels(self, path):
-        for outpath, func in self.outchannels.items():
-            m = min(len(outpath), len(path))
-            if m == 0 or path[:m] == outpath[:m]:
-                data = self.get_path(outpath)
-                value = None if data is None else data.value
-                func(value)
+        if self._batch_level:
+            for outpath in self._outchannel_index.overlapping(path):
+                self._pending_outchannels[outpath] = None
+            return
+        self._send_outchannels(self._outchannel_index.overlapping(path))
+
+    def _send_outchannels(self, outpaths):
+        for outpath in outpaths:
+            func = self.outchannels[outpath]
+            data = self.get_path(outpath)
+            value = None if data is None else data.value
+            func(value)
 
     def set_path(self, path, subdata, from_channel=False, forced=False):
         """
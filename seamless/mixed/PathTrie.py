@@ -0,0 +1,120 @@
+class _Node:
+    __slots__ = ("children", "index")
+    def __init__(self):
+        self.children = {}
+        self.index = None # insertion index, if a path ends at this node
+
+class PathTrie:
+    """Index of paths (tuples of attributes), to find quickly the paths that
+     overlap with a given path, i.e. that are a prefix of it or vice versa.
+    Lookups are proportional to the length of the path and the number of
+     overlapping paths, not to the total number of paths.
+    Paths are returned in the order in which they were added"""
+    def __init__(self, paths=()):
+        self._root = _Node()
+        self._len = 0
+        self._counter = 0
+        for path in paths:
+            self.add(path)
+
+    def _find(self, path):
+        node = self._root
+        for attr in path:
+            node = node.children.get(attr)
+            if node is None:
+                return None
+        return node
+
+    def add(self, path):
+        assert isinstance(path, tuple), path
+        node = self._root
+        for attr in path:
+            child = node.children.get(attr)
+            if child is None:
+                child = node.children[attr] = _Node()
+            node = child
+        if node.index is None:
+            node.index = self._counter
+            self._counter += 1
+            self._len += 1
+
+    def remove(self, path):
+        nodes = [self._root]
+        for attr in path:
+            node = nodes[-1].children.get(attr)
+            if node is None:
+                raise KeyError(path)
+            nodes.append(node)
+        if nodes[-1].index is None:
+            raise KeyError(path)
+        nodes[-1].index = None
+        self._len -= 1
+        # prune empty nodes
+        for n in range(len(path), 0, -1):
+            node = nodes[n]
+            if node.index is not None or len(node.children):
+                break
+            nodes[n-1].children.pop(path[n-1])
+
+    def __contains__(self, path):
+        node = self._find(path)
+        return node is not None and node.index is not None
+
+    def index(self, path):
+        """Returns the insertion index of path"""
+        node = self._find(path)
+        if node is None or node.index is None:
+            raise KeyError(path)
+        return node.index
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return iter(self.descendants((), include_self=True))
+
+    def _prefixes(self, path, result):
+        # Adds the (index, path) of the prefixes of path to result
+        # Returns the node of path, or None if it does not exist
+        node = self._root
+        if node.index is not None:
+            result.append((node.index, ()))
+        for n, attr in enumerate(path):
+            node = node.children.get(attr)
+            if node is None:
+                return None
+            if node.index is not None:
+                result.append((node.index, path[:n+1]))
+        return node
+
+    def _descendants(self, node, path, result):
+        for attr, child in node.children.items():
+            cpath = path + (attr,)
+            if child.index is not None:
+                result.append((child.index, cpath))
+            self._descendants(child, cpath, result)
+
+    def prefixes(self, path):
+        """Returns the paths that are a prefix of path (including path itself)"""
+        result = []
+        self._prefixes(path, result)
+        return [p for _, p in sorted(result)]
+
+    def descendants(self, path, include_self=False):
+        """Returns the paths of which path is a prefix"""
+        result = []
+        node = self._find(path)
+        if node is None:
+            return []
+        if include_self and node.index is not None:
+            result.append((node.index, path))
+        self._descendants(node, path, result)
+        return [p for _, p in sorted(result)]
+
+    def overlapping(self, path):
+        """Returns the paths that are a prefix of path, or of which path is a prefix"""
+        result = []
+        node = self._prefixes(path, result)
+        if node is not None:
+            self._descendants(node, path, result)
+        return [p for _, p in sorted(result)]
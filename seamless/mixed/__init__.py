@@ -107,3 +107,4 @@ from .Monitor import Monitor
 from .MakeParentMonitor import MakeParentMonitor
 from .OverlayMonitor import OverlayMonitor
 from .get_form import is_contiguous, is_unsigned
+from .chunked import ChunkedArray
@@ -0,0 +1,274 @@
+"""
+Chunked storage of large Numpy arrays
+
+A chunked stream stores an array as a sequence of chunks of (about)
+ CHUNK_SIZE bytes, split along the first axis. Each chunk can be compressed.
+ The header contains the dtype, shape and compression, and the chunk index
+ (the end offset of each chunk).
+Stream layout:
+  MAGIC_CHUNKED + header length (uint64) + JSON header + chunks
+
+A ChunkedArray is a lazy, read-only array on top of a chunked stream
+ (in memory, e.g. from the buffer store, or in a file). Indexing it reads
+ and decompresses only the chunks that are needed, so that e.g.
+ Monitor.get_path on a single row of a huge mixed cell is cheap.
+It behaves as a Numpy array otherwise (np.asarray loads it completely).
+
+Mixed cells keep ChunkedArray values in chunked format: their buffer
+ (for mounts and the buffer store) is the chunked stream itself.
+Inside a larger mixed value (e.g. a dict), a ChunkedArray is stored as
+ a normal array.
+
+The chunk size is set with SEAMLESS_CHUNK_SIZE (in bytes, default 4 MB),
+ the default compression with SEAMLESS_CHUNK_COMPRESSION (default: none).
+Supported compressions are "zlib", and "lz4" if the lz4 package is installed.
+Additional compressions can be added with register_compression.
+"""
+
+import os
+import json
+import zlib
+import numpy as np
+
+MAGIC_CHUNKED = b'\x93CHUNKED'
+CHUNK_SIZE = int(os.environ.get("SEAMLESS_CHUNK_SIZE", 4 * 1024 * 1024))
+CHUNK_COMPRESSION = os.environ.get("SEAMLESS_CHUNK_COMPRESSION") or None
+
+def _lz4():
+    try:
+        import lz4.frame
+    except ImportError:
+        raise ImportError("Chunk compression 'lz4' requires the lz4 package") from None
+    return lz4.frame
+
+compressions = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "lz4": (
+        lambda data: _lz4().compress(data),
+        lambda data: _lz4().decompress(data),
+    ),
+}
+
+def register_compression(name, compress, decompress):
+    """Registers a chunk compression
+    compress and decompress take a bytes-like object and return bytes"""
+    compressions[name] = (compress, decompress)
+
+def _get_compression(name):
+    try:
+        return compressions[name]
+    except KeyError:
+        raise ValueError("Unknown chunk compression '%s'" % name) from None
+
+def is_chunked(stream):
+    """Returns if stream (a bytes-like object) is a chunked stream"""
+    return bytes(memoryview(stream)[:len(MAGIC_CHUNKED)]) == MAGIC_CHUNKED
+
+def to_chunked_stream_parts(arr, chunk_size=None, compression=None):
+    """Converts arr to a chunked stream, as a list of buffer segments
+    Uncompressed chunks refer to the memory of arr"""
+    if chunk_size is None:
+        chunk_size = CHUNK_SIZE
+    if compression is None:
+        compression = CHUNK_COMPRESSION
+    arr = np.asarray(arr)
+    if arr.dtype.hasobject:
+        raise TypeError("Arrays with Python objects cannot be chunked")
+    shape = arr.shape
+    arr = np.ascontiguousarray(arr) # 0-dimensional arrays become 1-dimensional
+    rowsize = max(arr[:1].nbytes, 1)
+    chunk_rows = max(chunk_size // rowsize, 1)
+    compress = None
+    if compression is not None:
+        compress, _ = _get_compression(compression)
+    chunks, index = [], []
+    offset = 0
+    for n in range(0, len(arr), chunk_rows):
+        chunk = memoryview(arr[n:n+chunk_rows].reshape(-1).view(np.uint8))
+        if compress is not None:
+            chunk = compress(chunk)
+        chunks.append(chunk)
+        offset += len(chunk)
+        index.append(offset)
+    header = {
+        "dtype": np.lib.format.dtype_to_descr(arr.dtype),
+        "shape": shape,
+        "chunk_rows": chunk_rows,
+        "compression": compression,
+        "chunks": index,
+    }
+    bytes_header = json.dumps(header).encode("utf-8")
+    return [MAGIC_CHUNKED, np.uint64(len(bytes_header)).tobytes(), bytes_header] + chunks
+
+def to_chunked_stream(arr, chunk_size=None, compression=None):
+    """Converts arr to a chunked stream"""
+    return bytearray().join(to_chunked_stream_parts(arr, chunk_size, compression))
+
+class ChunkedArray:
+    """Lazy read-only array on top of a chunked stream
+    The source is either a bytes-like object (bytes, memoryview, mmap, ...)
+     or a file name"""
+    _cache_size = 4 # number of decompressed chunks that are kept
+
+    def __init__(self, source):
+        if isinstance(source, str):
+            self._filename = source
+            self._stream = None
+            with open(source, "rb") as f:
+                start = f.read(len(MAGIC_CHUNKED) + 8)
+                header_size = self._read_start(start)
+                header = f.read(header_size)
+        else:
+            self._filename = None
+            self._stream = memoryview(source).cast("B")
+            header_size = self._read_start(self._stream[:len(MAGIC_CHUNKED) + 8])
+            header = self._stream[self._data_offset-header_size:self._data_offset]
+        header = json.loads(str(header, "utf-8"))
+        self.dtype = np.lib.format.descr_to_dtype(header["dtype"])
+        self.shape = tuple(header["shape"])
+        self._chunk_rows = header["chunk_rows"]
+        self._compression = header["compression"]
+        self._index = [0] + header["chunks"]
+        self._cache = {}
+
+    def _read_start(self, start):
+        start = bytes(start)
+        if start[:len(MAGIC_CHUNKED)] != MAGIC_CHUNKED:
+            raise ValueError("Not a chunked stream")
+        header_size = int(np.frombuffer(start[len(MAGIC_CHUNKED):], np.uint64)[0])
+        self._data_offset = len(start) + header_size
+        return header_size
+
+    @classmethod
+    def from_array(cls, arr, chunk_size=None, compression=None):
+        """Builds a chunked array (in memory) from a Numpy array"""
+        return cls(to_chunked_stream(arr, chunk_size, compression))
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        result = 1
+        for s in self.shape:
+            result *= s
+        return result
+
+    @property
+    def nbytes(self):
+        return self.size * self.dtype.itemsize
+
+    @property
+    def nchunks(self):
+        return len(self._index) - 1
+
+    def __len__(self):
+        if not len(self.shape):
+            raise TypeError("len() of unsized object")
+        return self.shape[0]
+
+    def __copy__(self):
+        return self # read-only
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return "ChunkedArray(shape=%s, dtype=%s)" % (self.shape, self.dtype)
+
+    def _read_raw_chunk(self, n):
+        start = self._data_offset + self._index[n]
+        end = self._data_offset + self._index[n+1]
+        if self._stream is not None:
+            return self._stream[start:end]
+        with open(self._filename, "rb") as f:
+            f.seek(start)
+            return f.read(end - start)
+
+    def _get_chunk(self, n):
+        """Returns chunk n as a read-only Numpy array of rows"""
+        chunk = self._cache.get(n)
+        if chunk is not None:
+            return chunk
+        raw = self._read_raw_chunk(n)
+        if self._compression is not None:
+            _, decompress = _get_compression(self._compression)
+            raw = decompress(raw)
+        rowshape = self.shape[1:] if len(self.shape) else ()
+        chunk = np.frombuffer(raw, self.dtype).reshape((-1,) + rowshape)
+        chunk.flags.writeable = False
+        if len(self._cache) >= self._cache_size:
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[n] = chunk
+        return chunk
+
+    def read_rows(self, start, stop):
+        """Returns rows start:stop (along the first axis) as a Numpy array,
+         reading only the chunks that contain them"""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if stop <= start:
+            return np.empty((0,) + self.shape[1:], self.dtype)
+        rows = self._chunk_rows
+        first, last = start // rows, (stop - 1) // rows
+        if first == last:
+            chunk = self._get_chunk(first)
+            return chunk[start-first*rows:stop-first*rows]
+        parts = []
+        for n in range(first, last + 1):
+            chunk = self._get_chunk(n)
+            offset = n * rows
+            parts.append(chunk[max(start-offset, 0):stop-offset])
+        return np.concatenate(parts)
+
+    def __getitem__(self, index):
+        if not len(self.shape):
+            return np.asarray(self)[index]
+        if not isinstance(index, tuple):
+            index = (index,)
+        first, rest = index[0], index[1:]
+        if first is Ellipsis:
+            return np.asarray(self)[index]
+        if isinstance(first, (int, np.integer)):
+            n = int(first)
+            if n < 0:
+                n += len(self)
+            if not 0 <= n < len(self):
+                raise IndexError(first)
+            row = self.read_rows(n, n + 1)[0]
+            return row[rest] if len(rest) else row
+        if isinstance(first, slice):
+            start, stop, step = first.indices(len(self))
+            if step > 0:
+                rows = self.read_rows(start, stop)[::step]
+            else:
+                rows = np.asarray(self)[first]
+            return rows[(slice(None),) + rest] if len(rest) else rows
+        # fancy indexing: load everything
+        return np.asarray(self)[index]
+
+    def __array__(self, dtype=None, copy=None):
+        if not len(self.shape):
+            result = self._get_chunk(0).reshape(())
+        else:
+            result = self.read_rows(0, len(self))
+        if dtype is not None:
+            result = result.astype(dtype)
+        return result
+
+    def stream_parts(self):
+        """Returns the chunked stream, as a list of buffer segments"""
+        if self._stream is not None:
+            return [self._stream]
+        with open(self._filename, "rb") as f:
+            return [f.read()]
+
+    def get_form(self):
+        """Returns the storage and form, without reading the data"""
+        from .get_form import get_form
+        # the form of a single row, with the shape patched in
+        rowshape = (1,) + self.shape[1:] if len(self.shape) else ()
+        storage, form = get_form(np.zeros(rowshape, self.dtype))
+        if isinstance(form, dict) and "shape" in form:
+            form["shape"] = self.shape
+        return storage, form
@@ -9,12 +9,14 @@ Paradigm:
     - After each Python object, leave plain-mode and return to binary
     - After finishing the Numpy array Q, leave binary mode and return to plain
 """
+import marshal
 import numpy as np
 from numpy import ndarray, void
 from copy import deepcopy
 from . import ( Scalar, np_char,
   _array_types, _integer_types, _float_types, _string_types, _unsigned_types
 )
+from .chunked import ChunkedArray
 _string_types = (str,)  ##JSON cannot deal with bytes
 
 dt_builtins = (
@@ -275,10 +277,33 @@ def get_tform_numpy_struct(dt):
 def is_np_str(dt):
     return dt == np.dtype("S%d" % dt.itemsize)
 
+# Memoized forms. The callers may modify the returned forms, so the forms
+#  are stored in marshalled form, and a fresh copy is returned every time
+_MAX_CACHE = 10000
+_tform_cache = {} # (dtype, aligned) => marshalled (storage, typedef)
+_array_form_cache = {} # (dtype, aligned, shape, strides) => marshalled (storage, typedef)
+
+def _cache_store(cache, key, value):
+    if len(cache) >= _MAX_CACHE:
+        cache.clear()
+    cache[key] = marshal.dumps(value)
+
+def _cache_get(cache, key):
+    result = cache.get(key)
+    if result is not None:
+        result = marshal.loads(result)
+    return result
+
 def get_tform_numpy(dt):
-    if dt.base.isbuiltin or is_np_str(dt) or dt in dt_builtins:
-        return get_tform_numpy_builtin(dt)
-    return get_tform_numpy_struct(dt)
+    key = dt, dt.isalignedstruct
+    result = _cache_get(_tform_cache, key)
+    if result is None:
+        if dt.base.isbuiltin or is_np_str(dt) or dt in dt_builtins:
+            result = get_tform_numpy_builtin(dt)
+        else:
+            result = get_tform_numpy_struct(dt)
+        _cache_store(_tform_cache, key, result)
+    return result
 
 def get_form_dict_plain(data):
     typedef = {"type": "object"}
@@ -339,6 +364,11 @@ def get_form_items_numpy(data):
     return storage, items, identical
 
 def get_form_items_list_plain(data):
+    if len(data) and isinstance(data[0], Scalar):
+        # Fast path for lists of scalars: for those, the form depends only
+        #  on the type
+        if len(set(map(type, data))) == 1:
+            return "pure-plain", get_typedef_scalar(data[0]), True
     identical = True
     storages = []
     items2 = []
@@ -388,9 +418,20 @@ def get_form_items_list_plain(data):
                 items["storage"] = child_storage
     return storage, items, identical
 
+def _array_form_key(data):
+    dt = data.dtype
+    if dt.hasobject:
+        return None # the form depends on the Python objects inside
+    return dt, dt.isalignedstruct, data.shape, data.strides
+
 def get_form_list(data):
     extra = {}
     if isinstance(data, ndarray):
+        key = _array_form_key(data)
+        if key is not None:
+            result = _cache_get(_array_form_cache, key)
+            if result is not None:
+                return result
         dt = data.dtype
         if not dt.isnative:
             raise TypeError("dtypes must be native")
@@ -423,6 +464,8 @@ def get_form_list(data):
         "identical": identical
     }
     typedef.update(extra)
+    if isinstance(data, ndarray) and key is not None:
+        _cache_store(_array_form_cache, key, (storage, typedef))
     return storage, typedef
 
 def get_form_list_plain(data):
@@ -449,6 +492,26 @@ def get_form(data):
         storage, typedef = get_form_list(data)
     elif isinstance(data, dict):
         storage, typedef = get_form_dict_plain(data)
+    elif isinstance(data, ChunkedArray):
+        storage, typedef = data.get_form()
     else:
         raise TypeError(type(data))
     return storage, typedef
+
+def form_unchanged(data, storage, form):
+    """Cheap check if storage and form are still the form of data,
+     without visiting the data.
+    For Numpy arrays (without Python objects inside), only the dtype, shape
+     and strides are compared; for scalars, only the type.
+    Returns False if the data would need to be visited (dicts, lists,
+     Python objects inside Numpy). In that case, use get_form"""
+    if isinstance(data, Scalar):
+        return storage == "pure-plain" and form == get_typedef_scalar(data)
+    elif isinstance(data, ndarray):
+        key = _array_form_key(data)
+        if key is None:
+            return False
+        return (storage, form) == get_form_list(data)
+    elif isinstance(data, ChunkedArray):
+        return (storage, form) == data.get_form()
+    return False
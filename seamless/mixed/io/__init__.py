@@ -1,2 +1,2 @@
-from .to_stream import to_stream
+from .to_stream import to_stream, write_stream, write_parts
 from .from_stream import from_stream
@@ -1,36 +1,94 @@
+"""
+Reading mixed data from a buffer, as written by to_stream
+
+The stream may be a bytes object or any other object that supports the buffer
+ protocol (bytearray, memoryview, mmap). The stream is never sliced into
+ intermediate bytes objects.
+With copy=False, Numpy arrays are returned as views onto the stream (zero-copy),
+ so that a large stream (e.g. a memory-mapped file) can be opened in constant
+ memory and time. Such arrays are writable if the stream is, unless readonly
+ is True. Note that as long as the arrays exist, an mmap cannot be closed.
+Arrays with Python objects inside are always copied.
+"""
+
 import json
 import numpy as np
 from io import BytesIO
 import ctypes
+import struct
 
 from .. import MAGIC_SEAMLESS
+from ..chunked import ChunkedArray, is_chunked
 from .util import get_buffersize, form_to_dtype, mul
 
 MAGIC_NUMPY = b"\x93NUMPY"
 
-def _load_from_buffer(storage, form, buffer, buffer_offset, buffersize, shape):
+def _load_from_buffer(storage, form, buffer, buffer_offset, buffersize, shape,
+  copy, readonly
+):
     dtype = form_to_dtype(form, storage)
     shape0 = (1,)
     if shape is not None:
         shape0 = shape
     assert dtype.itemsize * mul(shape0) == buffersize, (dtype.itemsize, shape0, buffersize)
-    data = np.empty(shape0,dtype)
-    # If dtype contains objects, they will be initialized to None,
-    #  and refcounts to None will be increased by Numpy
-    # memmove will replace them in a dirty manner, which will not decref None,
-    #  but this is harmless
-    ctypes.memmove(
-      data.ctypes.data,
-      buffer.ctypes.data + buffer_offset,
-      buffersize
-    )
+    if dtype.hasobject:
+        data = np.empty(shape0,dtype)
+        # If dtype contains objects, they will be initialized to None,
+        #  and refcounts to None will be increased by Numpy
+        # memmove will replace them in a dirty manner, which will not decref None,
+        #  but this is harmless
+        ctypes.memmove(
+          data.ctypes.data,
+          buffer.ctypes.data + buffer_offset,
+          buffersize
+        )
+    else:
+        if copy:
+            # byte-wise, so that the padding of Numpy structs is copied as well
+            buffer = buffer[buffer_offset:buffer_offset+buffersize].copy()
+            buffer_offset = 0
+        data = np.frombuffer(
+            buffer, dtype, count=mul(shape0), offset=buffer_offset
+        ).reshape(shape0)
+    if readonly:
+        data.flags.writeable = False
     if shape is None:
         data = data[0]
     return data
 
+def _load_npy(stream, copy, readonly):
+    """Loads a Numpy array from a .npy buffer, as a view if copy is False"""
+    version = stream[len(MAGIC_NUMPY)]
+    if version == 1:
+        header_start, header_len_size, header_len_format = 10, 2, "<H"
+    else:
+        header_start, header_len_size, header_len_format = 12, 4, "<I"
+    header_len = struct.unpack(
+        header_len_format, stream[header_start-header_len_size:header_start]
+    )[0]
+    offset = header_start + header_len
+    header = BytesIO(stream[:offset])
+    np.lib.format.read_magic(header)
+    if version == 1:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(header)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(header)
+    if dtype.hasobject:
+        # pickled
+        return np.load(BytesIO(stream))
+    order = "F" if fortran_order else "C"
+    count = mul(shape)
+    data = np.frombuffer(stream, dtype, count=count, offset=offset)
+    data = data.reshape(shape, order=order)
+    if copy:
+        data = data.copy(order=order)
+    if readonly:
+        data.flags.writeable = False
+    return data
+
 def _from_stream_binary(
   data, form,
-  jsons, buffer
+  jsons, buffer, copy, readonly
 ):
     #print("_from_stream_binary", form, data)
     storage = "mixed-binary"
@@ -40,7 +98,8 @@ def _from_stream_binary(
             buffer_offset = jsons[0].pop(0)
             buffersize = jsons[0][0] - buffer_offset
             data = _load_from_buffer(
-              storage, form, buffer, buffer_offset, buffersize, None
+              storage, form, buffer, buffer_offset, buffersize, None,
+              copy, readonly
             )
         keys = form["order"]
         for key in keys:
@@ -48,7 +107,9 @@ def _from_stream_binary(
             if not isinstance(item_form, dict):
                 continue #scalar
             item_storage = item_form.get("storage", "pure-binary")
-            _from_stream_sub(data, key, item_storage, item_form, jsons, buffer)
+            _from_stream_sub(
+              data, key, item_storage, item_form, jsons, buffer, copy, readonly
+            )
     elif type_ in ("tuple", "array"):
         if data is None:
             buffer_offset = jsons[0].pop(0)
@@ -56,7 +117,8 @@ def _from_stream_binary(
             shape = form["items"]["shape"] if type_ == "array" else form["shape"]
             my_form = form["items"]
             data = _load_from_buffer(
-              storage, my_form, buffer, buffer_offset, buffersize, shape
+              storage, my_form, buffer, buffer_offset, buffersize, shape,
+              copy, readonly
             )
         assert len(shape) == 1
         form_items = form["items"]
@@ -65,7 +127,9 @@ def _from_stream_binary(
         if isinstance(item_form, dict):
             item_storage = item_form.get("storage", "pure-plain")
             for n in range(shape[0]):
-                _from_stream_sub(data, n, item_storage, item_form, jsons, buffer)
+                _from_stream_sub(
+                  data, n, item_storage, item_form, jsons, buffer, copy, readonly
+                )
         else:
             assert isinstance(item_form, str) #scalar
     else:
@@ -75,7 +139,7 @@ def _from_stream_binary(
 
 def _from_stream_plain(
   data, form,
-  jsons, buffer
+  jsons, buffer, copy, readonly
 ):
     #print("_from_stream_plain", form, data)
     storage = "mixed-plain"
@@ -88,7 +152,9 @@ def _from_stream_plain(
             if not isinstance(item_form, dict):
                 continue #scalar
             item_storage = item_form.get("storage", "pure-plain")
-            _from_stream_sub(data, key, item_storage, item_form, jsons, buffer)
+            _from_stream_sub(
+              data, key, item_storage, item_form, jsons, buffer, copy, readonly
+            )
     elif type_ in ("tuple", "array"):
         shape = form["shape"]
         assert len(shape) == 1
@@ -101,31 +167,33 @@ def _from_stream_plain(
             if not isinstance(item_form, dict):
                 continue #scalar
             item_storage = item_form.get("storage", "pure-plain")
-            _from_stream_sub(data, n, item_storage, item_form, jsons, buffer)
+            _from_stream_sub(
+              data, n, item_storage, item_form, jsons, buffer, copy, readonly
+            )
     else:
         raise TypeError(type_, form)
     return data
 
 def _from_stream(
   data, storage, form,
-  jsons, buffer
+  jsons, buffer, copy, readonly
 ):
     if storage == "mixed-binary":
         return _from_stream_binary(
           data, form,
-          jsons, buffer
+          jsons, buffer, copy, readonly
         )
     elif storage == "mixed-plain":
         return _from_stream_plain(
           data, form,
-          jsons, buffer
+          jsons, buffer, copy, readonly
         )
     else:
         raise ValueError(storage)
 
 def _from_stream_sub(
   parent_data, sub, storage, form,
-  jsons, buffer
+  jsons, buffer, copy, readonly
 ):
     if storage.endswith("plain"):
         if isinstance(parent_data, np.generic):
@@ -151,7 +219,8 @@ def _from_stream_sub(
             buffer_offset = jsons[0].pop(0)
             buffersize = jsons[0][0] - buffer_offset
             my_data = _load_from_buffer(
-              storage, my_form, buffer, buffer_offset, buffersize, shape
+              storage, my_form, buffer, buffer_offset, buffersize, shape,
+              copy, readonly
             )
             parent_data[sub] = my_data
 
@@ -161,35 +230,45 @@ def _from_stream_sub(
     my_data = parent_data[sub]
     _from_stream(
       my_data, storage, form,
-      jsons, buffer
+      jsons, buffer, copy, readonly
     )
 
 
 
 
-def from_stream(stream, storage, form):
-    """Reverses to_stream, returning data"""
+def from_stream(stream, storage, form, *, copy=True, readonly=False, lazy=False):
+    """Reverses to_stream, returning data
+    stream can be any object that supports the buffer protocol
+    If copy is False, the Numpy arrays in data are views onto stream
+    If readonly is True, the Numpy arrays in data are read-only
+    If lazy is True and stream is a chunked stream, a ChunkedArray on top of
+     stream is returned (see seamless.mixed.chunked)"""
+    stream = memoryview(stream)
+    if stream.ndim != 1 or stream.itemsize != 1:
+        stream = stream.cast("B")
     if storage == "pure-plain":
-        assert not stream.startswith(MAGIC_SEAMLESS)
-        assert not stream.startswith(MAGIC_NUMPY)
-        txt = stream.decode("utf-8")
+        assert stream[:len(MAGIC_SEAMLESS)] != MAGIC_SEAMLESS
+        assert stream[:len(MAGIC_NUMPY)] != MAGIC_NUMPY
+        txt = str(stream, "utf-8")
         return json.loads(txt)
     elif storage == "pure-binary":
-        b = BytesIO(stream)
-        return np.load(b)
-    assert stream.startswith(MAGIC_SEAMLESS)
+        if is_chunked(stream):
+            arr = ChunkedArray(stream)
+            if lazy:
+                return arr
+            arr = np.array(arr) if copy else np.asarray(arr)
+            if readonly:
+                arr.flags.writeable = False
+            return arr
+        return _load_npy(stream, copy, readonly)
     l = len(MAGIC_SEAMLESS)
-    s1 = stream[l:l+8]
-    s2 = stream[l+8:l+16]
-    len_jsons = np.frombuffer(s1, dtype=np.uint64).tolist()[0]
-    buffersize = np.frombuffer(s2, dtype=np.uint64).tolist()[0]
+    assert stream[:l] == MAGIC_SEAMLESS
+    len_jsons, buffersize = struct.unpack("=QQ", stream[l:l+16])
     assert len(stream) == l + 16 + len_jsons + buffersize
-    bytes_jsons = stream[l+16:l+16+len_jsons]
-    jsons = json.loads(bytes_jsons.decode("utf-8"))
-    bytebuffer = stream[l+16+len_jsons:]
-    buffer = np.frombuffer(bytebuffer,dtype=np.uint8)
+    jsons = json.loads(str(stream[l+16:l+16+len_jsons], "utf-8"))
+    buffer = np.frombuffer(stream, dtype=np.uint8, offset=l+16+len_jsons)
     data = _from_stream(
         None, storage, form,
-        jsons, buffer
+        jsons, buffer, copy, readonly
     )
     return data
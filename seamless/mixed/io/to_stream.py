@@ -1,12 +1,32 @@
+"""
+Writing mixed data to a stream
+
+The stream is produced as a list of buffer segments (scatter-gather):
+ the header, the JSON part, and then the binary buffer. Arrays without Python
+ objects inside are not copied into the binary buffer; instead, their memory
+ becomes a segment of its own. Only Numpy structs with Python objects inside
+ (whose object slots are zeroed out in the stream) are copied.
+The segments can be written with os.writev or socket.sendmsg, or written to
+ a file (or mmap) one by one with write_stream/write_parts (os.writev, in
+ batches of at most IOV_MAX segments, for file descriptors).
+ Mounted mixed cells are written this way. to_stream joins them into a
+ single bytearray.
+The segments refer to the memory of data: they are invalid once data is
+ modified.
+"""
+
 import json
+import os
 import numpy as np
 from copy import deepcopy
 from io import BytesIO
 
 from .. import MAGIC_SEAMLESS, _integer_types, _float_types, _string_types
+from ..chunked import ChunkedArray
 from .util import get_buffersize, get_buffersize_debug, \
   sanitize_dtype
 from ...core.protocol import json_encode
+from ...core.checksum import _array_parts, _raw_view
 
 def _convert_np_void(data):
     if not isinstance(data, np.generic):
@@ -19,19 +39,65 @@ def _convert_np_void(data):
         return str(data)
     raise TypeError(type(data), data.dtype)
 
-def _copy_into_buffer(data, buffer, offset):
-    size = data.nbytes
-    if not data.dtype.hasobject:
-        new_data = buffer[offset:offset+size].view(data.dtype)
-        new_data[:] = data.reshape(-1)
+def _copy_containers(data):
+    """Copies the dicts and lists in data, but not the arrays inside"""
+    if isinstance(data, dict):
+        return {k: _copy_containers(v) for k, v in data.items()}
+    elif isinstance(data, (list, tuple)):
+        return type(data)([_copy_containers(v) for v in data])
+    else:
+        return data
+
+def _load_chunked(data):
+    """Replaces the chunked arrays inside data with Numpy arrays
+    The containers are copied only if they contain a chunked array"""
+    if isinstance(data, ChunkedArray):
+        return np.asarray(data)
+    elif isinstance(data, dict):
+        result = {k: _load_chunked(v) for k, v in data.items()}
+        if all(result[k] is v for k, v in data.items()):
+            return data
+        return result
+    elif isinstance(data, (list, tuple)):
+        result = [_load_chunked(v) for v in data]
+        if all(r is v for r, v in zip(result, data)):
+            return data
+        return type(data)(result)
     else:
-        rbuffer = np.frombuffer(buffer=data, dtype=np.uint8)
-        buffer[offset:offset+size] = rbuffer
-        clean_dtype = sanitize_dtype(data.dtype)
-        new_data = buffer[offset:offset+size].view(clean_dtype)
-        if isinstance(data, np.void):
-            new_data = new_data[0]
-    return new_data
+        return data
+
+class _SegmentBuffer:
+    """The binary buffer of a stream, as a list of segments"""
+    def __init__(self):
+        self.segments = []
+
+    def add(self, data):
+        """Adds the memory of data as a segment, without copying
+        (unless data is not contiguous)"""
+        if not data.nbytes:
+            return
+        data = np.ascontiguousarray(_raw_view(data))
+        self.segments.append(memoryview(data.reshape(-1).view(np.uint8)))
+
+    def copy(self, data):
+        """Adds a copy of data as a segment, and returns the copy
+        The Python object slots in the copy can then be zeroed out"""
+        size = data.nbytes
+        buffer = np.empty(size, np.uint8)
+        if not data.dtype.hasobject:
+            raw = np.ascontiguousarray(_raw_view(data))
+            buffer[:] = raw.reshape(-1).view(np.uint8)
+            new_data = buffer.view(data.dtype)
+        else:
+            rbuffer = np.frombuffer(buffer=data, dtype=np.uint8)
+            buffer[:] = rbuffer
+            clean_dtype = sanitize_dtype(data.dtype)
+            new_data = buffer.view(clean_dtype)
+            if isinstance(data, np.void):
+                new_data = new_data[0]
+        if size:
+            self.segments.append(memoryview(buffer))
+        return new_data
 
 def _to_stream(
   data, storage, form,
@@ -49,7 +115,10 @@ def _to_stream(
             if type_ != "array":
                 return None, buffer_offset #already taken into account, unless Numpy array
         #plain parent, or we occopy a Python object slot in the parent Numpy struct
-        my_data = _copy_into_buffer(data, buffer, buffer_offset)
+        if data.dtype.hasobject:
+            buffer.copy(data)
+        else:
+            buffer.add(data)
         buffersize = data.nbytes
         new_buffer_offset = buffer_offset + buffersize
         jsons[0].append(new_buffer_offset)
@@ -71,7 +140,7 @@ def _to_stream(
     has_been_copied = False
     if storage == "mixed-plain":
         if binary_parent != False:
-            my_data = deepcopy(data)
+            my_data = _copy_containers(data)
             if binary_parent:
                 my_buffersize = -1
             append_my_data = True
@@ -80,7 +149,7 @@ def _to_stream(
             my_data = data
     elif storage == "mixed-binary":
         if type_ != "tuple": #plain parent, or we occupy a Python object slot in the parent Numpy struct
-            my_data = _copy_into_buffer(data, buffer, buffer_offset)
+            my_data = buffer.copy(data)
             buffersize = data.nbytes
             new_buffer_offset = buffer_offset + buffersize
             jsons[0].append(new_buffer_offset)
@@ -150,16 +219,24 @@ def _to_stream(
         jsons.append(my_data)
     return my_buffersize, buffer_offset
 
-def to_stream(data, storage, form):
-    """ Converts data to a stream of bytes (either a bytes object or a bytearray)"""
+def to_stream_parts(data, storage, form):
+    """ Converts data to a list of buffer segments. Their concatenation is the stream
+    The segments are bytes-like objects, and may refer to the memory of data"""
     if storage == "pure-plain":
         data = _convert_np_void(data)
         txt = json_encode(data, sort_keys=True, indent=2)
-        return txt.encode("utf-8")
+        return [txt.encode("utf-8")]
     elif storage == "pure-binary":
-        b = BytesIO()
-        np.save(b, data, allow_pickle=False)
-        return b.getvalue()
+        if isinstance(data, ChunkedArray):
+            return data.stream_parts()
+        data = np.asarray(data)
+        if data.dtype.hasobject:
+            b = BytesIO()
+            np.save(b, data, allow_pickle=False)
+            return [b.getvalue()]
+        # identical to np.save
+        return list(_array_parts(data))
+    data = _load_chunked(data)
     buffer_offsets = [0]
     jsons = [buffer_offsets]
     buffersize_debug = get_buffersize_debug(data, storage, form)
@@ -167,8 +244,7 @@ def to_stream(data, storage, form):
     assert buffersize == buffersize_debug, (buffersize, buffersize_debug)
     updated_form = deepcopy(form)
 
-    bytebuffer = bytearray(buffersize)
-    buffer = np.frombuffer(bytebuffer,dtype=np.uint8)
+    buffer = _SegmentBuffer()
     if isinstance(data, tuple):
         data = list(data)
     id, buffer_offset = _to_stream(data, storage, updated_form, jsons, buffer, 0)
@@ -181,12 +257,53 @@ def to_stream(data, storage, form):
     bytes_jsons = json_encode(jsons).encode("utf-8")
     s1 = np.uint64(len(bytes_jsons)).tobytes()
     s2 = np.uint64(buffersize).tobytes()
-    streamsize = len(MAGIC_SEAMLESS) + 16 + len(bytes_jsons) + buffersize
-    stream = bytearray(streamsize)
-    l = len(MAGIC_SEAMLESS)
-    stream[:l] = MAGIC_SEAMLESS
-    stream[l:l+8] = s1
-    stream[l+8:l+16] = s2
-    stream[l+16:l+16+len(bytes_jsons)] = bytes_jsons
-    stream[l+16+len(bytes_jsons):streamsize] = bytebuffer
-    return stream
+    return [MAGIC_SEAMLESS, s1, s2, bytes_jsons] + buffer.segments
+
+def to_stream(data, storage, form):
+    """ Converts data to a stream of bytes (either a bytes object or a bytearray)"""
+    parts = to_stream_parts(data, storage, form)
+    if len(parts) == 1:
+        return bytes(parts[0])
+    return bytearray().join(parts)
+
+def write_stream(data, storage, form, f):
+    """Writes data as a stream to f, without building the stream in memory
+    f can be a file object (or any object with a .write method, e.g. an mmap),
+     or a file descriptor, which is then written with os.writev.
+    Returns the number of bytes written"""
+    parts = to_stream_parts(data, storage, form)
+    return write_parts(parts, f)
+
+try:
+    IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = -1
+if IOV_MAX <= 0:
+    IOV_MAX = 1024
+
+def write_parts(parts, f):
+    """Writes a list of buffer segments (e.g. from to_stream_parts) to f
+    f is a file object (or any object with a .write method) or a file descriptor
+    Returns the number of bytes written"""
+    parts = [memoryview(part).cast("B") for part in parts]
+    size = sum([part.nbytes for part in parts])
+    if not isinstance(f, int):
+        for part in parts:
+            f.write(part)
+        return size
+    pos = 0 # index of the first segment that has not been (fully) written
+    while pos < len(parts):
+        # os.writev accepts at most IOV_MAX segments,
+        #  and may write only a part of them
+        n = os.writev(f, parts[pos:pos+IOV_MAX])
+        while n:
+            part = parts[pos]
+            if n >= part.nbytes:
+                n -= part.nbytes
+                pos += 1
+            else:
+                parts[pos] = part[n:]
+                n = 0
+        while pos < len(parts) and not parts[pos].nbytes:
+            pos += 1
+    return size
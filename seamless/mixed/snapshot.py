@@ -0,0 +1,123 @@
+"""
+Immutable snapshots of mixed data, with structural sharing
+
+A snapshot is a copy of mixed data that is never modified in-place:
+ dicts and lists inside a snapshot are read-only subclasses of dict and list,
+ and Numpy arrays are read-only (except arrays of Python objects, which are
+ copied, and must not be modified).
+When a new snapshot is taken of data that has been partly modified,
+ the parts that are identical to those of the previous snapshot are shared
+ with it instead of being copied (copy-on-write). Therefore, taking a snapshot
+ costs memory in proportion to the changed part of the data only.
+Comparing data with the previous snapshot still costs O(size of the data);
+ only the parts of the previous snapshot that are identical (by identity,
+ for snapshots) are skipped without comparison.
+Snapshots may be shared freely (also by deepcopy of their owner);
+ to obtain a modifiable copy, use deepcopy on the snapshot itself, which
+ returns plain dicts, lists and writeable arrays.
+"""
+
+import numpy as np
+from copy import deepcopy
+
+_containers = (dict, list, tuple, np.ndarray, np.void)
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError("Snapshots are read-only; deepcopy them to modify them")
+
+class _FrozenDict(dict):
+    """Read-only dict inside a snapshot"""
+    __slots__ = ()
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return deepcopy(dict(self), memo)
+
+    def __reduce_ex__(self, protocol):
+        return dict, (dict(self),)
+
+class _FrozenList(list):
+    """Read-only list inside a snapshot"""
+    __slots__ = ()
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = clear = _read_only
+    sort = reverse = _read_only
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return deepcopy(list(self), memo)
+
+    def __reduce_ex__(self, protocol):
+        return list, (list(self),)
+
+def _freeze(container, items):
+    if isinstance(container, dict):
+        return _FrozenDict(items)
+    elif isinstance(container, list):
+        return _FrozenList(items)
+    return type(container)(items) # tuple
+
+def _is_identical(data, previous):
+    from .io.util import is_identical_debug
+    return is_identical_debug(data, previous)
+
+def _freeze_array(arr):
+    if arr.dtype.hasobject:
+        return deepcopy(arr)
+    result = arr.copy()
+    result.flags.writeable = False
+    return result
+
+
+def snapshot(data, previous=None):
+    """Takes a snapshot of data, sharing the unchanged parts with previous
+    previous must be a snapshot itself (or None)
+    Returns the snapshot, and whether or not it differs from previous"""
+    if data is previous and isinstance(data, (_FrozenDict, _FrozenList)):
+        return previous, False
+    if isinstance(data, dict):
+        if not isinstance(previous, dict):
+            return _FrozenDict((k, snapshot(v)[0]) for k, v in data.items()), True
+        changed = (data.keys() != previous.keys())
+        result = {}
+        for k, v in data.items():
+            result[k], child_changed = snapshot(v, previous.get(k))
+            changed = changed or child_changed
+        if not changed:
+            return previous, False
+        return _FrozenDict(result), True
+    elif isinstance(data, (list, tuple)):
+        if not isinstance(previous, (list, tuple)) or len(previous) != len(data) \
+          or isinstance(previous, list) != isinstance(data, list):
+            return _freeze(data, [snapshot(v)[0] for v in data]), True
+        changed = False
+        result = []
+        for v, prev in zip(data, previous):
+            vv, child_changed = snapshot(v, prev)
+            result.append(vv)
+            changed = changed or child_changed
+        if not changed:
+            return previous, False
+        return _freeze(data, result), True
+    elif isinstance(data, np.ndarray):
+        if data is previous or (
+          isinstance(previous, np.ndarray) and _is_identical(data, previous)
+        ):
+            return previous, False
+        return _freeze_array(data), True
+    elif isinstance(data, np.void):
+        if isinstance(previous, np.void) and _is_identical(data, previous):
+            return previous, False
+        return deepcopy(data), True
+    else: #scalar or None
+        if isinstance(previous, _containers):
+            return data, True
+        if type(data) is type(previous) and data == previous:
+            return previous, False
+        return data, True
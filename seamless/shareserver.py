@@ -26,11 +26,222 @@ All messages are JSON.
 Upon connection, a client receives a handshake message: ["Seamless share update server", "0.01"]
 Then, it receives a variable list
 
+Protocol v2 (ws://localhost:5138/ctx?protocol=2)
+Handshake version "0.02", followed by the variable list.
+Clients receive values instead of checksums, but only for what they subscribe to:
+- client => ["subscribe", [spec, ...]] and ["unsubscribe", [spec, ...]]
+   A spec is a key, "*" (all keys), a key prefix ending with "/"
+   (all keys of a subcontext), or [key, path] to receive only the part
+   of the value under path (a list of attributes/indices).
+   Upon subscription, the current values are sent.
+- server => ["value", {"key", "path", "checksum", "marker", "value"}]
+- server => ["delta", {"key", "path", "checksum", "marker", "base", "patch"}]
+   "patch" is a JSON patch (RFC 6902) to apply to the value that was
+   last received for (key, path), whose checksum is "base".
+   Deltas are sent instead of values if they are smaller.
+- Values that contain Numpy arrays are sent as a binary frame:
+   4-byte little-endian header length, the header, then the array data.
+   The header is a "value" message in JSON, where each array is replaced
+   by {"__array__": n}, with n an index into header["arrays"].
+   Each item of "arrays" has the "dtype" (as in .npy files), "shape",
+   and the "offset" and "nbytes" of its data (C order) after the header.
+   The header and all arrays are padded to a multiple of 8 bytes.
+- server => ["error", message] for invalid client messages
+
+Values, deltas and messages are cached by cell type and checksum: an update
+ costs one serialization, no matter how many clients receive it.
+Configuration via environment variables:
+- SEAMLESS_SHARE_CACHE_SIZE: maximum size of the serialization cache
+   in MB (default: 64)
 """
 import os
 import json
+import struct
 import asyncio
 import weakref
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+
+SHARE_CACHE_SIZE = int(os.environ.get("SEAMLESS_SHARE_CACHE_SIZE", 64))
+
+class _SerializationCache:
+    """Least-recently-used cache, with a maximum total size"""
+    def __init__(self, max_size=SHARE_CACHE_SIZE * 1024 * 1024):
+        self.max_size = max_size
+        self.size = 0
+        self._items = OrderedDict() # key => (item, size)
+
+    def get(self, key):
+        entry = self._items.get(key)
+        if entry is None:
+            return None
+        self._items.move_to_end(key)
+        return entry[0]
+
+    def add(self, key, item, size):
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.size -= old[1]
+        self._items[key] = item, size
+        self.size += size
+        while self.size > self.max_size and len(self._items) > 1:
+            _, (_, oldsize) = self._items.popitem(last=False)
+            self.size -= oldsize
+
+class _Encoded:
+    """A value encoded for protocol v2
+    plain: the value with arrays replaced by placeholders
+    text: plain as JSON
+    arrays: descriptions of the arrays (see the module docstring)
+    payload: the data of the arrays"""
+    __slots__ = ("plain", "text", "arrays", "payload")
+    def __init__(self, plain, text, arrays, payload):
+        self.plain = plain
+        self.text = text
+        self.arrays = arrays
+        self.payload = payload
+
+def _pad8(n):
+    return (8 - n % 8) % 8
+
+def _encode(value):
+    arrays = []
+    def enc(v):
+        if isinstance(v, dict):
+            return {str(k): enc(vv) for k, vv in v.items()}
+        if isinstance(v, (list, tuple)):
+            return [enc(vv) for vv in v]
+        if isinstance(v, np.ndarray):
+            if v.dtype.hasobject:
+                return enc(v.tolist())
+            arrays.append(v)
+            return {"__array__": len(arrays) - 1}
+        if isinstance(v, np.generic):
+            return v.item()
+        return v
+    plain = enc(value)
+    descrs, parts = [], []
+    offset = 0
+    for arr in arrays:
+        data = np.ascontiguousarray(arr).tobytes()
+        descrs.append({
+            "dtype": np.lib.format.dtype_to_descr(arr.dtype),
+            "shape": list(arr.shape),
+            "offset": offset,
+            "nbytes": len(data),
+        })
+        parts.append(data)
+        pad = _pad8(len(data))
+        parts.append(b"\0" * pad)
+        offset += len(data) + pad
+    return _Encoded(plain, json.dumps(plain), descrs, b"".join(parts))
+
+def _subvalue(value, path):
+    for p in path:
+        try:
+            value = value[p]
+        except (KeyError, IndexError, TypeError, ValueError):
+            return None
+    return value
+
+def _pointer(path):
+    return "".join(
+        ["/" + str(p).replace("~", "~0").replace("/", "~1") for p in path]
+    )
+
+def _json_patch(old, new, path=(), patch=None):
+    """Returns the JSON patch (RFC 6902) that turns old into new"""
+    if patch is None:
+        patch = []
+    if type(old) is type(new) and old == new:
+        return patch
+    if isinstance(old, dict) and isinstance(new, dict):
+        for k in old:
+            if k not in new:
+                patch.append({"op": "remove", "path": _pointer(path + (k,))})
+        for k, v in new.items():
+            if k in old:
+                _json_patch(old[k], v, path + (k,), patch)
+            else:
+                patch.append({"op": "add", "path": _pointer(path + (k,)), "value": v})
+    elif isinstance(old, list) and isinstance(new, list):
+        common = min(len(old), len(new))
+        for n in range(common):
+            _json_patch(old[n], new[n], path + (n,), patch)
+        for n in range(len(old) - 1, common - 1, -1):
+            patch.append({"op": "remove", "path": _pointer(path + (n,))})
+        for n in range(common, len(new)):
+            patch.append({"op": "add", "path": _pointer(path + (n,)), "value": new[n]})
+    else:
+        patch.append({"op": "replace", "path": _pointer(path), "value": new})
+    return patch
+
+def _get_value(cell):
+    from .core.structured_cell import StructuredCell
+    if isinstance(cell, StructuredCell):
+        return cell.data.value
+    return cell.value
+
+def _celltype(cell):
+    """Identical checksums may stand for different values in cells of
+    different types (e.g. a text cell holding the JSON of a json cell):
+    the cell type is part of each cache key"""
+    from .core.structured_cell import StructuredCell
+    if isinstance(cell, StructuredCell):
+        cell = cell.data
+    return type(cell).__name__
+
+class _ShareClient:
+    """A websocket connection to the share update server"""
+    def __init__(self, websocket, protocol):
+        self.websocket = websocket
+        self.protocol = protocol
+        self.subscriptions = set() # (key pattern, path)
+        self.sent = {} # (key, path) => checksum of the last value sent
+
+    @staticmethod
+    def _parse(spec):
+        if isinstance(spec, str):
+            return spec, ()
+        pattern, path = spec
+        if not isinstance(pattern, str):
+            raise TypeError(spec)
+        return pattern, tuple(path)
+
+    @staticmethod
+    def _match(pattern, key):
+        if pattern == "*":
+            return True
+        if pattern.endswith("/"):
+            return key.startswith(pattern)
+        return key == pattern
+
+    def subscribe(self, specs):
+        """Adds subscriptions, and returns the new ones"""
+        new = []
+        for spec in specs:
+            sub = self._parse(spec)
+            if sub not in self.subscriptions:
+                self.subscriptions.add(sub)
+                new.append(sub)
+        return new
+
+    def unsubscribe(self, specs):
+        for spec in specs:
+            self.subscriptions.discard(self._parse(spec))
+        self.sent = {
+            k: v for k, v in self.sent.items() if k[1] in self.paths(k[0])
+        }
+
+    def paths(self, key):
+        """Returns the subscribed paths of key"""
+        paths = []
+        for pattern, path in self.subscriptions:
+            if self._match(pattern, key) and path not in paths:
+                paths.append(path)
+        return paths
 
 class ShareServer(object):    
     DEFAULT_ADDRESS = '127.0.0.1'
@@ -49,6 +260,7 @@ class ShareServer(object):
         self.started = False
         self.namespaces = {} #TODO: some cleanup, can be memory leak
         self.connections = {} #TODO: some cleanup, can be (minor) memory leak
+        self._cache = _SerializationCache()
 
     def new_namespace(self, namespace=None):
         if namespace is None:
@@ -71,6 +283,9 @@ class ShareServer(object):
 
     async def _send(self, websocket, message):
         message = json.dumps(message)
+        return await self._send_raw(websocket, message)
+
+    async def _send_raw(self, websocket, message):
         try:
             await websocket.send(message)
             return True
@@ -88,9 +303,131 @@ class ShareServer(object):
             return
         return await self._send(websocket, ("update", (key, checksum, marker)))
 
-    async def _serve_update(self, websocket, path):
-        if path:
-            path = path.lstrip("/")
+    def _encoded(self, cell, checksum, path):
+        key = "value", _celltype(cell), checksum, path
+        encoded = self._cache.get(key)
+        if encoded is None:
+            value = None
+            if checksum is not None:
+                value = _subvalue(_get_value(cell), path)
+            encoded = _encode(value)
+            size = len(encoded.text) + len(encoded.payload)
+            self._cache.add(key, encoded, size)
+        return encoded
+
+    def _get_delta(self, celltype, encoded, key, path, checksum, marker, base):
+        """Returns the delta message from base to encoded,
+        "" if nothing has changed,
+        or None if the delta is not smaller than the value"""
+        old = self._cache.get(("value", celltype, base, path))
+        if old is None or old.arrays or encoded.arrays:
+            return None
+        patchkey = "patch", celltype, base, checksum, path
+        patch = self._cache.get(patchkey)
+        if patch is None:
+            patch = _json_patch(old.plain, encoded.plain)
+            patch = json.dumps(patch) if len(patch) else ""
+            self._cache.add(patchkey, patch, len(patch))
+        if not len(patch):
+            return ""
+        if len(patch) >= len(encoded.text):
+            return None
+        header = {
+            "key": key, "path": list(path), "checksum": checksum,
+            "marker": marker, "base": base
+        }
+        return '["delta", %s, "patch": %s}]' % (json.dumps(header)[:-1], patch)
+
+    def _get_message(self, cell, key, path, checksum, marker, base):
+        """Returns the message that updates (key, path) from base to checksum
+        This is a str (JSON), a list of bytes (a binary frame), or None"""
+        celltype = _celltype(cell)
+        msgkey = "message", celltype, key, path, checksum, marker, base
+        message = self._cache.get(msgkey)
+        if message is not None:
+            return message
+        encoded = self._encoded(cell, checksum, path)
+        header = {
+            "key": key, "path": list(path), "checksum": checksum,
+            "marker": marker
+        }
+        message = None
+        if base is not None:
+            message = self._get_delta(
+              celltype, encoded, key, path, checksum, marker, base
+            )
+        if message is None and not encoded.arrays:
+            message = '["value", %s, "value": %s}]' % (json.dumps(header)[:-1], encoded.text)
+        elif message is None:
+            header["value"] = encoded.plain
+            header["arrays"] = encoded.arrays
+            header = json.dumps(("value", header)).encode()
+            header += b" " * _pad8(4 + len(header))
+            message = [struct.pack("<I", len(header)) + header, encoded.payload]
+        size = len(message) if isinstance(message, str) else len(message[0])
+        self._cache.add(msgkey, message, size)
+        return message
+
+    async def _push(self, namespace, client, key, path):
+        """Sends the current value of (key, path) to a protocol v2 client"""
+        ns = self.namespaces.get(namespace)
+        if ns is None or key not in ns:
+            return True
+        cell, checksum, marker = ns[key]
+        cell = cell()
+        if cell is None:
+            return True
+        if checksum is not None and cell.checksum() != checksum:
+            return True # a newer update will follow
+        base = client.sent.get((key, path))
+        if base is not None and base == checksum:
+            return True
+        message = self._get_message(cell, key, path, checksum, marker, base)
+        if message == "":
+            return True
+        client.sent[key, path] = checksum
+        return await self._send_raw(client.websocket, message)
+
+    async def _notify(self, namespace, client, key, checksum, marker, prior=None):
+        if client.protocol == 1:
+            return await self._send_checksum(client.websocket, key, checksum, marker, prior)
+        if prior is not None:
+            await prior
+        for path in client.paths(key):
+            if not await self._push(namespace, client, key, path):
+                return False
+        return True
+
+    async def _receive(self, namespace, client, message):
+        """Handles a message from a protocol v2 client"""
+        try:
+            command, specs = json.loads(message)
+            if command == "subscribe":
+                new = client.subscribe(specs)
+            elif command == "unsubscribe":
+                client.unsubscribe(specs)
+                return True
+            else:
+                raise ValueError("Unknown command '%s'" % command)
+        except (ValueError, TypeError) as exc:
+            return await self._send(client.websocket, ("error", str(exc)))
+        ns = self.namespaces.get(namespace, {})
+        for key in list(ns.keys()):
+            if key == "self":
+                continue
+            for pattern, path in new:
+                if client._match(pattern, key):
+                    if not await self._push(namespace, client, key, path):
+                        return False
+        return True
+
+    async def _serve_update(self, websocket, path=None):
+        if path is None: # newer websockets: the handler receives only the connection
+            path = websocket.request.path
+        url = urlsplit(path)
+        path = url.path.lstrip("/")
+        query = parse_qs(url.query)
+        protocol = int(query.get("protocol", ["1"])[0])
         assert path in self.namespaces, path #TODO
         """
         In the future, path can be empty (=> get all namespaces)
@@ -98,20 +435,29 @@ class ShareServer(object):
         Combined with proxying, this can be used to effectively hide part of the shares from access through the proxy
         """
         d = self.namespaces[path]
-        if not await self._send(websocket, ("Seamless share update server", "0.01")):
+        version = "0.01" if protocol == 1 else "0.02"
+        if not await self._send(websocket, ("Seamless share update server", version)):
             return
         if not await self._send_varlist(websocket, list(d.keys())):
             return
-        for k,v in d.items():
-            _, checksum, marker = v
-            if not await self._send_checksum(websocket, k, checksum, marker):            
-                break
-        self.connections[path].append(websocket)
-        async for message in websocket: #keep connection open forever
+        if protocol == 1:
+            for k,v in d.items():
+                if k == "self":
+                    continue
+                _, checksum, marker = v
+                if not await self._send_checksum(websocket, k, checksum, marker):
+                    break
+        client = _ShareClient(websocket, protocol)
+        self.connections[path].append(client)
+        try:
+            async for message in websocket: #keep connection open forever
+                if protocol > 1:
+                    await self._receive(path, client, message)
+        except websockets.exceptions.ConnectionClosed:
             pass
         if not path in self.connections:
             return
-        self.connections[path].remove(websocket)
+        self.connections[path].remove(client)
 
     async def serve_update(self):   
         if self._update_server_started:
@@ -140,10 +486,15 @@ class ShareServer(object):
             cell = cell()
             if cell is None:
                 raise KeyError
-            value = serialize(cell, "copy", "json", None)
+            cachekey = "json", _celltype(cell), cell.checksum()
+            body = self._cache.get(cachekey)
+            if body is None:
+                value = serialize(cell, "copy", "json", None)
+                body = json.dumps(value)
+                self._cache.add(cachekey, body, len(body))
             return web.Response(
                 status=200, 
-                body=json.dumps(value), 
+                body=body, 
                 content_type='application/json',
             )
         except KeyError:
@@ -208,7 +559,11 @@ class ShareServer(object):
         timeout = data.get("timeout")
 
         ctx = ns["self"]()
-        result = sorted(list(ctx.equilibrate(timeout)))
+        # Do not block the event loop (and therefore the shareserver)
+        unstable = await ctx.equilibrate_async(timeout)
+        if unstable is None: #already equilibrating
+            unstable = []
+        result = sorted([str(w) for w in unstable])
         return web.Response(
             status=200, 
             body=json.dumps(result), 
@@ -273,9 +628,9 @@ class ShareServer(object):
         diff_varlist = (varlist != old_varlist)
         fut = {}
         if diff_varlist:
-            for websocket in self.connections[namespace]:
-                coro = self._send_varlist(websocket, varlist)
-                fut[websocket] = asyncio.ensure_future(coro)
+            for client in self.connections[namespace]:
+                coro = self._send_varlist(client.websocket, varlist)
+                fut[client] = asyncio.ensure_future(coro)
 
         any_send_update = False
         coros = []
@@ -283,6 +638,7 @@ class ShareServer(object):
             if key == "self":
                 ctx = cell
                 ns[key] = weakref.ref(ctx)    
+                continue
             if isinstance(cell, StructuredCell):
                 datacell = cell.data
             elif isinstance(cell, Cell):
@@ -306,13 +662,13 @@ class ShareServer(object):
             ns[key] = [weakref.ref(cell), checksum, marker]
                         
             if send_update or diff_varlist:                
-                for websocket in self.connections[namespace]:
+                for client in self.connections[namespace]:
                     prior = None
                     if diff_varlist:
-                        prior = fut[websocket]
+                        prior = fut[client]
                     if send_update:
                         any_send_update = True
-                        coro = self._send_checksum(websocket, key, checksum, marker, prior=prior)
+                        coro = self._notify(namespace, client, key, checksum, marker, prior=prior)
                         coros.append(coro)        
         if not any_send_update:
             coros = fut.values()
@@ -346,8 +702,8 @@ class ShareServer(object):
         await self._future_start
 
         coros = []
-        for websocket in self.connections[namespace]:
-            s = self._send_checksum(websocket, key, checksum, marker)            
+        for client in self.connections[namespace]:
+            s = self._notify(namespace, client, key, checksum, marker)
             coros.append(s)
         await asyncio.gather(*coros)
     
@@ -5,7 +5,7 @@ import numpy as np
 
 from .SilkBase import SilkBase, SilkHasForm, compile_function
 from .validation import (
-  schema_validator, FormWrapper,
+  get_validator, validate_path, validator_depends_on, FormWrapper,
   Scalar, scalar_conv, _types, infer_type, is_numpy_structure_schema
 )
 from .schemawrapper import SchemaWrapper
@@ -75,11 +75,31 @@ def init_object_schema(silk, schema):
         silk._schema_update_hook()
     return result
 
+def _item_validator(valid):
+    """valid: (validity of the parent, item)
+    Returns the validator for the schema of the item,
+     as it was when the parent was validated"""
+    parent_valid, item = valid
+    if isinstance(parent_valid, tuple):
+        parent_valid = _item_validator(parent_valid)
+        if parent_valid is None:
+            return None
+    schema = parent_valid.schema
+    if isinstance(item, int):
+        item_schema = schema.get("items")
+        if isinstance(item_schema, list):
+            item_schema = item_schema[item] if item < len(item_schema) else None
+    else:
+        item_schema = schema.get("properties", {}).get(item)
+    if not isinstance(item_schema, dict):
+        return None
+    return get_validator(item_schema)
+
 class Silk(SilkBase):
     __slots__ = [
             "_parent", "_parent_attr", "data", "_schema",
             "_modifier", "_forks", "_buffer", "_stateful", "_buffer_nosync",
-            "_schema_update_hook", "_schema_dummy"
+            "_schema_update_hook", "_schema_dummy", "_valid"
     ]
 
     def __init__(self, schema = None, *, parent = None, data = None,
@@ -94,6 +114,7 @@ class Silk(SilkBase):
         self._stateful = stateful
         self._buffer_nosync = False
         self._schema_dummy = schema_dummy
+        self._valid = None
         assert not isinstance(data, Silk)
         if schema is None:
             schema = {}
@@ -355,7 +376,7 @@ class Silk(SilkBase):
                         # Not too slow (10**5 per sec).
                         #  Much better than constructing and validating
                         #  an explicit Silk object!
-                        validator = schema_validator(item_schema)
+                        validator = get_validator(item_schema)
                         value, _ = _prepare_for_validation(value)
                         for n in range(1, len(value)):
                             try:
@@ -594,13 +615,16 @@ class Silk(SilkBase):
                 raise TypeError(attr) #method cannot be assigned to
         else:
             self._setitem(attr, value)
+            if not len(self._forks):
+                self.validate(path=(attr,))
+            return
         if not len(self._forks):
             self.validate()
 
     def __setitem__(self, item, value):
         self._setitem(item, value)
         if not len(self._forks):
-            self.validate()
+            self.validate(path=(item,))
 
     def _set_property(self, attribute, prop):
         assert (not attribute.startswith("_")) or attribute.startswith("__"), attribute
@@ -646,7 +670,7 @@ class Silk(SilkBase):
         if self._schema_update_hook is not None:
             self._schema_update_hook()
 
-    def _add_validator(self, func, attr, *, from_meta, name):
+    def _add_validator(self, func, attr, *, from_meta, name, fields=None):
         assert callable(func)
         code = inspect.getsource(func)
 
@@ -661,6 +685,8 @@ class Silk(SilkBase):
         if name is not None:
             v["name"] = name
             func_name = name
+        if fields is not None:
+            v["fields"] = list(fields)
         compile_function(v, func_name)
 
         if isinstance(attr, int):
@@ -688,12 +714,15 @@ class Silk(SilkBase):
         if self._schema_update_hook is not None:
             self._schema_update_hook()
 
-    def add_validator(self, func, attr=None, *, name=None):
+    def add_validator(self, func, attr=None, *, name=None, fields=None):
+        """Adds a custom validator
+        If fields is given, the validator depends only on those attributes:
+         it is not re-run when any other attribute is modified"""
         schema = self._schema
         old_validators = copy(schema.get("validators", None))
         ok = False
         try:
-            self._add_validator(func, attr, from_meta=False,name=name)
+            self._add_validator(func, attr, from_meta=False, name=name, fields=fields)
             self.validate(full = False)
             ok = True
         finally:
@@ -856,6 +885,9 @@ class Silk(SilkBase):
           schema_update_hook = self._schema_update_hook,
           schema_dummy = self._schema_dummy
         )
+        if self._valid is not None:
+            # valid if self is valid, and the schema of the item is unchanged
+            result._valid = (self._valid, item)
         return result
 
     def __getitem__(self, item):
@@ -874,7 +906,24 @@ class Silk(SilkBase):
 
 
 
-    def _validate(self, full, accept_none):
+    def _is_valid(self, validator):
+        """Returns if the data is known to be valid:
+         it was validated against the current schema (or it is an item of
+         a Silk object that was validated against a schema that contains
+         the current schema of the item), and it has only been modified
+         by validated assignments since."""
+        valid = self._valid
+        if isinstance(valid, tuple):
+            valid = _item_validator(valid)
+        return valid is not None and valid is validator
+
+    def _invalidate(self):
+        silk = self
+        while silk is not None:
+            silk._valid = None
+            silk = silk._parent
+
+    def _validate(self, full, accept_none, path=None):
         if not self._modifier & SILK_NO_VALIDATION:
             if full:
                 if self._buffer is not None:
@@ -884,7 +933,13 @@ class Silk(SilkBase):
                 data, wdata = _prepare_for_validation(data)
                 if wdata is None and accept_none:
                     return
-                schema_validator(self._schema).validate(data)
+                validator = get_validator(self._schema)
+                if path is not None and self._is_valid(validator):
+                    # Only the data under path has changed
+                    validate_path(self._schema, data, path)
+                else:
+                    validator.validate(data)
+                self._valid = validator
             else:
                 schema = self._schema
                 proxy = self
@@ -907,11 +962,19 @@ class Silk(SilkBase):
                     proxy._forks = self._forks
                 validators = schema.get("validators", [])
                 for v, validator_code in enumerate(validators):
+                    if path is not None and \
+                      not validator_depends_on(validator_code, path[0]):
+                        continue
                     name = "Silk validator %d" % (v+1)
                     validator_func = compile_function(validator_code, name)
                     validator_func(proxy)
         if self._parent is not None:
-            self.parent.validate(full=False, accept_none=accept_none)
+            parent_path = None
+            if not isinstance(self._parent_attr, slice):
+                parent_path = (self._parent_attr,)
+            self.parent.validate(
+              full=False, accept_none=accept_none, path=parent_path
+            )
 
     def _commit_buffer(self):
         if self._stateful:
@@ -926,21 +989,31 @@ class Silk(SilkBase):
             self._set(deepcopy(self._buffer),lowlevel=True,buffer=False)
         self._buffer_nosync = False
 
-    def validate(self, full=True, accept_none=False):
+    def validate(self, full=True, accept_none=False, path=None):
+        """Validates the data against the schema
+        If path is given, only the data under path (a tuple of attributes)
+         has been modified since the last validation. In that case,
+         only the parts of the schema that cover path are validated,
+         as long as the rest of the data is known to be valid"""
         if self._schema_dummy:
             accept_none = True
         if (self._modifier & SILK_BUFFER_CHILD) or self._buffer is not None:
             try:
-                self._validate(full=full, accept_none=accept_none)
+                self._validate(full=full, accept_none=accept_none, path=path)
                 if self._buffer is not None:
                     self._commit_buffer()
             except:
+                self._invalidate()
                 #TODO: store exception instead
                 print("Warning: exception in buffered Silk structure")
                 traceback.print_exc() ###
                 self._buffer_nosync = True
         else:
-            self._validate(full=full, accept_none=accept_none)
+            try:
+                self._validate(full=full, accept_none=accept_none, path=path)
+            except:
+                self._invalidate()
+                raise
 
     def fork(self):
         if self._buffer is not None:
@@ -1,9 +1,15 @@
 import jsonschema
 import inspect
 import sys
+import re
+import json
+import hashlib
+from collections import OrderedDict
+from copy import deepcopy
 import numpy as np
 #from collections.abc import MutableSequence, MutableMapping
 from jsonschema.exceptions import FormatError, ValidationError
+from jsonschema._utils import extras_msg
 _types = jsonschema.Draft4Validator.DEFAULT_TYPES.copy()
 _integer_types =  (int, np.int8, np.int16, np.int32, np.int64, np.uint8, np.uint16, np.uint32, np.uint64)
 _unsigned_types = (np.uint8, np.uint16, np.uint32, np.uint64)
@@ -100,4 +106,123 @@ class schema_validator(schema_validator0):
             return True
         return super().is_type(instance, type)
 
+_validator_cache = OrderedDict() # schema checksum => validator
+_MAX_VALIDATORS = 1000
+
+def get_validator(schema):
+    """Returns a schema_validator for schema
+    Validators are cached by the checksum of the schema, and hold a copy of it:
+     modifying the schema afterwards leads to a different validator.
+    Custom "validators" inside the schema are compiled only once per validator"""
+    try:
+        schema_str = json.dumps(schema, sort_keys=True)
+    except TypeError: # not JSON-serializable: no caching
+        return schema_validator(schema)
+    checksum = hashlib.sha1(schema_str.encode()).digest()
+    validator = _validator_cache.get(checksum)
+    if validator is None:
+        validator = schema_validator(deepcopy(schema))
+        if len(_validator_cache) >= _MAX_VALIDATORS:
+            _validator_cache.popitem(last=False)
+        _validator_cache[checksum] = validator
+    else:
+        _validator_cache.move_to_end(checksum)
+    return validator
+
+# Keywords that validate the children of an instance
+#  (and custom validators, which are filtered on the fields that they use)
+_child_keywords = ("properties", "patternProperties", "additionalProperties",
+  "items", "additionalItems", "validators")
+
+def validator_depends_on(validator_code, attr):
+    """Returns if a custom validator depends on attribute attr
+    Validators that declare their "fields" depend only on those"""
+    fields = validator_code.get("fields")
+    return fields is None or attr in fields
+
+def _child_schemas(schema, instance, attr):
+    # Yields the schema path and schema of each subschema that applies to
+    #  instance[attr], or a ValidationError (on instance) if there is none
+    if isinstance(attr, int):
+        items = schema.get("items")
+        if isinstance(items, dict):
+            yield ("items",), items
+        elif isinstance(items, list):
+            if attr < len(items):
+                yield ("items", attr), items[attr]
+            else:
+                additional = schema.get("additionalItems", True)
+                if additional is False:
+                    yield ValidationError(
+                      "Additional items are not allowed (%s %s unexpected)" \
+                        % extras_msg([instance[attr]]),
+                      validator="additionalItems", validator_value=False,
+                      instance=instance, schema=schema,
+                      schema_path=("additionalItems",)
+                    )
+                elif isinstance(additional, dict):
+                    yield ("additionalItems",), additional
+        return
+    props = schema.get("properties", {})
+    matched = False
+    if attr in props:
+        matched = True
+        yield ("properties", attr), props[attr]
+    for pattern, subschema in schema.get("patternProperties", {}).items():
+        if re.search(pattern, attr):
+            matched = True
+            yield ("patternProperties", pattern), subschema
+    additional = schema.get("additionalProperties", True)
+    if not matched:
+        if additional is False:
+            yield ValidationError(
+              "Additional properties are not allowed (%s %s unexpected)" \
+                % extras_msg([attr]),
+              validator="additionalProperties", validator_value=False,
+              instance=instance, schema=schema,
+              schema_path=("additionalProperties",)
+            )
+        elif isinstance(additional, dict):
+            yield ("additionalProperties",), additional
+
+def iter_path_errors(schema, instance, path):
+    """Validates instance against schema, re-validating only the schema nodes
+     that cover path (a tuple of attributes)
+    It is assumed that instance was valid, and that only the data under path
+     has changed since. Custom validators that declare their "fields" are
+     only run if path starts with one of those fields
+    Yields ValidationErrors"""
+    if not len(path) or not isinstance(schema, dict) or "$ref" in schema:
+        yield from get_validator(schema).iter_errors(instance)
+        return
+    attr, subpath = path[0], path[1:]
+    # Validate the instance itself, except for its children
+    shallow = {k: v for k, v in schema.items() if k not in _child_keywords}
+    validators = schema.get("validators")
+    if validators:
+        shallow["validators"] = [
+          v for v in validators if validator_depends_on(v, attr)
+        ]
+    if len(shallow):
+        yield from get_validator(shallow).iter_errors(instance)
+    # Validate the child
+    try:
+        child = instance[attr]
+    except (KeyError, IndexError, TypeError):
+        return # deleted, or the instance has the wrong type
+    for result in _child_schemas(schema, instance, attr):
+        if isinstance(result, ValidationError):
+            yield result
+            continue
+        schema_path, child_schema = result
+        for error in iter_path_errors(child_schema, child, subpath):
+            error.path.appendleft(attr)
+            error.schema_path.extendleft(reversed(schema_path))
+            yield error
+
+def validate_path(schema, instance, path):
+    """Raises the first ValidationError of iter_path_errors, if any"""
+    for error in iter_path_errors(schema, instance, path):
+        raise error
+
 from .formwrapper import FormWrapper
@@ -1,3 +1,5 @@
+from . import Scalar
+
 class FormWrapper:
     """Wrapper around an object and its form (and storage)
     Unlike MixedObject, it does not store the path, but
@@ -16,38 +18,71 @@ class FormWrapper:
         return item in self._wrapped
 
     def __getattribute__(self, attribute):
-        if attribute in ("_wrapped", "_form", "_storage") or attribute.startswith("__"):
+        if attribute in ("_wrapped", "_form", "_storage", "_get_form") \
+          or attribute.startswith("__"):
             return super().__getattribute__(attribute)
         else:
             return getattr(self._wrapped, attribute)
 
+    def __len__(self):
+        return len(self._wrapped)
+
+    def __iter__(self):
+        wrapped = self._wrapped
+        if isinstance(wrapped, dict):
+            return iter(wrapped)
+        form = self._form
+        if not isinstance(form, dict) or \
+          (form.get("identical") and not isinstance(form.get("items"), dict)):
+            # no forms to pass on to the items
+            return iter(wrapped)
+        return (self[n] for n in range(len(wrapped)))
+
+    def _get_form(self):
+        """Returns the storage and form, computing them if unknown"""
+        if self._storage is None:
+            from ...mixed.get_form import get_form
+            storage, form = get_form(self._wrapped)
+            self._storage = storage
+            if self._form is None:
+                self._form = form
+        return self._storage, self._form
+
     def __getitem__(self, item):
         subitem = self._wrapped[item]
-        substorage = None
-        subform = None
         form = self._form
-        if form is not None:
-            if isinstance(item, int):
-                form_items = form.get("items")
-                if isinstance(form_items, list):
-                    try:
-                        subform = form_items[item]
-                    except IndexError:
-                        pass
-            else:
-                if "properties" in form:
-                    subform = form["properties"].get(item)
-            if isinstance(subform, str):
-                substorage = subform
-                subform = None
-            elif subform is None:
-                pass
-            else:
-                substorage = subform.get("storage")
-        if subform is None and substorage is None:
+        if not isinstance(form, dict) or isinstance(subitem, Scalar):
+            # Scalars are validated directly, their form is cheap to compute
             return subitem
-        else:
-            return FormWrapper(subitem, subform, substorage)
+        subform = None
+        if isinstance(item, int):
+            form_items = form.get("items")
+            if form.get("identical"):
+                subform = form_items
+            elif isinstance(form_items, list):
+                try:
+                    subform = form_items[item]
+                except IndexError:
+                    pass
+        elif "properties" in form:
+            subform = form["properties"].get(item)
+        if not isinstance(subform, dict):
+            return subitem
+        substorage = subform.get("storage")
+        item_storage = form.get("item_storage")
+        if substorage is None and item_storage is not None and isinstance(item, int):
+            # Python objects inside Numpy
+            if isinstance(item_storage, list):
+                item_storage = item_storage[item]
+            substorage = item_storage
+        if substorage is None and self._storage is not None:
+            # The storage of a child is stored only if it differs
+            #  from the parent
+            if self._storage.endswith("binary"):
+                substorage = "pure-binary"
+            else:
+                substorage = "pure-plain"
+        return FormWrapper(subitem, subform, substorage)
 
     def __str__(self):
         return str(self._wrapped)
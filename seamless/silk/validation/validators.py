@@ -7,21 +7,49 @@ from jsonschema._validators import items as validator_items_ORIGINAL
 from jsonschema._validators import type_draft4 as validator_type_ORIGINAL
 from jsonschema._utils import indent
 from .formwrapper import FormWrapper
+from .vectorized import numpy_item_errors, NotVectorizable
 from . import is_numpy_structure_schema, _types
 from ..SilkBase import compile_function
 
 import traceback
+from copy import deepcopy
 from bisect import bisect_left
 import numpy as np
 import pprint
 import textwrap
 """
-TODO: storage is now often re-computed (see "TODO:BAD" below)
- because FormWrappers are unwrapped when passing into the validators
- of the vanilla jsonschema library.
-For now, this seems to be not too costly, so low-priority fix
+FormWrappers pass the form of each child (dict, list or array) down into the
+ validators of the vanilla jsonschema library, so that the form is computed
+ only once. Scalars are passed unwrapped: their form is cheap to compute.
+Forms of data without a FormWrapper are re-computed (see "TODO:BAD" below),
+ but get_form memoizes the forms of Numpy arrays.
 """
 
+class _FormStr:
+    """Pretty-printed form, for error messages
+    It is only computed if an error message is actually printed"""
+    def __init__(self, form, suffix=""):
+        self.form = form
+        self.suffix = suffix
+
+    def __str__(self):
+        return indent(pprint.pformat(self.form, width=72)) + self.suffix
+
+def _items_have_type(form, items):
+    """Returns if the form guarantees that all items are valid,
+     for an items schema that only defines a type"""
+    if not isinstance(items, dict) or list(items.keys()) != ["type"]:
+        return False
+    if not isinstance(form, dict) or not form.get("identical"):
+        return False
+    item_type = form.get("items")
+    if not isinstance(item_type, str):
+        return False
+    types = items["type"]
+    if isinstance(types, str):
+        types = [types]
+    return item_type in types or (item_type == "integer" and "number" in types)
+
 def validator_items(validator, items, instance, schema):
     """Replacement for the validation of "items"
     Pass-through to the standard validator if any of the following:
@@ -29,12 +57,32 @@ def validator_items(validator, items, instance, schema):
     - The schema is not a Numpy schema, defined as .storage="binary"
        and .form.ndim present.
     - The data is in mixed-binary form
+    Items are not validated at all if the form shows that they all have
+     the type that the items schema requires
+    Items of Numpy arrays are validated with vectorized Numpy operations,
+     if the items schema allows it (see vectorized.py)
     """
     data = instance
     if isinstance(data, FormWrapper):
+        if _items_have_type(data._form, items):
+            return
         data = data._wrapped
     if isinstance(data, np.ndarray):
         numpy_schema = is_numpy_structure_schema(schema)
+        # For a Numpy schema, the form of the items is validated by validator_form
+        skip = ("form",) if numpy_schema else ()
+        if isinstance(items, dict) and \
+          all(k in skip or k not in validator.VALIDATORS for k in items):
+            errors = [] # nothing to validate
+        else:
+            try:
+                errors = numpy_item_errors(validator, items, data, skip)
+            except NotVectorizable:
+                errors = None
+        if errors is not None:
+            for error in errors:
+                yield error
+            return
         if numpy_schema:
             if isinstance(instance, FormWrapper):
                 storage, form = instance._storage, instance._form
@@ -91,9 +139,7 @@ def _validator_storage(storage, instance_storage, form_str=None):
 
 def validator_storage(validator, storage, instance, schema):
     if isinstance(instance, FormWrapper):
-        instance_storage = instance._storage
-        if instance._storage is None: #huh? to look into later... TODO
-            instance_storage, _ = get_form(instance._wrapped)
+        instance_storage, _ = instance._get_form()
     else:
         #TODO:BAD
         instance_storage, _ = get_form(instance)
@@ -131,7 +177,7 @@ def validator_form(validator, form, instance, schema, _from_items=False):
     else:
         #TODO:BAD
         instance_storage, instance_form = get_form(instance)
-    form_str = indent(pprint.pformat(instance_form, width=72))
+    form_str = _FormStr(instance_form)
     if instance_form is not None and "storage" in instance_form:
         storage_form = instance_form["storage"]
         for error in _validator_storage(storage_form, instance_storage, form_str):
@@ -142,7 +188,7 @@ def validator_form(validator, form, instance, schema, _from_items=False):
         return
 
     if _from_items:
-        form_str += "\n(on items)"
+        form_str.suffix = "\n(on items)"
     binary_form_props = ("unsigned", "shape", "bytesize", "strides", "ndim")
     for key, value in sorted(form.items(),key=lambda item:item[0]):
         if key in binary_form_props and not instance_storage.endswith("binary"):
@@ -172,7 +218,7 @@ def validator_form(validator, form, instance, schema, _from_items=False):
             if instance_value != value:
                 ok = False
         elif key == "strides":
-            if value != instance_value:
+            if tuple(value) != tuple(instance_value):
                 ok = False
         elif key == "shape":
             assert len(value) == len(instance_value) #TODO: check before for inconsistent shape/ndim requirement
@@ -221,6 +267,24 @@ def validator_form(validator, form, instance, schema, _from_items=False):
           ):
             yield error
 
+def _compiled_validators(validator, validators):
+    """Returns the compiled functions of the "validators" in a schema
+    They are stored on the validator object (see get_validator),
+     which is re-used as long as the schema does not change"""
+    cache = getattr(validator, "_compiled_validators", None)
+    if cache is None:
+        cache = {}
+        validator._compiled_validators = cache
+    entry = cache.get(id(validators))
+    if entry is not None and entry[0] == validators:
+        return entry[1]
+    funcs = []
+    for v, validator_code in enumerate(validators):
+        name = "Silk validator %d" % (v+1)
+        funcs.append(compile_function(validator_code, name))
+    cache[id(validators)] = deepcopy(validators), funcs
+    return funcs
+
 def validator_validators(validator, validators, instance, schema):
     if not len(validators):
         return
@@ -230,9 +294,7 @@ def validator_validators(validator, validators, instance, schema):
     if isinstance(instance, Silk):
         instance = instance.self.data
     silkobject = Silk(data=instance, schema=schema) #containing the methods
-    for v, validator_code in enumerate(validators):
-        name = "Silk validator %d" % (v+1)
-        validator_func = compile_function(validator_code, name)
+    for validator_func in _compiled_validators(validator, validators):
         try:
             validator_func(silkobject)
         except Exception:
@@ -0,0 +1,312 @@
+"""
+Vectorized validation of the items of Numpy arrays
+
+Item constraints (type, minimum, maximum, multipleOf, enum, ...) are evaluated
+ over the whole array with Numpy operations, instead of item by item.
+The fields of a structured dtype are validated column-wise (properties,
+ required, additionalProperties), nested arrays (items inside items)
+ axis-wise.
+The type of the items follows from the dtype, and is checked only once.
+"form" and "storage" are the same for all items: they are validated on
+ the first item only.
+
+If the schema contains a keyword that cannot be vectorized (e.g. custom
+ validators, "pattern", "$ref", "anyOf"), NotVectorizable is raised,
+ and the items must be validated one by one.
+
+For each keyword, only the first item that fails is reported.
+"""
+
+import numpy as np
+from jsonschema.exceptions import ValidationError
+from jsonschema._utils import extras_msg
+
+class NotVectorizable(Exception):
+    pass
+
+def _item_type(dtype, ndim):
+    """Returns the JSON type of the items of dimension ndim of an array"""
+    if ndim > 0:
+        return "array"
+    if dtype.fields is not None:
+        return "object"
+    kind = dtype.kind
+    if kind == "b":
+        return "boolean"
+    if kind in "iu":
+        return "integer"
+    if kind == "f":
+        return "number"
+    if kind in "SU":
+        return "string"
+    raise NotVectorizable(dtype)
+
+def _str_len(arr):
+    """Vectorized len() of the items of a string array (dtype S or U):
+     Numpy strips the trailing null characters"""
+    charsize = 1 if arr.dtype.kind == "S" else 4
+    nchars = arr.dtype.itemsize // charsize
+    if nchars == 0:
+        return np.zeros(arr.shape, int)
+    chars = np.ascontiguousarray(arr).view("u%d" % charsize)
+    chars = chars.reshape(arr.shape + (nchars,))
+    nonzero = chars[..., ::-1] != 0
+    trailing = np.argmax(nonzero, axis=-1)
+    return np.where(nonzero.any(axis=-1), nchars - trailing, 0)
+
+def _to_python(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+class _Items:
+    """The items of an array, over its leading axes
+    pathspec is the path of an item, with None for each leading axis"""
+    def __init__(self, arr, pathspec):
+        self.arr = arr
+        self.pathspec = pathspec
+        self.nlead = pathspec.count(None)
+        self.ndim = arr.ndim - self.nlead # dimensions of a single item
+        self.type = _item_type(arr.dtype, self.ndim)
+
+    @property
+    def empty(self):
+        return 0 in self.arr.shape[:self.nlead]
+
+    def index(self, failed=None):
+        """Returns the index of the first item where failed is True,
+         or of the first item"""
+        if failed is None:
+            return (0,) * self.nlead
+        flat = int(np.argmax(failed.reshape(-1)))
+        return tuple(int(i) for i in np.unravel_index(flat, failed.shape))
+
+    def path(self, index):
+        """Returns the path of the item at index"""
+        path, n = [], 0
+        for attr in self.pathspec:
+            if attr is None:
+                path.append(index[n])
+                n += 1
+            else:
+                path.append(attr)
+        return path
+
+    def value(self, index):
+        """Returns the item at index, as a Python object"""
+        return _to_python(self.arr[index])
+
+    def error(self, message, keyword, value, schema, schema_path, index):
+        return ValidationError(
+          message,
+          validator=keyword, validator_value=value,
+          instance=self.arr[index], schema=schema,
+          path=self.path(index), schema_path=schema_path + (keyword,)
+        )
+
+    def sub(self, key, arr):
+        return _Items(arr, self.pathspec + [key])
+
+def _is_type(items, types):
+    if isinstance(types, str):
+        types = [types]
+    for type_ in types:
+        if type_ == items.type:
+            return True
+        if type_ == "number" and items.type == "integer":
+            return True
+    return False
+
+def _numeric(items):
+    return items.type in ("integer", "number")
+
+def _failed_any(items, failed):
+    if failed.any():
+        return items.index(failed)
+    return None
+
+def _errors(validator, schema, items, schema_path, skip):
+    if not isinstance(schema, dict):
+        raise NotVectorizable(schema)
+    if items.empty:
+        return
+    arr = items.arr
+    for keyword, value in schema.items():
+        if keyword not in validator.VALIDATORS or keyword in skip:
+            continue # ignored by jsonschema
+        def error(message, index):
+            return items.error(message, keyword, value, schema, schema_path, index)
+        if keyword == "type":
+            if not _is_type(items, value):
+                types = [value] if isinstance(value, str) else value
+                index = items.index()
+                yield error(
+                  "%r is not of type %s" % (
+                    items.value(index), ", ".join(repr(t) for t in types)
+                  ), index
+                )
+        elif keyword in ("minimum", "maximum"):
+            if not _numeric(items):
+                continue
+            if keyword == "minimum":
+                if schema.get("exclusiveMinimum", False):
+                    failed, cmp = arr <= value, "less than or equal to"
+                else:
+                    failed, cmp = arr < value, "less than"
+            else:
+                if schema.get("exclusiveMaximum", False):
+                    failed, cmp = arr >= value, "greater than or equal to"
+                else:
+                    failed, cmp = arr > value, "greater than"
+            index = _failed_any(items, failed)
+            if index is not None:
+                yield error(
+                  "%r is %s the %s of %r" % (
+                    items.value(index), cmp, keyword, value
+                  ), index
+                )
+        elif keyword in ("exclusiveMinimum", "exclusiveMaximum"):
+            continue # see minimum and maximum
+        elif keyword == "multipleOf":
+            if not _numeric(items):
+                continue
+            if isinstance(value, float):
+                quotient = arr / value
+                with np.errstate(invalid="ignore"):
+                    failed = quotient != np.trunc(quotient)
+            else:
+                failed = (arr % value) != 0
+            index = _failed_any(items, failed)
+            if index is not None:
+                yield error(
+                  "%r is not a multiple of %r" % (items.value(index), value),
+                  index
+                )
+        elif keyword == "enum":
+            if items.type not in ("integer", "number", "boolean"):
+                raise NotVectorizable(keyword)
+            numbers = [v for v in value if isinstance(v, (bool, int, float))]
+            if items.type == "boolean":
+                # In Python, True == 1 and False == 0
+                failed = ~np.isin(arr.astype(int), numbers)
+            else:
+                failed = ~np.isin(arr, numbers)
+            index = _failed_any(items, failed)
+            if index is not None:
+                yield error(
+                  "%r is not one of %r" % (items.value(index), value), index
+                )
+        elif keyword in ("minLength", "maxLength"):
+            if items.type != "string":
+                continue
+            nchars = arr.dtype.itemsize // (1 if arr.dtype.kind == "S" else 4)
+            if (keyword == "minLength" and value <= 0) or \
+              (keyword == "maxLength" and value >= nchars):
+                continue # cannot fail
+            lengths = _str_len(arr)
+            if keyword == "minLength":
+                failed, msg = lengths < value, "%r is too short"
+            else:
+                failed, msg = lengths > value, "%r is too long"
+            index = _failed_any(items, failed)
+            if index is not None:
+                yield error(msg % (items.value(index),), index)
+        elif keyword in ("minItems", "maxItems"):
+            if items.type != "array":
+                continue
+            length = arr.shape[items.nlead]
+            index = items.index()
+            if keyword == "minItems" and length < value:
+                yield error("%r is too short" % (items.value(index),), index)
+            elif keyword == "maxItems" and length > value:
+                yield error("%r is too long" % (items.value(index),), index)
+        elif keyword == "uniqueItems":
+            if value and items.type == "array":
+                raise NotVectorizable(keyword)
+        elif keyword == "items":
+            if items.type != "array":
+                continue
+            lead = (slice(None),) * items.nlead
+            if isinstance(value, dict):
+                sub = _Items(arr, items.pathspec + [None])
+                yield from _errors(
+                  validator, value, sub, schema_path + ("items",), ()
+                )
+                continue
+            length = arr.shape[items.nlead]
+            for n, item_schema in enumerate(value[:length]):
+                sub = items.sub(n, arr[lead + (n,)])
+                yield from _errors(
+                  validator, item_schema, sub,
+                  schema_path + ("items", n), ()
+                )
+        elif keyword == "additionalItems":
+            if items.type != "array" or not isinstance(schema.get("items"), list):
+                continue
+            nitems = len(schema["items"])
+            if arr.shape[items.nlead] <= nitems or value is True:
+                continue
+            if value is False:
+                lead = (slice(None),) * items.nlead
+                extra = arr[lead + (slice(nitems, None),)]
+                index = items.index()
+                yield error(
+                  "Additional items are not allowed (%s %s unexpected)" \
+                    % extras_msg(_to_python(extra[index])),
+                  index
+                )
+            else:
+                raise NotVectorizable(keyword)
+        elif keyword == "properties":
+            if items.type != "object":
+                continue
+            for prop, prop_schema in value.items():
+                if prop in arr.dtype.fields:
+                    yield from _errors(
+                      validator, prop_schema, items.sub(prop, arr[prop]),
+                      schema_path + ("properties", prop), ()
+                    )
+        elif keyword == "required":
+            if items.type != "object":
+                continue
+            for prop in value:
+                if prop not in arr.dtype.fields:
+                    yield error("%r is a required property" % (prop,), items.index())
+        elif keyword in ("additionalProperties", "patternProperties"):
+            if items.type != "object":
+                continue
+            if keyword == "patternProperties" or isinstance(value, dict):
+                # rare for structured dtypes
+                raise NotVectorizable(keyword)
+            if value is False:
+                props = schema.get("properties", {})
+                if "patternProperties" in schema:
+                    raise NotVectorizable(keyword)
+                extras = [f for f in arr.dtype.names if f not in props]
+                if len(extras):
+                    yield error(
+                      "Additional properties are not allowed (%s %s unexpected)" \
+                        % extras_msg(extras),
+                      items.index()
+                    )
+        elif keyword in ("form", "storage"):
+            # the same for every item
+            index = items.index()
+            for err in validator.descend(arr[index], {keyword: value}):
+                err.path.extendleft(reversed(items.path(index)))
+                err.schema_path.extendleft(reversed(schema_path))
+                yield err
+        else:
+            raise NotVectorizable(keyword)
+
+def numpy_item_errors(validator, items_schema, arr, skip=()):
+    """Validates all items of Numpy array arr against items_schema
+    Keywords in skip are not validated for the top-level items
+    Returns a list of ValidationErrors
+    Raises NotVectorizable if this is not possible"""
+    if not isinstance(arr, np.ndarray) or not arr.ndim or arr.dtype.hasobject:
+        raise NotVectorizable(arr)
+    items = _Items(arr, [None])
+    return list(_errors(validator, items_schema, items, (), skip))
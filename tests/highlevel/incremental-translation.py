@@ -0,0 +1,52 @@
+from seamless.highlevel import Context
+from seamless.core.asynckernel.transformer import Transformer as KernelTransformer
+
+# Count the transformer executions
+executed = []
+_execute = KernelTransformer._execute
+def counting_execute(self, semaphore):
+    executed.append(self.parent().path[1])
+    return _execute(self, semaphore)
+KernelTransformer._execute = counting_execute
+
+def report():
+    ctx.equilibrate()
+    print(sorted(executed), ctx.y.value, ctx.z.value)
+    executed.clear()
+
+def inc(x):
+    return x + 1
+def double(x):
+    return 2 * x
+
+ctx = Context()
+ctx.x = 10
+ctx.inc = inc
+ctx.inc.x = ctx.x
+ctx.y = ctx.inc
+ctx.double = double
+ctx.double.x = ctx.y
+ctx.z = ctx.double
+report()
+gen_context = ctx._gen_context
+
+print("Change the code of a transformer")
+ctx.double.code = "3 * x"
+report()
+
+print("Add a cell")
+ctx.w = 5
+report()
+print(ctx.w.value)
+
+print("Re-wire a transformer to the new cell")
+ctx.inc.x = ctx.w
+report()
+
+print("Remove a cell")
+del ctx.x
+report()
+
+# The translated context has been modified, not replaced
+print(ctx._gen_context is gen_context)
+print(ctx._gen_context._children.get("x"))
@@ -0,0 +1,48 @@
+"""
+Stress test: re-translations while the transformer kernels are running
+The kernels of the old translated context are handed over to the new one
+ in the middle of their executions. No result may be lost,
+ and equilibrate() must return.
+Usage: python translation-cache-stress.py [number of rounds, default 20]
+"""
+import os, sys, random
+os.environ["SEAMLESS_TRANSFORMATION_CACHE_SIZE"] = "0" # test the translation cache only
+from seamless.highlevel import Context
+
+NCHAINS = 10
+NROUNDS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+# switch threads often, so that the kernels send their results
+#  in the middle of the handoffs
+sys.setswitchinterval(1e-5)
+
+def inc(x):
+    import time
+    time.sleep(0.005)
+    return x + 1
+def double(x):
+    return 2 * x
+
+ctx = Context()
+for n in range(NCHAINS):
+    setattr(ctx, "x%d" % n, n)
+    setattr(ctx, "inc%d" % n, inc)
+    getattr(ctx, "inc%d" % n).x = getattr(ctx, "x%d" % n)
+    setattr(ctx, "y%d" % n, getattr(ctx, "inc%d" % n))
+    setattr(ctx, "double%d" % n, double)
+    getattr(ctx, "double%d" % n).x = getattr(ctx, "y%d" % n)
+    setattr(ctx, "z%d" % n, getattr(ctx, "double%d" % n))
+ctx.equilibrate()
+
+random.seed(0)
+for r in range(NROUNDS):
+    for n in range(NCHAINS):
+        setattr(ctx, "x%d" % n, 100 * r + n)
+    # re-translate while the kernels are still executing the previous round
+    ctx.translate(force=True)
+    ctx._ctx.equilibrate(timeout=0.01 * random.random())
+
+unstable = ctx.equilibrate(timeout=30)
+print("unstable:", unstable)
+expected = [2 * (100 * r + n + 1) for n in range(NCHAINS)]
+print([getattr(ctx, "z%d" % n).value for n in range(NCHAINS)] == expected)
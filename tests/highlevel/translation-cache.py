@@ -0,0 +1,55 @@
+import os
+os.environ["SEAMLESS_TRANSFORMATION_CACHE_SIZE"] = "0" # test the translation cache only
+from seamless.highlevel import Context
+from seamless.core.asynckernel.transformer import Transformer as KernelTransformer
+
+# Count the transformer executions
+executed = []
+_execute = KernelTransformer._execute
+def counting_execute(self, semaphore):
+    executed.append(self.parent().path[1])
+    return _execute(self, semaphore)
+KernelTransformer._execute = counting_execute
+
+def report():
+    ctx.equilibrate()
+    print(sorted(executed), ctx.z0.value, ctx.z1.value, ctx.z2.value)
+    executed.clear()
+
+def inc(x):
+    return x + 1
+def double(x):
+    return 2 * x
+
+ctx = Context()
+for n in range(3):
+    setattr(ctx, "x%d" % n, 10 * n)
+    setattr(ctx, "inc%d" % n, inc)
+    getattr(ctx, "inc%d" % n).x = getattr(ctx, "x%d" % n)
+    setattr(ctx, "y%d" % n, getattr(ctx, "inc%d" % n))
+    setattr(ctx, "double%d" % n, double)
+    getattr(ctx, "double%d" % n).x = getattr(ctx, "y%d" % n)
+    setattr(ctx, "z%d" % n, getattr(ctx, "double%d" % n))
+    ctx.equilibrate()
+report()
+
+print("Re-translation without changes")
+ctx.translate(force=True)
+report()
+
+print("Re-wire double0 to y1")
+ctx.double0.x = ctx.y1
+report()
+
+print("Add a new transformer")
+def triple(x):
+    return 3 * x
+ctx.triple = triple
+ctx.triple.x = ctx.y2
+ctx.w = ctx.triple
+report()
+print(ctx.w.value)
+
+print("Change a value")
+ctx.x1 = 100
+report()
@@ -0,0 +1,81 @@
+import tracemalloc
+import numpy as np
+import seamless
+from seamless.core import macro_mode_on
+from seamless.core import context, cell, arraycell
+from seamless.core.cell import ArrayCell
+from seamless.core.buffer_store import buffer_store, BufferStore
+
+# count the number of times that an array is serialized
+serializations = 0
+_value_to_bytes = ArrayCell._value_to_bytes
+def counting_value_to_bytes(self, value):
+    global serializations
+    serializations += 1
+    return _value_to_bytes(self, value)
+ArrayCell._value_to_bytes = counting_value_to_bytes
+
+FANOUT = 50
+
+with macro_mode_on():
+    ctx = context(toplevel=True)
+    ctx.source = arraycell()
+    for n in range(FANOUT):
+        c = arraycell()
+        setattr(ctx, "copy%d" % n, c)
+        ctx.source.connect(c, transfer_mode="copy")
+    ctx.other = arraycell()
+
+tracemalloc.start()
+mem = tracemalloc.get_traced_memory()[0]
+arr = np.arange(1000000, dtype=float)
+ctx.source.set(arr)
+ctx.equilibrate()
+
+checksum = ctx.source.checksum()
+print("serializations:", serializations)
+print("identical checksums:", all(
+    getattr(ctx, "copy%d" % n).checksum() == checksum for n in range(FANOUT)
+))
+print("buffer references:", buffer_store.refcount(checksum))
+# The copies are not kept: all cells share a single, read-only value
+print("shared value:", all(
+    getattr(ctx, "copy%d" % n).value is ctx.source.value for n in range(FANOUT)
+))
+try:
+    ctx.copy0.value[0] = 99
+except ValueError as exc:
+    print(exc)
+print(ctx.source.value[:3])
+# ...also with an identical value that is set independently
+ctx.other.set(arr.copy())
+print("shared value:", ctx.other.value is ctx.source.value)
+# The buffer is serialized once
+buf = ctx.source.serialize_buffer()
+print("shared buffer:", all(
+    getattr(ctx, "copy%d" % n).serialize_buffer() is buf for n in range(FANOUT)
+))
+print("serializations:", serializations)
+del buf
+# value + buffer
+mem = tracemalloc.get_traced_memory()[0] - mem
+print("memory / array size:", round(mem / arr.nbytes))
+
+ctx.source.set(arr + 1)
+ctx.equilibrate()
+print(ctx.copy0.value[:3])
+print("old buffer references:", buffer_store.refcount(checksum))
+checksum2 = ctx.source.checksum()
+print("new buffer references:", buffer_store.refcount(checksum2))
+
+ctx.destroy()
+print("buffer references after destroy:", buffer_store.refcount(checksum2))
+
+# The store is bounded: unreferenced buffers are evicted first
+store = BufferStore(max_size=100)
+store.incref("a", b"a" * 40)
+store.add("b", b"b" * 40)
+store.add("c", b"c" * 40)
+print(sorted(store._buffers), store.size)
+store.add("d", b"d" * 40)
+print(sorted(store._buffers), store.size)
@@ -0,0 +1,40 @@
+"""
+Benchmark: matching a re-generated context against the old one (core.cache)
+The time per object must stay roughly constant as the number of cells grows
+"""
+import time
+import seamless
+from seamless.core import macro_mode_on
+from seamless.core import context, cell, transformer
+from seamless.core.cache import cache
+
+def build(n, offset):
+    with macro_mode_on():
+        ctx = context(toplevel=True)
+        for i in range(n):
+            c = cell("json").set(i + offset)
+            setattr(ctx, "cell%d" % i, c)
+            if i % 10:
+                d = cell("json")
+                setattr(ctx, "dep%d" % i, d)
+                c.connect(d)
+    return ctx
+
+def bench(n, offset):
+    old_ctx = build(n, 0)
+    ctx = build(n, offset)
+    old_ctx.equilibrate()
+    ctx.equilibrate()
+    t = time.time()
+    hits = cache(ctx, old_ctx)
+    elapsed = time.time() - t
+    print("%5d cells: %5d hits, %6.1f us/cell" % (n, len(hits["cells"]), elapsed / n * 1e6))
+    ctx.destroy()
+    old_ctx.destroy()
+
+print("Every cell moves one position")
+for n in (250, 500, 1000, 2000):
+    bench(n, 1)
+print("All values are new")
+for n in (250, 500, 1000, 2000):
+    bench(n, n)
@@ -0,0 +1,42 @@
+import os, tempfile, time
+cache_dir = tempfile.mkdtemp()
+os.environ["SEAMLESS_COMPILE_CACHE_DIR"] = cache_dir
+
+from seamless.core import cached_compile as cc
+from seamless.core.cached_compile import cached_compile, clear_compile_cache
+
+code = "\n".join(["x%d = %d * 2" % (n, n) for n in range(20000)])
+
+t = time.time()
+c1 = cached_compile(code, "Seamless test: big", "exec")
+t1 = time.time() - t
+t = time.time()
+c2 = cached_compile(code, "Seamless test: big", "exec")
+t2 = time.time() - t
+print("in-memory cache hit:", c1 is c2)
+print("in-memory cache is faster:", t2 < t1 / 10)
+
+c3 = cached_compile(code, "Seamless test: big2", "exec")
+print("identifier is part of the key:", c3 is not c1, c3.co_filename)
+
+clear_compile_cache()
+t = time.time()
+c4 = cached_compile(code, "Seamless test: big", "exec")
+t4 = time.time() - t
+print("on-disk cache hit:", c4 is not c1 and c4 == c1)
+print("on-disk cache is faster:", t4 < t1)
+print("on-disk cache files:", len(os.listdir(cache_dir)))
+
+namespace = {}
+exec(c4, namespace)
+print(namespace["x19999"])
+
+# LRU eviction
+cc.CACHE_SIZE = 2
+clear_compile_cache()
+for n in range(5):
+    cached_compile("a = %d" % n, "Seamless test: small", "exec")
+print("in-memory cache size:", len(cc._cache))
+
+import shutil
+shutil.rmtree(cache_dir)
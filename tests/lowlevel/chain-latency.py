@@ -0,0 +1,67 @@
+"""
+Benchmark: end-to-end latency of a chain of transformers
+Each transformer adds 1 to its input; the computation itself takes microseconds,
+ so the measured time is the overhead of the transformer kernel loop.
+The chain is measured twice: as it is, and with the 10 ms sleep per kernel
+ message of the old, polling kernel loop (emulated by patching the semaphore
+ of the kernel inputs).
+"""
+
+import sys
+import time
+import seamless
+from seamless.core import macro_mode_on
+from seamless.core import context, cell, transformer, pytransformercell
+from seamless.core.asynckernel import InputSemaphore
+
+DEPTH = 100
+if len(sys.argv) > 1:
+    DEPTH = int(sys.argv[1])
+
+with macro_mode_on():
+    ctx = context(toplevel=True)
+    ctx.code = pytransformercell().set("b = a + 1")
+    ctx.cell0 = cell().set(0)
+    prev = ctx.cell0
+    for n in range(DEPTH):
+        tf = transformer({
+            "a": "input",
+            "b": "output"
+        })
+        setattr(ctx, "tf%d" % (n+1), tf)
+        c = cell()
+        setattr(ctx, "cell%d" % (n+1), c)
+        ctx.code.connect(tf.code)
+        prev.connect(tf.a)
+        tf.b.connect(c)
+        prev = c
+
+t = time.time()
+ctx.equilibrate()
+print("Initial equilibration: %.3f seconds" % (time.time() - t))
+last = getattr(ctx, "cell%d" % DEPTH)
+assert last.value == DEPTH, last.value
+
+def measure(values):
+    for value in values:
+        t = time.time()
+        ctx.cell0.set(value)
+        ctx.equilibrate()
+        elapsed = time.time() - t
+        assert last.value == value + DEPTH, last.value
+        print("Chain of %d transformers: %.3f seconds, %.2f ms per transformer" % \
+          (DEPTH, elapsed, 1000 * elapsed / DEPTH))
+
+print("Event-driven kernel loop")
+measure((10, 20, 30))
+
+_acquire = InputSemaphore.acquire
+def sleeping_acquire(self, blocking=True, timeout=None):
+    ok = _acquire(self, blocking, timeout)
+    if ok and blocking and timeout is None: # the kernel waits for a message
+        time.sleep(0.01)
+    return ok
+InputSemaphore.acquire = sleeping_acquire
+
+print("With the old 10 ms sleep per kernel message")
+measure((40, 50, 60))
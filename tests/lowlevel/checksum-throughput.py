@@ -0,0 +1,42 @@
+"""
+Benchmark: checksum throughput of the available hash backends
+Hashes a Numpy array incrementally (as done for array cells),
+ and compares with serializing the array first (as done previously).
+"""
+
+import sys
+import time
+import hashlib
+from io import BytesIO
+import numpy as np
+from seamless.core.checksum import checksum, get_hasher
+
+SIZE_MB = 200
+if len(sys.argv) > 1:
+    SIZE_MB = int(sys.argv[1])
+
+arr = np.random.random(SIZE_MB * 1024 * 1024 // 8)
+
+def serialize_then_md5(arr):
+    b = BytesIO()
+    np.save(b, arr, allow_pickle=False)
+    return hashlib.md5(b.getvalue()).hexdigest()
+
+def bench(name, func):
+    t = time.time()
+    func()
+    elapsed = time.time() - t
+    print("%-24s %8.1f MB/s" % (name, SIZE_MB / elapsed))
+
+bench("md5, serialized first", lambda: serialize_then_md5(arr))
+for algorithm in ("md5", "sha1", "sha256", "blake2b", "blake2s",
+  "xxh64", "xxh3_64", "xxh3_128"):
+    try:
+        get_hasher(algorithm)
+    except ImportError:
+        print("%-24s (not available)" % algorithm)
+        continue
+    bench(algorithm, lambda: checksum(arr, algorithm))
+
+# non-contiguous arrays are hashed in chunks
+bench("md5, non-contiguous", lambda: checksum(arr[::2]) and checksum(arr[1::2]))
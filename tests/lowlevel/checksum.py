@@ -0,0 +1,42 @@
+"""
+The checksum of an array value is the checksum of its .npy buffer,
+ also for non-contiguous arrays and struct arrays with padding
+"""
+from io import BytesIO
+import numpy as np
+from seamless.core.checksum import checksum, checksum_mixed
+from seamless.mixed.io import to_stream, from_stream
+from seamless.mixed.get_form import get_form
+
+def npy(arr):
+    b = BytesIO()
+    np.save(b, arr, allow_pickle=False)
+    return b.getvalue()
+
+# aligned: offsets [0, 8], itemsize 16
+padded = np.dtype([("a", "<i4"), ("b", "<f8")], align=True)
+s = np.zeros(10, padded)
+s.view(np.uint8)[:] = np.arange(s.nbytes) % 251 # non-zero padding bytes
+s["a"] = np.arange(10)
+s["b"] = 2.5
+
+arr = np.arange(24, dtype=float).reshape(4, 6)
+arrays = {
+    "contiguous": arr,
+    "Fortran": np.asfortranarray(arr),
+    "non-contiguous": arr[::2, ::3],
+    "struct": s,
+    "struct, non-contiguous": s[::2],
+    "struct, reversed": s[::-1],
+}
+for name, a in arrays.items():
+    print(name, checksum(a) == checksum(npy(a)))
+
+# Mixed data: the checksum is the checksum of the stream,
+#  and the stream keeps the padding bytes
+data = {"s": s[::2], "x": 1}
+storage, form = get_form(data)
+stream = to_stream(data, storage, form)
+print("mixed", checksum_mixed(data, storage, form) == checksum(stream))
+data2 = from_stream(stream, storage, form)
+print("mixed round trip", data2["s"].tobytes() == s[::2].tobytes())
@@ -0,0 +1,52 @@
+# recycle pool workers quickly, to test the recycling
+import os
+os.environ["SEAMLESS_EXECUTOR_MAX_JOBS"] = "3"
+
+import seamless
+from seamless.core import macro_mode_on
+from seamless.core import context, cell, transformer, pytransformercell, link
+from seamless.core.asynckernel.executor_pool import get_executor_pool
+
+with macro_mode_on():
+    ctx = context(toplevel=True)
+    ctx.cell1 = cell().set(1)
+    ctx.cell2 = cell().set(2)
+    ctx.result = cell()
+    ctx.tf = transformer({
+        "a": "input",
+        "b": "input",
+        "c": "output"
+    })
+    ctx.cell1.connect(ctx.tf.a)
+    ctx.cell2.connect(ctx.tf.b)
+    ctx.code = pytransformercell().set("""
+import os
+c = a + b, os.getpid()
+""")
+    ctx.code.connect(ctx.tf.code)
+    ctx.tf.c.connect(ctx.result)
+
+ctx.equilibrate()
+pids = []
+for n in range(10):
+    ctx.cell1.set(n)
+    ctx.equilibrate()
+    value, pid = ctx.result.value
+    print(value)
+    pids.append(pid)
+print("Distinct worker processes:", len(set(pids)))
+pool = get_executor_pool()
+print("Idle workers:", len(pool._idle))
+
+# A new input kills the running job; the pool replaces the worker
+ctx.code.set("""
+import time, os
+time.sleep(a)
+c = a + b, os.getpid()
+""")
+ctx.cell1.set(100)
+ctx.equilibrate(0.5)
+ctx.cell1.set(0)
+ctx.equilibrate()
+print(ctx.result.value[0])
+print(ctx.status())
@@ -0,0 +1,75 @@
+"""
+Transformer kernels wait for their executor without file descriptors of their own,
+ and report errors without delay
+"""
+import os
+import time
+import seamless
+from seamless.core import macro_mode_on
+from seamless.core import context, cell, transformer, pytransformercell
+
+def nfds():
+    return len(os.listdir("/proc/self/fd"))
+
+N = 300
+fds = nfds()
+with macro_mode_on():
+    ctx = context(toplevel=True)
+    ctx.code = pytransformercell().set("b = a + 1")
+    ctx.a = cell()
+    for n in range(N):
+        tf = transformer({
+            "a": "input",
+            "b": "output"
+        })
+        setattr(ctx, "tf%d" % n, tf)
+        c = cell()
+        setattr(ctx, "b%d" % n, c)
+        ctx.code.connect(tf.code)
+        ctx.a.connect(tf.a)
+        tf.b.connect(c)
+ctx.equilibrate()
+# The kernels are running, waiting for their input: no file descriptors
+#  per transformer
+print("fds per transformer < 0.1:", (nfds() - fds) / N < 0.1)
+ctx.a.set(1)
+ctx.equilibrate()
+print(ctx.b0.value, getattr(ctx, "b%d" % (N-1)).value)
+
+with macro_mode_on():
+    ctx.code2 = pytransformercell().set("""
+import time
+if a < 0:
+    raise ValueError(a)
+if a > 100:
+    time.sleep(10)
+b = 2 * a
+""")
+    ctx.tf = transformer({
+        "a": "input",
+        "b": "output"
+    })
+    ctx.code2.connect(ctx.tf.code)
+    ctx.a2 = cell().set(1)
+    ctx.a2.connect(ctx.tf.a)
+    ctx.result = cell()
+    ctx.tf.b.connect(ctx.result)
+ctx.equilibrate()
+print(ctx.result.value)
+
+# An error is reported without delay
+t = time.time()
+ctx.a2.set(-1)
+ctx.equilibrate()
+print("error reported within 1 second:", time.time() - t < 1)
+ctx.a2.set(3)
+ctx.equilibrate()
+print(ctx.result.value)
+
+# A new input kills the running executor
+ctx.a2.set(1000)
+time.sleep(0.5)
+t = time.time()
+ctx.a2.set(4)
+ctx.equilibrate()
+print(ctx.result.value, "killed within 1 second:", time.time() - t < 1)
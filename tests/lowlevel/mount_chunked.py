@@ -0,0 +1,44 @@
+import os, time
+import numpy as np
+import seamless
+from seamless.core import macro_mode_on
+from seamless.core import context, cell
+from seamless.mixed import ChunkedArray
+from seamless.mixed.chunked import to_chunked_stream
+
+os.makedirs("/tmp/mount-test", exist_ok=True)
+if os.path.exists("/tmp/mount-test/chunked.mixed"):
+    os.remove("/tmp/mount-test/chunked.mixed")
+with macro_mode_on():
+    ctx = context(toplevel=True)
+    ctx.storage = cell("text")
+    ctx.form = cell("json")
+    ctx.data = cell("mixed", form_cell=ctx.form, storage_cell=ctx.storage)
+    ctx.data.mount("/tmp/mount-test/chunked.mixed", "rw")
+
+big = np.arange(1000000, dtype=np.float32).reshape(10000, 100)
+ctx.data.set(ChunkedArray.from_array(big, chunk_size=40000), auto_form=True)
+ctx.equilibrate()
+time.sleep(0.5)
+print(ctx.data.value, ctx.storage.value, ctx.form.value["shape"])
+
+# The buffer (and the mounted file) is the chunked stream itself
+buffer = ctx.data.serialize_buffer()
+print(len(buffer) - big.nbytes < 4096)
+with open("/tmp/mount-test/chunked.mixed", "rb") as f:
+    print(f.read() == bytes(buffer))
+
+# Loading from the buffer gives a lazy chunked array
+value = ctx.data._from_buffer(buffer)
+print(type(value).__name__, value[9999][99], value.nchunks)
+
+# Chunked arrays can be read directly from the mounted file
+print(ChunkedArray("/tmp/mount-test/chunked.mixed")[1234, 56])
+
+# Changing the mounted file
+with open("/tmp/mount-test/chunked.mixed.tmp", "wb") as f:
+    f.write(to_chunked_stream(2 * big, chunk_size=40000, compression="zlib"))
+os.replace("/tmp/mount-test/chunked.mixed.tmp", "/tmp/mount-test/chunked.mixed")
+time.sleep(1)
+ctx.equilibrate()
+print(type(ctx.data.value).__name__, ctx.data.value[1234, 56])
@@ -0,0 +1,134 @@
+"""
+Memory-mapped mounts of array and mixed cells
+"""
+import os, shutil, time, mmap
+import numpy as np
+import seamless
+from seamless.core import macro_mode_on
+from seamless.core import context, cell
+from seamless.core.mount import mountmanager, MountItem
+from seamless.core.buffer_store import buffer_store
+from seamless.core.checksum import checksum
+from seamless.mixed.get_form import get_form
+from seamless.mixed.io import to_stream
+
+mountdir = "/tmp/mount-mmap"
+if os.path.exists(mountdir):
+    shutil.rmtree(mountdir)
+os.makedirs(mountdir)
+
+def anon_memory():
+    """Anonymous (non file-backed) memory of the process, in MB"""
+    with open("/proc/self/status") as f:
+        for l in f:
+            if l.startswith("RssAnon:"):
+                return int(l.split()[1]) / 1024
+
+def save(path, arr):
+    # replace the file, do not modify it in place
+    np.save(path + ".tmp.npy", arr)
+    os.replace(path + ".tmp.npy", path)
+
+def wait_for(condition, timeout=5):
+    t = time.time()
+    while not condition():
+        if time.time() - t > timeout:
+            return False
+        seamless.flush()
+        time.sleep(0.01)
+    return True
+
+big = np.arange(50000000, dtype=np.float32) # 200 MB
+arrfile = mountdir + "/big.npy"
+save(arrfile, big)
+
+reads = []
+_read = MountItem._read
+def counting_read(self):
+    result = _read(self)
+    reads.append(type(result).__name__)
+    return result
+MountItem._read = counting_read
+
+mem = anon_memory()
+with macro_mode_on():
+    ctx = context(toplevel=True)
+    ctx.arr = cell("array")
+    ctx.arr.mount(arrfile, authority="file", mmap=True)
+ctx.equilibrate()
+value = ctx.arr.value
+print(reads, np.array_equal(value, big))
+print("extra memory < 20 MB:", anon_memory() - mem < 20)
+print(value.flags.owndata, value.flags.writeable)
+
+# The checksum of the file is the checksum of the cell,
+#  and the map is the buffer of the cell
+print(ctx.arr.checksum() == checksum(big))
+print(type(buffer_store.get(ctx.arr.checksum())).__name__)
+print(type(ctx.arr.serialize_buffer()).__name__)
+
+# The file is replaced
+big2 = big[::-1].copy()
+save(arrfile, big2)
+print(wait_for(lambda: ctx.arr.value[0] == big2[0]), np.array_equal(ctx.arr.value, big2))
+del value
+
+# Cell => file, through a map of the (temporary) file
+big3 = np.arange(60000000, dtype=np.float32).reshape(3, 20000000)
+ctx.arr.set(big3)
+ctx.equilibrate()
+mountmanager.tick()
+print(np.array_equal(np.load(arrfile), big3))
+print([f for f in os.listdir(mountdir) if f.endswith(".tmp")])
+
+# Fortran-ordered arrays
+big4 = np.asfortranarray(big3[:, :1000] * 2)
+ctx.arr.set(big4)
+ctx.equilibrate()
+mountmanager.tick()
+loaded = np.load(arrfile)
+print(np.array_equal(loaded, big4), loaded.flags.f_contiguous)
+
+# A file that np.save would not have written (other header version):
+#  the value is read, but its checksum must be computed from the value
+big5 = np.arange(10, dtype=np.int16)
+with open(arrfile + ".tmp", "wb") as f:
+    np.lib.format.write_array(f, big5, version=(2, 0))
+os.replace(arrfile + ".tmp", arrfile)
+print(wait_for(lambda: ctx.arr.value.dtype == np.int16), ctx.arr.value)
+with open(arrfile, "rb") as f:
+    file_checksum = checksum(f.read())
+print(ctx.arr.checksum() == checksum(big5), ctx.arr.checksum() != file_checksum)
+
+# Mixed cells, copy-on-write: the value is writable, the file is not changed
+data = {"coor": np.arange(30).reshape(10, 3).astype(float), "name": "test"}
+mixedfile = mountdir + "/data.mixed"
+storage, form = get_form(data)
+with macro_mode_on():
+    ctx.storage = cell("text")
+    ctx.form = cell("json")
+    ctx.data = cell("mixed", form_cell=ctx.form, storage_cell=ctx.storage)
+    ctx.data.mount(mixedfile, mmap="copy")
+ctx.data.set(data, auto_form=True)
+ctx.equilibrate()
+mountmanager.tick()
+with open(mixedfile, "rb") as f:
+    print(f.read() == to_stream(data, storage, form))
+data2 = {"coor": -data["coor"], "name": "test2"}
+with open(mixedfile + ".tmp", "wb") as f:
+    f.write(to_stream(data2, storage, form))
+os.replace(mixedfile + ".tmp", mixedfile)
+print(wait_for(lambda: ctx.data.value["name"] == "test2"), reads[-1])
+coor = ctx.data.value["coor"]
+print(np.array_equal(coor, data2["coor"]), coor.flags.owndata, coor.flags.writeable)
+coor[0, 0] = 100
+with open(mixedfile, "rb") as f:
+    print(f.read() == to_stream(data2, storage, form))
+
+# Only binary cells can be memory-mapped
+try:
+    with macro_mode_on():
+        ctx.text = cell("text")
+        ctx.text.mount(mountdir + "/text.txt", mmap=True)
+except AssertionError as exc:
+    print("AssertionError:", exc)
@@ -0,0 +1,56 @@
+"""
+Memory-mapped mounts: replaced files are unmapped and closed
+"""
+import os, shutil, time
+import numpy as np
+import seamless
+from seamless.core import macro_mode_on
+from seamless.core import context, cell
+from seamless.core.buffer_store import buffer_store
+
+mountdir = "/tmp/mount-mmap-replace"
+if os.path.exists(mountdir):
+    shutil.rmtree(mountdir)
+os.makedirs(mountdir)
+arrfile = mountdir + "/arr.npy"
+
+def save(arr):
+    # replace the file, do not modify it in place
+    np.save(arrfile + ".tmp.npy", arr)
+    os.replace(arrfile + ".tmp.npy", arrfile)
+
+def wait_for(condition, timeout=5):
+    t = time.time()
+    while not condition():
+        if time.time() - t > timeout:
+            return False
+        seamless.flush()
+        time.sleep(0.01)
+    return True
+
+def counts():
+    """open fds, mappings of the mounted file, buffer store entries"""
+    fds = len(os.listdir("/proc/self/fd"))
+    with open("/proc/self/maps") as f:
+        maps = len([l for l in f if arrfile in l])
+    return fds, maps, len(buffer_store)
+
+save(np.zeros(100000))
+with macro_mode_on():
+    ctx = context(toplevel=True)
+    ctx.arr = cell("array")
+    ctx.arr.mount(arrfile, authority="file", mmap=True)
+ctx.equilibrate()
+before = counts()
+print(before[1:])
+for n in range(1, 31):
+    save(np.full(100000, n, dtype=float))
+    assert wait_for(lambda: ctx.arr.value[0] == n), n
+print(counts() == before)
+
+# A view on the old map remains valid after the file has been replaced
+value = ctx.arr.value
+save(np.full(100000, -1, dtype=float))
+print(wait_for(lambda: ctx.arr.value[0] == -1), value[0], value[-1])
+del value
+print(counts() == before)
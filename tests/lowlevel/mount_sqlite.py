@@ -0,0 +1,117 @@
+"""
+Mounting a context into a single SQLite database (mount backends)
+"""
+import os, shutil, time, sqlite3
+import numpy as np
+import seamless
+from seamless.core import macro_mode_on
+from seamless.core import context, cell
+from seamless.core.mount import mountmanager
+from seamless.core.mount_backends import SqliteBackend, get_mount_backend
+
+mountdir = "/tmp/mount-sqlite"
+if os.path.exists(mountdir):
+    shutil.rmtree(mountdir)
+os.makedirs(mountdir)
+dbfile = mountdir + "/graph.db"
+
+def wait_for(condition, timeout=5):
+    t = time.time()
+    while not condition():
+        if time.time() - t > timeout:
+            return False
+        seamless.flush()
+        time.sleep(0.01)
+    return True
+
+ncells = 2000
+t = time.time()
+with macro_mode_on():
+    ctx = context(toplevel=True)
+    ctx.mount(dbfile, persistent=True, backend="sqlite")
+    for n in range(ncells):
+        setattr(ctx, "cell%d" % n, cell("text").set("value %d" % (n % 10)))
+    ctx.sub = context(name="sub", context=ctx)
+    ctx.sub.data = cell("json").set({"a": 1})
+    ctx.sub.arr = cell("array").set(np.arange(10))
+ctx.equilibrate()
+mountmanager.tick()
+print("mount %d cells: %.1f s" % (ncells, time.time() - t))
+print(sorted(os.listdir(mountdir)))
+
+db = sqlite3.connect(dbfile)
+print(db.execute("SELECT COUNT(*) FROM mounts").fetchone()[0])
+# identical values are stored once
+print(db.execute("SELECT COUNT(*) FROM buffers").fetchone()[0])
+print(db.execute("SELECT path FROM mounts WHERE path LIKE 'sub/%' ORDER BY path").fetchall())
+
+# All updates of an iteration are written in a single transaction
+backend = get_mount_backend("sqlite", dbfile)
+statements = []
+backend.conn.set_trace_callback(statements.append)
+for n in range(100):
+    getattr(ctx, "cell%d" % n).set("changed %d" % n)
+ctx.equilibrate()
+mountmanager.tick()
+backend.conn.set_trace_callback(None)
+print(len([s for s in statements if s == "BEGIN"]), len([s for s in statements if s == "COMMIT"]))
+print(db.execute("SELECT COUNT(*) FROM buffers").fetchone()[0])
+buffer, = db.execute(
+  "SELECT buffer FROM mounts JOIN buffers USING (checksum) WHERE path = 'cell42.txt'"
+).fetchone()
+print(buffer)
+
+# Values that are no longer referenced are deleted
+for n in range(100):
+    getattr(ctx, "cell%d" % n).set("value 0")
+ctx.equilibrate()
+mountmanager.tick()
+print(db.execute("SELECT COUNT(*) FROM buffers").fetchone()[0])
+
+# Changes by another process (here: another connection) are detected
+other = SqliteBackend(dbfile)
+with other.transaction():
+    other.write(dbfile + "/cell7.txt", "external", ctx.cell7._checksum("external", buffer=True), binary=False)
+    other.write(dbfile + "/sub/data.json", '{"a": 2}\n', ctx.sub.data._checksum('{"a": 2}\n', buffer=True), binary=False)
+print(wait_for(lambda: ctx.cell7.value == "external" and ctx.sub.data.value == {"a": 2}))
+print(ctx.cell7.value, ctx.sub.data.value)
+
+# Reads go through the checksum: a known value is taken from the buffer store,
+#  as long as a cell holds it
+reads = []
+_read = SqliteBackend.read
+def counting_read(self, path, **kwargs):
+    reads.append(path)
+    return _read(self, path, **kwargs)
+SqliteBackend.read = counting_read
+arr2 = np.arange(10) * 2
+ctx.sub.arr.set(arr2)
+ctx.equilibrate()
+mountmanager.tick()
+buffer2, checksum2 = ctx.sub.arr.serialize_buffer(), ctx.sub.arr.checksum()
+with macro_mode_on():
+    ctx_arr2 = context(toplevel=True)
+    ctx_arr2.arr = cell("array").set(arr2)
+ctx_arr2.equilibrate()
+print(ctx_arr2.arr.checksum() == checksum2)
+arr3 = np.arange(10) * 3
+with other.transaction():
+    other.write(dbfile + "/sub/arr.npy", ctx.sub.arr._value_to_bytes(arr3), ctx.sub.arr._checksum(arr3), binary=True)
+print(wait_for(lambda: np.array_equal(ctx.sub.arr.value, arr3)))
+with other.transaction():
+    other.write(dbfile + "/sub/arr.npy", buffer2, checksum2, binary=True)
+print(wait_for(lambda: np.array_equal(ctx.sub.arr.value, arr2)))
+print(reads.count(dbfile + "/sub/arr.npy"))
+SqliteBackend.read = _read
+other.close()
+
+# A new context reads the values back from the database
+with macro_mode_on():
+    ctx2 = context(toplevel=True)
+    ctx2.mount(dbfile, persistent=True, authority="file", backend="sqlite")
+    ctx2.cell7 = cell("text")
+    ctx2.cell8 = cell("text")
+    ctx2.sub = context(name="sub", context=ctx2)
+    ctx2.sub.data = cell("json")
+ctx2.equilibrate()
+print(ctx2.cell7.value, ctx2.cell8.value, ctx2.sub.data.value)
@@ -0,0 +1,115 @@
+"""
+Event-driven file watching for mounted cells (inotify)
+Run with SEAMLESS_MOUNT_WATCHER=poll to compare with polling
+"""
+import os, shutil, time
+import seamless
+from seamless.core import macro_mode_on
+from seamless.core import context, cell
+from seamless.core.mount import mountmanager, MountItem
+from seamless.core.filewatcher import InotifyWatcher
+
+print("watcher:", type(mountmanager.watcher).__name__)
+
+ncells = 2000
+mountdir = "/tmp/mount-watcher"
+if os.path.exists(mountdir):
+    shutil.rmtree(mountdir)
+os.makedirs(mountdir)
+with macro_mode_on():
+    ctx = context(toplevel=True)
+    for n in range(ncells):
+        c = cell("text").set("value %d" % n)
+        setattr(ctx, "cell%d" % n, c)
+        c.mount(mountdir + "/cell%d.txt" % n)
+ctx.equilibrate()
+mountmanager.tick()
+
+# Idle cost of the mount thread
+t = time.process_time()
+time.sleep(2)
+print("idle CPU: %.1f %%" % ((time.process_time() - t) / 2 * 100))
+
+def wait_for(c, value, timeout=5):
+    t = time.time()
+    while c.value != value:
+        if time.time() - t > timeout:
+            return None
+        seamless.flush()
+        time.sleep(0.001)
+    return time.time() - t
+
+# Reaction latency
+latencies = []
+for n in range(10):
+    with open(mountdir + "/cell%d.txt" % n, "w") as f:
+        f.write("changed %d" % n)
+    latencies.append(wait_for(getattr(ctx, "cell%d" % n), "changed %d" % n))
+print("latency: %.1f ms" % (max(latencies) * 1000))
+
+# Only the mount item of the changed file is read
+reads = []
+conditional_read = MountItem.conditional_read
+def counting_read(self):
+    reads.append(self.path)
+    return conditional_read(self)
+MountItem.conditional_read = counting_read
+with open(mountdir + "/cell20.txt", "w") as f:
+    f.write("changed 20")
+wait_for(ctx.cell20, "changed 20")
+mountmanager.tick()
+MountItem.conditional_read = conditional_read
+print("reads for 1 changed file out of %d:" % ncells, len(set(reads)))
+
+# Editor-style save: write a temporary file, then rename it
+path = mountdir + "/cell10.txt"
+with open(path + ".swp", "w") as f:
+    f.write("saved")
+os.rename(path + ".swp", path)
+print(wait_for(ctx.cell10, "saved") is not None, ctx.cell10.value)
+
+# Rapid sequence of writes: only the final value is read
+for n in range(100):
+    with open(mountdir + "/cell11.txt", "w") as f:
+        f.write("write %d" % n)
+print(wait_for(ctx.cell11, "write 99") is not None, ctx.cell11.value)
+
+# Cell to file still works
+ctx.cell12.set("from cell")
+ctx.equilibrate()
+mountmanager.tick()
+with open(mountdir + "/cell12.txt") as f:
+    print(f.read())
+
+# The watcher on its own: changes are debounced and reported per path
+watcher = InotifyWatcher()
+paths = [mountdir + "/w%d.txt" % n for n in range(3)]
+for p in paths:
+    watcher.add(p)
+watcher.add(mountdir + "/nonexistent-dir/x.txt") # cannot be watched: polled
+for n in range(20):
+    with open(paths[1], "w") as f:
+        f.write(str(n))
+with open(paths[2], "w") as f:
+    pass
+changed = watcher.wait(1)
+print(sorted(os.path.basename(p) for p in changed))
+print(watcher.wait(0.05) == {mountdir + "/nonexistent-dir/x.txt"})
+watcher.remove(mountdir + "/nonexistent-dir/x.txt")
+print(watcher.wait(0.05))
+watcher.wakeup()
+t = time.time()
+print(watcher.wait(10), time.time() - t < 1)
+watcher.close()
+
+# File descriptors beyond 1024 (where select.select fails)
+fds = [os.open("/dev/null", os.O_RDONLY) for n in range(1100)]
+watcher = InotifyWatcher()
+print(watcher.fd >= 1024)
+watcher.add(paths[0])
+with open(paths[0], "w") as f:
+    f.write("x")
+print(sorted(os.path.basename(p) for p in watcher.wait(1)))
+watcher.close()
+for fd in fds:
+    os.close(fd)
@@ -0,0 +1,100 @@
+"""
+Atomic, batched mount writes
+Large binary cells are written in parallel on a thread pool
+"""
+import os, shutil, time, threading
+import numpy as np
+import seamless
+from seamless.core import macro_mode_on
+from seamless.core import context, cell
+from seamless.core.mount import mountmanager, MountItem
+
+mountdir = "/tmp/mount-write"
+if os.path.exists(mountdir):
+    shutil.rmtree(mountdir)
+os.makedirs(mountdir)
+
+with macro_mode_on():
+    ctx = context(toplevel=True)
+    ctx.text = cell("text").set("start")
+    ctx.text.mount(mountdir + "/text.txt")
+    for n in range(4):
+        c = cell("array").set(np.zeros(10))
+        setattr(ctx, "arr%d" % n, c)
+        c.mount(mountdir + "/arr%d.npy" % n, "w")
+    for n in range(100):
+        c = cell("text").set("small %d" % n)
+        setattr(ctx, "small%d" % n, c)
+        c.mount(mountdir + "/small%d.txt" % n, "w")
+ctx.equilibrate()
+mountmanager.tick()
+
+# Atomic writes: a concurrent reader never sees a partially written file
+values = ["%d " % n * 200000 for n in range(1, 30)]
+bad_reads = []
+stop = False
+def reader():
+    while not stop:
+        with open(mountdir + "/text.txt") as f:
+            data = f.read()
+        data = data.rstrip("\n")
+        if data != "start" and data not in values:
+            bad_reads.append(len(data))
+t = threading.Thread(target=reader)
+t.start()
+for value in values:
+    ctx.text.set(value)
+    ctx.equilibrate()
+    mountmanager.tick()
+stop = True
+t.join()
+print("partial reads:", len(bad_reads))
+with open(mountdir + "/text.txt") as f:
+    print(f.read().rstrip("\n") == values[-1])
+print([f for f in os.listdir(mountdir) if f.endswith(".tmp")])
+
+# Batched writes: all updated cells are written in the same iteration
+writes = []
+_write_prepared = MountItem._write_prepared
+def counting_write_prepared(self, *args, **kwargs):
+    writes.append((self.path, threading.current_thread().name))
+    return _write_prepared(self, *args, **kwargs)
+MountItem._write_prepared = counting_write_prepared
+
+for n in range(100):
+    getattr(ctx, "small%d" % n).set("changed %d" % n)
+    getattr(ctx, "small%d" % n).set("changed again %d" % n)
+ctx.equilibrate()
+mountmanager.tick()
+print(len(writes))
+with open(mountdir + "/small42.txt") as f:
+    print(f.read())
+
+# Unchanged cells are not serialized again
+writes.clear()
+for n in range(100):
+    mountmanager.add_cell_update(getattr(ctx, "small%d" % n))
+mountmanager.tick()
+print(len(writes))
+
+# Large binary cells are written on the writer threads
+writes.clear()
+arrays = [np.random.random(2000000) for n in range(4)]
+for n in range(4):
+    getattr(ctx, "arr%d" % n).set(arrays[n])
+ctx.equilibrate()
+mountmanager.tick()
+print(len(writes), sorted(set(name.startswith("ThreadPool") for _, name in writes)))
+for n in range(4):
+    print(np.array_equal(np.load(mountdir + "/arr%d.npy" % n), arrays[n]), end=" ")
+print()
+
+# Symlinks: the target of the link is replaced
+os.rename(mountdir + "/small0.txt", mountdir + "/small0-target.txt")
+os.symlink(mountdir + "/small0-target.txt", mountdir + "/small0.txt")
+ctx.small0.set("via link")
+ctx.equilibrate()
+mountmanager.tick()
+print(os.path.islink(mountdir + "/small0.txt"))
+with open(mountdir + "/small0-target.txt") as f:
+    print(f.read())
@@ -0,0 +1,153 @@
+"""
+Share protocol v2: subscriptions, inline values and deltas, binary frames
+"""
+import sys
+import json
+import struct
+import asyncio
+from functools import partial
+import numpy as np
+import websockets
+
+import seamless
+from seamless.core import macro_mode_on
+from seamless.core import context, cell
+from seamless import shareserver
+
+shareserver_module = sys.modules["seamless.shareserver"]
+encodings = []
+_encode = shareserver_module._encode
+def counting_encode(value):
+    encodings.append(type(value).__name__)
+    return _encode(value)
+shareserver_module._encode = counting_encode
+
+shareserver_started = shareserver.start()
+
+with macro_mode_on():
+    ctx = context(toplevel=True)
+    ctx.data = cell("json").set({"a": {"x": 1, "y": [1, 2, 3]}, "b": "b" * 200})
+    ctx.arr = cell("array").set(np.arange(12, dtype=float).reshape(3, 4))
+    ctx.text = cell("text").set("text")
+ctx.equilibrate()
+
+namespace = shareserver.new_namespace("ctx")
+shareddict = {"data": ctx.data, "arr": ctx.arr, "text": ctx.text}
+shareserver.share(namespace, shareddict)
+for key, c in shareddict.items():
+    c._set_share_callback(partial(shareserver.send_update, namespace, key))
+
+def decode(message):
+    if isinstance(message, str):
+        return json.loads(message)
+    headersize, = struct.unpack("<I", message[:4])
+    data = message[4+headersize:]
+    msg = json.loads(message[4:4+headersize])
+    arrays = msg[1]["arrays"]
+    assert (4 + headersize) % 8 == 0
+    def dec(v):
+        if isinstance(v, dict) and "__array__" in v:
+            a = arrays[v["__array__"]]
+            arr = np.frombuffer(data, np.dtype(a["dtype"]), offset=a["offset"],
+                count=a["nbytes"] // np.dtype(a["dtype"]).itemsize)
+            return arr.reshape(a["shape"])
+        return v
+    msg[1]["value"] = dec(msg[1]["value"])
+    msg[1]["binary"] = True
+    return msg
+
+received = {1: [], 2: [], 3: []}
+clients = {}
+async def client(n, uri, subscription=None):
+    async with websockets.connect(uri) as websocket:
+        clients[n] = websocket
+        if subscription is not None:
+            await websocket.send(json.dumps(subscription))
+        async for message in websocket:
+            received[n].append(decode(message))
+
+def show(n):
+    for kind, msg in received[n]:
+        if kind in ("value", "delta"):
+            msg = msg.copy()
+            msg.pop("checksum")
+            msg.pop("base", None)
+            if isinstance(msg.get("value"), np.ndarray):
+                msg["value"] = msg["value"].tolist()
+            if isinstance(msg.get("value"), dict):
+                msg["value"] = {k: len(v) if isinstance(v, str) else v
+                  for k, v in msg["value"].items()}
+        elif kind == "update":
+            msg = msg[0], msg[2]
+        print(n, kind, msg)
+    received[n].clear()
+
+loop = asyncio.get_event_loop()
+loop.run_until_complete(shareserver_started)
+asyncio.ensure_future(client(1, "ws://localhost:5138/ctx?protocol=2", ["subscribe", ["*"]]))
+asyncio.ensure_future(client(2, "ws://localhost:5138/ctx?protocol=2", ["subscribe", [["data", ["a"]], "arr"]]))
+asyncio.ensure_future(client(3, "ws://localhost:5138/ctx"))
+loop.run_until_complete(asyncio.sleep(0.5))
+for n in 1, 2, 3:
+    show(n)
+print("encodings:", len(encodings))
+
+def update(c, value):
+    encodings.clear()
+    c.set(value)
+    ctx.equilibrate()
+    loop.run_until_complete(asyncio.sleep(0.2))
+    for n in 1, 2, 3:
+        show(n)
+    print("encodings:", len(encodings))
+    print()
+
+# Small change in a large value: delta for client 1, value for client 2
+update(ctx.data, {"a": {"x": 2, "y": [1, 2, 3]}, "b": "b" * 200})
+# Change outside the subscribed path: nothing for client 2
+update(ctx.data, {"a": {"x": 2, "y": [1, 2, 3]}, "b": "c" * 200})
+update(ctx.data, {"a": {"x": 2, "y": [1, 2]}, "c": "c" * 200})
+# Numpy arrays are sent as binary frames, serialized once for both clients
+update(ctx.arr, np.arange(12, dtype=np.float32)[::-1])
+
+loop.run_until_complete(clients[2].send(json.dumps(["unsubscribe", ["arr"]])))
+loop.run_until_complete(clients[2].send("nonsense"))
+update(ctx.arr, np.arange(3, dtype=np.int16))
+
+# REST GET is cached by checksum
+import requests
+def thread(func, *args, **kwargs):
+    from threading import Thread
+    from queue import Queue
+    def func2(func, q, args, kwargs):
+        result = func(*args, **kwargs)
+        q.put(result)
+    q = Queue()
+    t = Thread(target=func2, args=(func, q, args, kwargs))
+    t.start()
+    while t.is_alive():
+        loop.run_until_complete(asyncio.sleep(0.05))
+    return q.get()
+serializations = []
+_serialize = shareserver_module.serialize
+def counting_serialize(*args):
+    serializations.append(args[0])
+    return _serialize(*args)
+shareserver_module.serialize = counting_serialize
+for n in range(3):
+    r = thread(requests.get, 'http://localhost:5813/ctx/text')
+    print(r.json())
+print("serializations:", len(serializations))
+
+# Cells of different types with the same checksum do not share cache entries
+with macro_mode_on():
+    ctx.jx = cell("json").set("x")
+    ctx.tx = cell("text").set('"x"\n')
+ctx.equilibrate()
+print(ctx.jx.checksum() == ctx.tx.checksum())
+namespace2 = shareserver.new_namespace("ctx2")
+shareserver.share(namespace2, {"jx": ctx.jx, "tx": ctx.tx})
+loop.run_until_complete(asyncio.sleep(0.1))
+for key in "jx", "tx", "jx":
+    r = thread(requests.get, 'http://localhost:5813/ctx2/' + key)
+    print(key, repr(r.json()))
@@ -0,0 +1,58 @@
+"""
+Inchannel updates that arrive within the same flush (e.g. results from
+ other threads) lead to a single outchannel update
+"""
+import threading
+import seamless
+from seamless.core import macro_mode_on
+from seamless.core import context, cell, StructuredCell
+from seamless.core.structured_cell import Outchannel
+
+updates = []
+_send_update = Outchannel.send_update
+def send_update(self, value):
+    updates.append(self.outchannel)
+    return _send_update(self, value)
+Outchannel.send_update = send_update
+
+with macro_mode_on():
+    ctx = context(toplevel=True)
+    ctx.struc = context(name="struc",context=ctx)
+    ctx.struc.data = cell("json")
+    ctx.struc.form = cell("json")
+    ctx.sc = StructuredCell(
+        "sc",
+        ctx.struc.data,
+        storage = None,
+        form = ctx.struc.form,
+        schema = None,
+        buffer = None,
+        inchannels = [("a",), ("b",), ("c",)],
+        outchannels = [(), ("a",)]
+    )
+    ctx.a = cell("json").set(1)
+    ctx.b = cell("json").set(2)
+    ctx.c = cell("json").set(3)
+    ctx.sc.connect_inchannel(ctx.a, ("a",))
+    ctx.sc.connect_inchannel(ctx.b, ("b",))
+    ctx.sc.connect_inchannel(ctx.c, ("c",))
+ctx.equilibrate()
+print(ctx.sc.value)
+
+# From the main thread, outside of a flush: every update is sent immediately
+updates.clear()
+ctx.a.set(10)
+ctx.b.set(20)
+print(ctx.sc.value, updates)
+
+# From another thread: the updates are processed in the next flush
+updates.clear()
+def set_cells():
+    ctx.a.set(100)
+    ctx.b.set(200)
+    ctx.c.set(300)
+t = threading.Thread(target=set_cells)
+t.start()
+t.join()
+ctx.equilibrate()
+print(ctx.sc.value, updates)
@@ -0,0 +1,64 @@
+import os, tempfile, shutil, time
+cache_dir = tempfile.mkdtemp()
+os.environ["SEAMLESS_TRANSFORMATION_CACHE_DIR"] = cache_dir
+
+import seamless
+from seamless.core import macro_mode_on
+from seamless.core import context, cell, transformer, pytransformercell
+from seamless.core.transformation_cache import transformation_cache
+
+def build():
+    with macro_mode_on():
+        ctx = context(toplevel=True)
+        ctx.cell1 = cell().set(1)
+        ctx.cell2 = cell().set(2)
+        ctx.result = cell()
+        ctx.tf = transformer({
+            "a": "input",
+            "b": "input",
+            "c": "output"
+        })
+        ctx.cell1.connect(ctx.tf.a)
+        ctx.cell2.connect(ctx.tf.b)
+        ctx.code = pytransformercell().set("""
+import time
+time.sleep(1)
+c = a + b
+""")
+        ctx.code.connect(ctx.tf.code)
+        ctx.tf.c.connect(ctx.result)
+    return ctx
+
+def run(ctx, value=None):
+    t = time.time()
+    if value is not None:
+        ctx.cell1.set(value)
+    ctx.equilibrate()
+    cached = (time.time() - t < 0.5)
+    print(ctx.result.value, "cached" if cached else "computed")
+
+ctx = build()
+run(ctx)
+run(ctx, 10)
+run(ctx, 1)   # same inputs as the first run
+run(ctx, 10)
+
+# touch forces a re-computation
+t = time.time()
+ctx.tf.touch()
+ctx.equilibrate()
+print(ctx.result.value, "cached" if time.time() - t < 0.5 else "computed")
+
+# same transformation in a new context, from the on-disk tier
+ctx.destroy()
+transformation_cache.clear()
+ctx = build()
+run(ctx)
+ctx.code.set("""
+import time
+time.sleep(1)
+c = a * b
+""")
+run(ctx)
+
+shutil.rmtree(cache_dir)
@@ -0,0 +1,74 @@
+# chunked storage of large arrays, with lazy access
+
+import os, tempfile
+import numpy as np
+from seamless.mixed import ChunkedArray, MixedDict, Monitor
+from seamless.mixed.get_form import get_form
+from seamless.mixed.io import to_stream, from_stream
+from seamless.mixed.chunked import to_chunked_stream, is_chunked
+from seamless.core.checksum import checksum_mixed, checksum
+
+big = np.arange(25000000, dtype=np.float32).reshape(1000000, 25) # 100 MB
+chunk_size = 1024 * 1024
+
+# Count the chunks that are read
+reads = []
+_read_raw_chunk = ChunkedArray._read_raw_chunk
+def counting_read(self, n):
+    reads.append(n)
+    return _read_raw_chunk(self, n)
+ChunkedArray._read_raw_chunk = counting_read
+
+arr = ChunkedArray.from_array(big, chunk_size=chunk_size)
+print(arr, arr.nchunks, len(arr), arr.ndim, arr.nbytes == big.nbytes)
+storage, form = get_form(arr)
+print(storage, form == get_form(big)[1])
+
+# lazy access
+reads.clear()
+print(arr[123456, 7], arr[-1, -1], arr[2000:2003, 1].tolist())
+print("Lazy access: %d chunks read" % len(reads))
+reads.clear()
+print(np.array_equal(arr[10480:10490], big[10480:10490]), sorted(set(reads)))
+print(np.array_equal(arr[5::100000], big[5::100000]))
+print(np.array_equal(np.asarray(arr), big))
+
+# streams: the mixed stream of a chunked array is the chunked stream
+stream = to_stream(arr, storage, form)
+print(is_chunked(stream), len(stream) - big.nbytes < 4096)
+print(checksum_mixed(arr, storage, form) == checksum(stream))
+newarr = from_stream(stream, storage, form)
+print(type(newarr).__name__, np.array_equal(newarr, big), newarr.flags.writeable)
+lazy = from_stream(stream, storage, form, lazy=True)
+print(type(lazy).__name__, lazy[999999, 24])
+
+# compression
+zarr = ChunkedArray.from_array(big, chunk_size=chunk_size, compression="zlib")
+zstream = to_stream(zarr, storage, form)
+print(len(zstream) < big.nbytes / 2, np.array_equal(zarr[500000], big[500000]))
+
+# file source: only the needed chunks are read from disk
+tmpfile = tempfile.NamedTemporaryFile(delete=False)
+tmpfile.write(zstream)
+tmpfile.close()
+farr = ChunkedArray(tmpfile.name)
+reads.clear()
+print(farr[777777, 3], len(reads))
+os.unlink(tmpfile.name)
+
+# 0-dimensional arrays
+arr0 = ChunkedArray.from_array(np.array(3.0))
+print(arr0.shape, np.asarray(arr0), get_form(arr0) == get_form(np.array(3.0)))
+
+# Monitor.get_path on a sub-array
+data = {"big": arr, "z": 10}
+storage, form = get_form(data)
+d = MixedDict(Monitor(data, storage, form), ())
+reads.clear()
+print(d["big"][42][0], d["z"], len(reads))
+
+# Inside a mixed value, a chunked array is stored as a normal array
+stream = to_stream(data, storage, form)
+newdata = from_stream(stream, storage, form)
+print(type(newdata["big"]).__name__, np.array_equal(newdata["big"], big))
+print(to_stream(newdata, storage, form) == stream)
@@ -0,0 +1,57 @@
+"""
+Benchmark of get_form with memoization
+
+The forms of Numpy dtypes and arrays are memoized, and lists of scalars
+ are checked for homogeneity by type only.
+form_unchanged checks cheaply if a form is still valid.
+"""
+import time
+import numpy as np
+from seamless.mixed import get_form as get_form_module
+from seamless.mixed.get_form import get_form, form_unchanged
+
+def uncached_get_form(data):
+    get_form_module._tform_cache.clear()
+    get_form_module._array_form_cache.clear()
+    return get_form(data)
+
+dt = np.dtype([("a", np.float32), ("b", np.int16, 3), ("c", "S5")], align=True)
+values = [
+    1, "test", [1, 2, 3], [1, 2.0], [True, False], [1, True], ["a", "b"], [None, None],
+    [1, [2]], {"a": [1.0, 2.0], "b": {"c": "d"}},
+    np.zeros(10, dt), np.zeros((3, 4), np.float64)[:, ::2], np.zeros(5, dt)[0],
+    {"arr": np.arange(10), "l": [np.arange(3), np.arange(3)]},
+    np.array([[1, 2], "x", None], dtype=object),
+]
+for value in values:
+    result = uncached_get_form(value)
+    # cached forms are identical, and can be modified by the caller
+    cached = get_form(value)
+    print(cached == result, end=" ")
+    if isinstance(cached[1], dict):
+        cached[1]["type"] = "modified"
+        print(get_form(value) == result, end=" ")
+print()
+
+arr = np.zeros(1000, dt)
+storage, form = get_form(arr)
+print(form_unchanged(arr, storage, form), form_unchanged(arr[::2], storage, form))
+print(form_unchanged(np.zeros(1000, np.float32), storage, form))
+print(form_unchanged(3, "pure-plain", "integer"), form_unchanged(3.0, "pure-plain", "integer"))
+print(form_unchanged([1, 2], *get_form([1, 2]))) # lists must be visited
+
+floats = [float(n) for n in range(1000000)]
+t = time.time()
+for n in range(10):
+    get_form(floats)
+print("list of 1 million floats: %.3f ms" % ((time.time() - t) / 10 * 1000))
+
+arrays = {"arr%d" % n: np.zeros(10, dt) for n in range(10000)}
+t = time.time()
+uncached_get_form(arrays)
+print("dict of 10000 struct arrays: %d ms" % ((time.time() - t) * 1000))
+
+t = time.time()
+for n in range(10000):
+    form_unchanged(arr, storage, form)
+print("form_unchanged: %.1f us" % ((time.time() - t) / 10000 * 1e6))
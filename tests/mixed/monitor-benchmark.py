@@ -0,0 +1,61 @@
+"""
+Benchmark of the form recomputation in mixed.Monitor
+
+A large mixed dict is built, and 10 000 leaf values are set one by one.
+After each set_path, only the form under the modified path is recomputed
+ (and its parents, if it has changed); this is compared with recomputing
+ the entire form every time.
+"""
+import time
+import numpy as np
+from seamless.mixed.MixedDict import mixed_dict, get_form_dict
+from seamless.mixed.get_form import get_form
+
+def build_data():
+    data = {}
+    for n in range(100):
+        data["group%d" % n] = {
+            "values": list(range(100)),
+            "labels": {"a": "x", "b": "y"},
+        }
+    data["arr"] = np.arange(100, dtype=float)
+    return data
+
+data = build_data()
+storage, form = get_form_dict(data)
+d = mixed_dict(data, storage, form)
+monitor = d._monitor
+
+t = time.time()
+for n in range(100):
+    for nn in range(100):
+        monitor.set_path(("group%d" % n, "values", nn), nn + 1)
+t_incremental = time.time() - t
+
+# Same values, now with a full recomputation after each set_path
+#  (only for the first group; this is 100 times slower)
+data2 = build_data()
+storage2, form2 = get_form_dict(data2)
+d2 = mixed_dict(data2, storage2, form2)
+monitor2 = d2._monitor
+t = time.time()
+for n in range(1):
+    for nn in range(100):
+        path = ("group%d" % n, "values", nn)
+        monitor2.set_path(path, nn + 1)
+        monitor2.recompute_form(path, data=monitor2.data)
+t_full = 100 * (time.time() - t)
+for n in range(1, 100):
+    for nn in range(100):
+        monitor2.set_path(("group%d" % n, "values", nn), nn + 1)
+
+print(monitor.storage == monitor2.storage, monitor.form == monitor2.form)
+print(monitor.form == get_form(data)[1])
+
+# A leaf that changes type updates the forms of its parents
+monitor.set_path(("group0", "values", 5), "five")
+print(monitor.form["properties"]["group0"]["properties"]["values"]["items"][5])
+print(monitor.form == get_form(data)[1])
+
+print("incremental: %d ms" % (1000 * t_incremental))
+print("full (extrapolated): %d ms" % (1000 * t_full))
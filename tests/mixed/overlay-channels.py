@@ -0,0 +1,58 @@
+"""
+OverlayMonitor with many channels:
+an update must only notify the outchannels that overlap with the updated path
+"""
+import time
+from seamless.mixed.MixedDict import mixed_dict, get_form_dict
+from seamless.mixed.OverlayMonitor import OverlayMonitor
+
+nchannels = 500
+data = {"sub%d" % n: {"a": n, "b": -n} for n in range(nchannels)}
+storage, form = get_form_dict(data)
+
+updates = []
+def make_out(path):
+    def out(value):
+        updates.append((path, value))
+    return out
+outchannels = {}
+for n in range(nchannels):
+    path = ("sub%d" % n, "a")
+    outchannels[path] = make_out(path)
+outchannels[("sub7",)] = make_out(("sub7",))
+outchannels[()] = make_out(())
+inchannels = [("sub%d" % n, "b") for n in range(nchannels)]
+
+d = mixed_dict(data, storage, form,
+    inchannels=inchannels,
+    outchannels=outchannels,
+    MonitorClass=OverlayMonitor
+)
+monitor = d._monitor
+
+monitor.set_path(("sub7", "a"), 70)
+print([path for path, value in updates])
+updates.clear()
+
+monitor.receive_inchannel_value(("sub3", "b"), 30)
+print([path for path, value in updates])
+updates.clear()
+
+# Within a batch, the updates are coalesced
+with monitor.batch():
+    monitor.set_path(("sub7", "a"), 71)
+    monitor.set_path(("sub7", "a"), 72)
+    monitor.set_path(("sub8", "a"), 80)
+print(updates[:2])
+print([path for path, value in updates])
+updates.clear()
+
+d.update({"sub1": {"a": 10, "b": -1}, "sub2": {"a": 20, "b": -2}})
+print([path for path, value in updates])
+updates.clear()
+
+t = time.time()
+for n in range(nchannels):
+    monitor.set_path(("sub%d" % n, "a"), 2 * n)
+print(len(updates))
+print("%d updates: %d ms" % (nchannels, 1000 * (time.time() - t)))
@@ -0,0 +1,52 @@
+import numpy as np
+from seamless.mixed.snapshot import snapshot
+
+data = {
+    "a": np.arange(10),
+    "b": {"c": [1, 2, 3], "d": "text"},
+    "e": np.zeros(3, dtype=[("x", int), ("y", float)]),
+}
+snap, changed = snapshot(data)
+print(changed, snap["a"] is data["a"], snap["a"].flags.writeable)
+try:
+    snap["a"][0] = 100
+except ValueError as exc:
+    print(exc)
+
+# Nothing changed: the previous snapshot is returned
+snap2, changed = snapshot(data, snap)
+print(changed, snap2 is snap)
+
+# Only the modified parts are copied
+data["a"][0] = 100
+data["b"]["c"].append(4)
+snap3, changed = snapshot(data, snap2)
+print(changed, snap3 is snap2, snap3["a"][0], snap2["a"][0])
+print(snap3["b"]["c"], snap2["b"]["c"])
+print(snap3["e"] is snap2["e"], snap3["b"]["d"] is snap2["b"]["d"])
+
+data["e"][1]["y"] = 3.5
+snap4, changed = snapshot(data, snap3)
+print(changed, snap4["a"] is snap3["a"], snap4["b"] is snap3["b"], snap4["e"][1])
+
+# The dicts and lists of a snapshot are read-only as well
+for modify in (
+    lambda: snap4.__setitem__("f", 1),
+    lambda: snap4["b"].pop("d"),
+    lambda: snap4["b"]["c"].append(5),
+):
+    try:
+        modify()
+    except TypeError as exc:
+        print(exc)
+print(snap4["b"] == data["b"], isinstance(snap4["b"]["c"], list))
+
+# deepcopy gives a modifiable copy
+from copy import deepcopy
+copy = deepcopy(snap4)
+copy["b"]["c"].append(5)
+copy["a"][1] = 200
+print(type(copy).__name__, type(copy["b"]["c"]).__name__, copy["b"]["c"], copy["a"][:2])
+
+# A snapshot of a snapshot is itself
+print(snapshot(snap4, snap4) == (snap4, False))
@@ -0,0 +1,63 @@
+# zero-copy reading of mixed data from a memory-mapped file
+
+import os, tempfile, mmap, time
+import numpy as np
+from seamless.mixed.get_form import get_form
+from seamless.mixed.io import to_stream, from_stream
+
+big = np.arange(25000000, dtype=np.float32) # 100 MB
+data = {
+    "big": big,
+    "small": np.arange(6).reshape(2, 3),
+    "fortran": np.asfortranarray(np.arange(6).reshape(2, 3)),
+    "z": 10,
+    "sub": {"x": [1, 2, 3]},
+}
+storage, form = get_form(data)
+stream = to_stream(data, storage, form)
+
+def check(newdata):
+    for key in "big", "small", "fortran":
+        print(key, np.array_equal(newdata[key], data[key]), end=" ")
+    print(newdata["z"], newdata["sub"])
+
+tmpfile = tempfile.NamedTemporaryFile(delete=False)
+tmpfile.write(stream)
+tmpfile.close()
+
+with open(tmpfile.name, "rb") as f:
+    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+t = time.time()
+newdata = from_stream(mm, storage, form, copy=False)
+t_view = time.time() - t
+check(newdata)
+print(newdata["big"].flags.owndata, newdata["big"].flags.writeable)
+del newdata
+
+t = time.time()
+newdata = from_stream(mm, storage, form)
+t_copy = time.time() - t
+check(newdata)
+print(newdata["big"].flags.owndata, newdata["big"].flags.writeable)
+del newdata
+
+# a writable buffer gives writable views, unless readonly is True
+buf = bytearray(stream)
+newdata = from_stream(buf, storage, form, copy=False)
+newdata["small"][0, 0] = 99
+print(newdata["big"].flags.writeable, from_stream(buf, storage, form)["small"][0, 0])
+newdata = from_stream(buf, storage, form, copy=False, readonly=True)
+print(newdata["big"].flags.writeable)
+del newdata
+
+# pure-binary
+storage2, form2 = get_form(data["fortran"])
+stream2 = to_stream(data["fortran"], storage2, form2)
+arr = from_stream(memoryview(stream2), storage2, form2, copy=False)
+print(storage2, np.array_equal(arr, data["fortran"]), arr.flags.f_contiguous, arr.flags.owndata)
+
+mm.close()
+os.unlink(tmpfile.name)
+print("view: %d ms" % (1000 * t_view))
+print("copy: %d ms" % (1000 * t_copy))
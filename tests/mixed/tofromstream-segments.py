@@ -0,0 +1,73 @@
+# scatter-gather writing of mixed data
+
+import os, tempfile, time
+import numpy as np
+from seamless.mixed.get_form import get_form
+from seamless.mixed.io import to_stream, write_stream, from_stream
+from seamless.mixed.io.to_stream import to_stream_parts
+
+big = np.arange(25000000, dtype=np.float32) # 100 MB
+dt = np.dtype([("a", np.uint32), ("b", np.float32)], align=True)
+data = {
+    "big": big,
+    "struct": np.zeros(3, dtype=dt),
+    "strided": np.arange(20)[::2],
+    "z": 10,
+    "sub": {"x": [1, 2, 3]},
+}
+storage, form = get_form(data)
+
+parts = to_stream_parts(data, storage, form)
+print(len(parts), any([np.shares_memory(np.asarray(part), big) for part in parts]))
+
+t = time.time()
+stream = to_stream(data, storage, form)
+t_stream = time.time() - t
+
+def check(newdata):
+    for key in "big", "struct", "strided":
+        print(key, np.array_equal(newdata[key], data[key]), end=" ")
+    print(newdata["z"], newdata["sub"])
+check(from_stream(stream, storage, form))
+
+tmpfile = tempfile.NamedTemporaryFile(delete=False)
+tmpfile.close()
+
+# write into a file object
+t = time.time()
+with open(tmpfile.name, "wb") as f:
+    size = write_stream(data, storage, form, f)
+t_write = time.time() - t
+with open(tmpfile.name, "rb") as f:
+    stream2 = f.read()
+print(size == len(stream), stream2 == stream)
+
+# write into a file descriptor (os.writev)
+fd = os.open(tmpfile.name, os.O_WRONLY | os.O_TRUNC)
+size = write_stream(data, storage, form, fd)
+os.close(fd)
+with open(tmpfile.name, "rb") as f:
+    stream2 = f.read()
+print(size == len(stream), stream2 == stream)
+os.unlink(tmpfile.name)
+
+# pure-binary
+storage2, form2 = get_form(big)
+stream3 = to_stream(big, storage2, form2)
+print(np.array_equal(from_stream(stream3, storage2, form2), big))
+
+# more segments than os.writev accepts at once (IOV_MAX)
+many = {"a%d" % n: np.arange(n % 5 + 1) for n in range(2000)}
+storage4, form4 = get_form(many)
+stream4 = to_stream(many, storage4, form4)
+tmpfile = tempfile.NamedTemporaryFile(delete=False)
+tmpfile.close()
+fd = os.open(tmpfile.name, os.O_WRONLY | os.O_TRUNC)
+size = write_stream(many, storage4, form4, fd)
+os.close(fd)
+with open(tmpfile.name, "rb") as f:
+    print(size == len(stream4), f.read() == stream4)
+os.unlink(tmpfile.name)
+
+print("to_stream: %d ms" % (1000 * t_stream))
+print("write_stream: %d ms" % (1000 * t_write))
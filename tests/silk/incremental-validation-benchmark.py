@@ -0,0 +1,119 @@
+"""
+Benchmark of repeated small edits to a large Silk structure
+
+After an assignment, only the schema nodes that cover the modified path
+ are re-validated, as long as the rest of the data is known to be valid.
+Custom validators that declare their fields are only re-run when one of
+ those fields is modified.
+"""
+import time
+from seamless.silk import Silk
+
+schema = {
+    "type": "object",
+    "properties": {
+        "numbers": {"type": "array", "items": {"type": "integer", "minimum": 0}},
+        "params": {
+            "type": "object",
+            "properties": {"a": {"type": "integer"}, "b": {"type": "string"}},
+        },
+    },
+}
+s = Silk(schema, data={"numbers": list(range(100000)), "params": {"a": 0, "b": "x"}})
+s.validate()
+
+def validate_numbers(self):
+    assert len(self.numbers) == 100000
+s.add_validator(validate_numbers, fields=["numbers"])
+
+def validate_params(self):
+    assert self.params.a < 1000000
+s.add_validator(validate_params, fields=["params"])
+
+def bench(name, func, repeat=1000):
+    t = time.time()
+    for n in range(repeat):
+        func(n)
+    print("%s: %.3f ms" % (name, (time.time() - t) / repeat * 1000))
+
+def edit_param(n):
+    s.params.a = n
+
+def edit_value(n):
+    s.numbers[5] = n
+
+def full_validation(n):
+    s.validate()
+
+bench("s.params.a = n", edit_param)
+bench("s.numbers[5] = n", edit_value)
+bench("full validation", full_validation, 10)
+print(s.params.a, s.numbers[5], s.numbers[6])
+
+# Errors are still detected
+# After an error, the data is invalid (the assignment is not undone),
+#  and assignments are fully validated until the next successful validate()
+try:
+    s.numbers[5] = -1
+except Exception as exc:
+    print(str(exc).splitlines()[0])
+s.numbers[5] = 5
+s.validate()
+try:
+    s.numbers[6] = "test"
+except Exception as exc:
+    print(str(exc).splitlines()[0])
+s.numbers[6] = 6
+s.validate()
+try:
+    s.params.a = 1000000
+except Exception as exc:
+    print("validate_params failed")
+s.params.a = 10
+s.validate()
+bench("s.numbers[5] = n", edit_value, 10)
+
+# validate_path directly
+from seamless.silk.validation import validate_path
+schema2 = {
+    "type": "object",
+    "properties": {"a": {"type": "array", "items": [{"type": "integer"}], "additionalItems": False}},
+    "patternProperties": {"^x": {"type": "string"}},
+    "additionalProperties": False,
+}
+for instance, path in (
+    ({"a": [1]}, ("a", 0)),
+    ({"a": ["z"]}, ("a", 0)),
+    ({"a": [1, 2]}, ("a", 1)),
+    ({"a": [1], "xy": 1}, ("xy",)),
+    ({"a": [1], "b": 1}, ("b",)),
+    ({"a": [1], "b": 1}, ("a",)), # "b" is not on the path
+):
+    try:
+        validate_path(schema2, instance, path)
+        print(path, "OK")
+    except Exception as exc:
+        print(path, exc.message, list(exc.path), list(exc.schema_path))
+
+# Items are valid only as long as their schema is unchanged,
+#  also if the schema dict is modified directly
+u = Silk()
+u.z = {}
+u.z.q = 12
+u.z.r = 1
+u.z.w = {}
+u.z.w.a = 2
+u.schema.dict["properties"]["z"]["properties"]["q"]["maximum"] = 5
+try:
+    u.z.r = 2
+    print("u.z.r accepted")
+except Exception as exc:
+    print("u.z.r rejected:", exc.message)
+u.schema.dict["properties"]["z"]["properties"]["q"].pop("maximum")
+u.validate()
+u.schema.dict["properties"]["z"]["properties"]["w"]["properties"]["a"]["minimum"] = 5
+try:
+    u.z.w.b = 4
+    print("u.z.w.b accepted")
+except Exception as exc:
+    print("u.z.w.b rejected:", exc.message)
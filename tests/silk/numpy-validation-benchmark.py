@@ -0,0 +1,108 @@
+"""
+Benchmark of the validation of large Numpy arrays with item constraints
+
+The items of Numpy arrays are validated with vectorized Numpy operations,
+ the fields of structured dtypes column-wise.
+"""
+import time
+import numpy as np
+from seamless.silk import Silk
+from seamless.silk.validation import schema_validator
+from seamless.silk.validation.vectorized import numpy_item_errors, NotVectorizable
+from jsonschema._validators import items as validator_items_ORIGINAL
+
+def first_error(s):
+    try:
+        s.validate()
+    except Exception as exc:
+        return "%s %s %s" % (exc.message, list(exc.path), list(exc.schema_path))
+    return "OK"
+
+arr = np.arange(10000000, dtype=np.float64)
+schema = {
+    "type": "object",
+    "properties": {
+        "arr": {
+            "type": "array",
+            "storage": "binary",
+            "form": {"ndim": 1},
+            "items": {"type": "number", "minimum": 0, "maximum": 1e7, "exclusiveMaximum": True},
+        },
+    },
+}
+s = Silk(schema, data={"arr": arr})
+t = time.time()
+s.validate()
+print("10M floats, minimum/maximum: %d ms" % ((time.time() - t) * 1000))
+
+arr[1234567] = -1
+print(first_error(s))
+arr[1234567] = 0
+schema["properties"]["arr"]["items"]["multipleOf"] = 2.0
+print(first_error(s))
+schema["properties"]["arr"]["items"].pop("multipleOf")
+schema["properties"]["arr"]["items"]["type"] = "integer"
+print(first_error(s))
+
+iarr = np.arange(10000000, dtype=np.int32) % 5
+schema2 = {"type": "array", "items": {"type": "integer", "enum": [0, 1, 2, 3, 4]}}
+s2 = Silk(schema2, data=iarr)
+t = time.time()
+s2.validate()
+print("10M integers, enum: %d ms" % ((time.time() - t) * 1000))
+
+# structured dtype: field constraints are validated column-wise
+dt = np.dtype([("x", np.float32), ("ids", np.int16, 3), ("name", "S8")], align=True)
+sarr = np.zeros(1000000, dt)
+sarr["name"] = b"atom"
+sarr["ids"] = 1
+schema3 = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "x": {"type": "number", "maximum": 10},
+            "ids": {"type": "array", "items": {"minimum": 1}},
+            "name": {"type": "string", "minLength": 1},
+        },
+        "required": ["x", "ids", "name"],
+    },
+}
+s3 = Silk(schema3, data=sarr)
+t = time.time()
+s3.validate()
+print("1M structs: %d ms" % ((time.time() - t) * 1000))
+sarr["ids"][54321, 2] = 0
+print(first_error(s3))
+sarr["ids"][54321, 2] = 1
+sarr["name"][999999] = b""
+print(first_error(s3))
+sarr["name"][999999] = b"atom"
+schema3["items"]["additionalProperties"] = False
+print(first_error(s3))
+schema3["items"]["properties"].pop("name")
+print(first_error(s3))
+
+# 2D arrays: items inside items
+schema4 = {"type": "array", "items": {"type": "array", "maxItems": 3, "items": {"maximum": 10}}}
+s4 = Silk(schema4, data=np.arange(6).reshape(2, 3) * 2)
+print(first_error(s4))
+s4.data[1, 2] = 11
+print(first_error(s4))
+
+# Same errors as item-by-item validation
+validator = schema_validator({})
+for data, items_schema in (
+    (np.arange(10), {"type": "integer", "minimum": 3, "multipleOf": 2}),
+    (np.arange(10.), {"type": "integer", "enum": [0, 1.0]}),
+    (np.arange(12).reshape(3, 4), {"items": [{"maximum": 100}, {"maximum": 4}], "additionalItems": False}),
+):
+    errors = [e.message for e in numpy_item_errors(validator, items_schema, data)]
+    original = [e.message for e in validator_items_ORIGINAL(validator, items_schema, data, {})]
+    print(errors, set(errors).issubset(original))
+
+# Custom validators cannot be vectorized: items are validated one by one
+try:
+    numpy_item_errors(validator, {"validators": []}, np.arange(10))
+except NotVectorizable:
+    print("NotVectorizable")
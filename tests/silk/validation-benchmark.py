@@ -0,0 +1,62 @@
+"""
+Benchmark of the full validation of a large Silk structure
+
+Validators are cached by schema checksum (with their custom validators
+ compiled), and the forms of the mixed data are passed down to the
+ validators.
+"""
+import time
+import numpy as np
+from seamless.silk import Silk
+from seamless.silk.validation import get_validator
+from seamless.mixed.MixedDict import mixed_dict, get_form_dict
+
+data = {}
+props = {}
+for n in range(200):
+    data["group%d" % n] = {"values": list(range(50)), "label": "x", "arr": np.arange(1000.)}
+    props["group%d" % n] = {
+        "type": "object",
+        "properties": {
+            "values": {"type": "array", "items": {"type": "integer"}},
+            "label": {"type": "string"},
+            "arr": {"storage": "binary", "form": {"ndim": 1}, "items": {"form": {"bytesize": 8}}},
+        },
+        "validators": [{"code": "def validate(self):\n    assert len(self.label) > 0", "language": "python"}],
+    }
+schema = {"type": "object", "properties": props}
+storage, form = get_form_dict(data)
+d = mixed_dict(data, storage, form)
+s = Silk(schema, data=d)
+s.validate()
+t = time.time()
+for n in range(20):
+    s.validate()
+print("validate: %d ms" % ((time.time() - t) / 20 * 1000))
+
+# Validators are re-used until the schema changes
+print(get_validator(schema) is get_validator(schema))
+v = get_validator(schema)
+schema["properties"]["group0"]["properties"]["label"]["type"] = "integer"
+print(get_validator(schema) is v)
+try:
+    s.validate()
+except Exception as exc:
+    print(str(exc).strip().splitlines()[0])
+schema["properties"]["group0"]["properties"]["label"]["type"] = "string"
+print(get_validator(schema) is v)
+
+# Forms are passed down into the validators
+props["group0"]["properties"]["values"]["items"]["minimum"] = 0
+s.validate()
+d["group0"]["values"][3] = -1
+try:
+    s.validate()
+except Exception as exc:
+    print(str(exc).splitlines()[0])
+d["group0"]["values"][3] = 3
+props["group0"]["properties"]["arr"]["form"]["ndim"] = 2
+try:
+    s.validate()
+except Exception as exc:
+    print(str(exc).strip().splitlines()[0])